@@ -1,21 +1,119 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form
-from typing import Optional
-import shutil
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional, List, Tuple
+import asyncio
+import json
+import logging
 import os
-from tempfile import NamedTemporaryFile
-from services.ocr_service import OCRService
-from services.latex_service import LaTeXService
+from core.config import OCR_BATCH_REQUEST_CONCURRENCY, OCR_MODE, OCR_SERVICE_URLS
+from core.metrics import span, trace_id_var
+from services.correction_log import correction_log
+from services.executor_service import PoolSaturatedError, io_executor
+from services.job_service import (
+    CANCELLED,
+    CallbackURLError,
+    JobQueue,
+    JobQueueFullError,
+    JobWorkerPool,
+    check_callback_url,
+    public_job,
+)
+from services.model_registry import ModelNotReadyError, ModelRegistry
+from services.ocr_client import OCRServiceUnavailableError
+from services.reasoning_client import ReasoningUnavailableError
+from services.latex_service import InvalidLaTeXError, LaTeXService
 from services.storage_service import StorageService
+from services.trace_capture import trace_capture
+from services.preprocess_service import image_preprocessor
+from services.segmentation_service import BBox, TooManyRegionsError, page_segmenter
+from services.upload_service import (
+    ImagePayload,
+    InvalidUploadError,
+    UploadTooLargeError,
+    read_batch_uploads,
+    read_image_upload,
+)
 from models.equation import EquationCreate, EquationResponse
-import json
-from services.reasoning_service import ReasoningService
+from api.v1.verify import reasoning_service
 from models.solution import SolutionResponse
 
 router = APIRouter()
-ocr_service = OCRService()
+
+# OCR runs either in-process or on the dedicated OCR service; the model (and torch)
+# is only imported in local mode, and loaded by the registry after startup
+model_registry: Optional[ModelRegistry] = None
+if OCR_MODE == "remote":
+    from services.ocr_client import RemoteOCRClient
+    ocr_engine = RemoteOCRClient(OCR_SERVICE_URLS)
+else:
+    from services.ocr_service import OCRService
+    from services.ocr_batcher import OCRBatcher
+    model_registry = ModelRegistry(OCRService)
+    ocr_engine = OCRBatcher(model_registry)
+
 latex_service = LaTeXService()
 storage_service = StorageService()
-reasoning_service = ReasoningService()
+
+def _saturated(e: PoolSaturatedError) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+
+def _ocr_error(e: Exception) -> HTTPException:
+    """Map a failure on the OCR path to the HTTP error returned for it"""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, InvalidUploadError):
+        return HTTPException(status_code=400, detail=str(e))
+    if isinstance(e, UploadTooLargeError):
+        return HTTPException(status_code=413, detail=str(e))
+    if isinstance(e, TooManyRegionsError):
+        return HTTPException(status_code=422, detail=str(e))
+    if isinstance(e, InvalidLaTeXError):
+        return HTTPException(status_code=422, detail=e.detail())
+    if isinstance(e, PoolSaturatedError):
+        return _saturated(e)
+    if isinstance(e, (OCRServiceUnavailableError, ModelNotReadyError)):
+        return HTTPException(status_code=503, detail=str(e))
+    return HTTPException(status_code=500, detail=f"OCR processing failed: {str(e)}")
+
+async def _recognize(image: ImagePayload) -> Tuple[str, str]:
+    """
+    Run OCR on a decoded image and render the result
+    
+    Returns:
+        (LaTeX text, rendered LaTeX)
+    
+    Raises:
+        InvalidLaTeXError: If the generated LaTeX is invalid (422)
+    """
+    # Process the decoded image with OCR service (batched with concurrent requests)
+    with span("ocr.recognize"):
+        latex_text = await ocr_engine.process_image(image)
+    
+    # Validate the LaTeX syntax
+    with span("latex.validate"):
+        latex_service.check(latex_text, "Generated LaTeX is invalid")
+    
+    # Render the LaTeX for display
+    with span("latex.render"):
+        rendered_latex = latex_service.render(latex_text)
+    return latex_text, rendered_latex
+
+async def _run_ocr_job(job: dict) -> dict:
+    """Recognize the stored image of an OCR job and save its equation"""
+    # Job workers aren't request-scoped; a job is traced under its own ID
+    trace_id_var.set(job["id"])
+    image = await io_executor.run(ImagePayload.from_file, job["image_path"], job["filename"])
+    latex_text, rendered_latex = await _recognize(image)
+    equation_id = await io_executor.run(storage_service.save_equation, job["image_id"], latex_text, rendered_latex)
+    return {"id": equation_id, "latex": latex_text, "rendered_latex": rendered_latex}
+
+def _job_error(e: Exception) -> Tuple[int, str]:
+    error = _ocr_error(e)
+    detail = error.detail if isinstance(error.detail, str) else json.dumps(error.detail)
+    return error.status_code, detail
+
+# Asynchronous OCR jobs; the workers are started and stopped with the app
+job_workers = JobWorkerPool(JobQueue(), _run_ocr_job, _job_error)
 
 @router.post("/ocr/", response_model=EquationResponse)
 async def process_image(file: UploadFile = File(...)):
@@ -23,28 +121,24 @@ async def process_image(file: UploadFile = File(...)):
     Process an image containing handwritten math equations and convert to LaTeX
     """
     try:
-        # Save uploaded file to a temporary file
-        with NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
-            shutil.copyfileobj(file.file, temp_file)
-            temp_file_path = temp_file.name
+        # Read and decode the upload once
+        image = await read_image_upload(file)
+        trace_capture.request(
+            image_sha256=image.sha256,
+            image_bytes=image.size,
+            image_format=image.format,
+            image_width=image.original_size[0],
+            image_height=image.original_size[1],
+        )
         
         # 이미지 저장하고 ID 얻기
-        image_id = storage_service.save_image(temp_file_path)
-        
-        # Process image with OCR service
-        latex_text = ocr_service.process_image(temp_file_path)
+        image_id = await io_executor.run(storage_service.save_image, image)
         
-        # Validate the LaTeX syntax
-        is_valid = latex_service.validate(latex_text)
-        
-        if not is_valid:
-            raise HTTPException(status_code=422, detail="Generated LaTeX is invalid")
-        
-        # Render the LaTeX for display
-        rendered_latex = latex_service.render(latex_text)
+        latex_text, rendered_latex = await _recognize(image)
         
         # save equation
-        equation_id = storage_service.save_equation(image_id, latex_text, rendered_latex)
+        equation_id = await io_executor.run(storage_service.save_equation, image_id, latex_text, rendered_latex)
+        trace_capture.response(equation_id=equation_id, latex=latex_text)
         
         # Create response
         response = EquationResponse(
@@ -53,28 +147,246 @@ async def process_image(file: UploadFile = File(...)):
             rendered_latex=rendered_latex
         )
         
-        # Clean up the temporary file
-        os.unlink(temp_file_path)
-        
         return response
     
     except Exception as e:
-        # Make sure to clean up the temp file in case of errors
-        if 'temp_file_path' in locals():
-            os.unlink(temp_file_path)
-        raise HTTPException(status_code=500, detail=f"OCR processing failed: {str(e)}")
+        raise _ocr_error(e)
+
+@router.post("/ocr/batch")
+async def process_batch(files: List[UploadFile] = File(...)):
+    """
+    Process many images (sent individually and/or as zip archives) in one request
+    
+    Images are decoded and queued for OCR concurrently, so they share batched
+    model calls. Results are streamed as NDJSON, one line per image in completion
+    order: `{"index", "filename", "id", "latex", "rendered_latex"}`, or
+    `{"index", "filename", "status_code", "error"}` for an image that failed.
+    Images and equations are then saved in one storage transaction and a final
+    `{"done": true, "images", "saved", "failed"}` line is sent.
+    """
+    try:
+        uploads = await read_batch_uploads(files)
+    except Exception as e:
+        raise _ocr_error(e)
+    
+    return StreamingResponse(_batch_results(uploads), media_type="application/x-ndjson")
+
+async def _batch_results(uploads: List[Tuple[str, bytes]]):
+    """Run every image of a batch through OCR and yield an NDJSON line per image"""
+    semaphore = asyncio.Semaphore(OCR_BATCH_REQUEST_CONCURRENCY)
+    images = []
+    equations = []
+    
+    async def process(index: int, filename: str, data: bytes) -> dict:
+        async with semaphore:
+            try:
+                image = await io_executor.run(ImagePayload, data, filename)
+                metadata = await io_executor.run(storage_service.write_image, image)
+                images.append(metadata)
+                
+                latex_text, rendered_latex = await _recognize(image)
+                equations.append((metadata["id"], latex_text, rendered_latex))
+                return {
+                    "index": index,
+                    "filename": filename,
+                    "id": metadata["id"],
+                    "latex": latex_text,
+                    "rendered_latex": rendered_latex
+                }
+            except Exception as e:
+                error = _ocr_error(e)
+                return {"index": index, "filename": filename, "status_code": error.status_code, "error": error.detail}
+    
+    def save() -> int:
+        return storage_service.save_image_batch(images, equations)
+    
+    tasks = [asyncio.ensure_future(process(i, filename, data)) for i, (filename, data) in enumerate(uploads)]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield json.dumps(await next_result) + "\n"
+    except BaseException:
+        # Client went away: stop the remaining work but keep what finished
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            await io_executor.run(save)
+        except Exception as e:
+            logging.error(f"Failed to save interrupted OCR batch: {str(e)}")
+        raise
+    
+    try:
+        saved = await io_executor.run(save)
+        yield json.dumps({"done": True, "images": len(uploads), "saved": saved, "failed": len(uploads) - saved}) + "\n"
+    except Exception as e:
+        logging.error(f"Failed to save OCR batch: {str(e)}")
+        yield json.dumps({"done": True, "images": len(uploads), "saved": 0, "status_code": 500, "error": f"Failed to save batch: {str(e)}"}) + "\n"
+
+@router.post("/ocr/page")
+async def process_page(file: UploadFile = File(...)):
+    """
+    Split a page of handwritten equations into lines and OCR each one
+    
+    Every line is cropped, stored as its own image and equation, and queued for
+    OCR concurrently so the lines share batched model calls instead of being
+    decoded as one long sequence. Returns the lines top to bottom, each as
+    `{"index", "bbox", "id", "latex", "rendered_latex"}` (or `{"index", "bbox",
+    "status_code", "error"}` if it failed), with `bbox` as [left, top, right,
+    bottom] in page pixels.
+    """
+    try:
+        page = await read_image_upload(file)
+        regions = await io_executor.run(page_segmenter.segment, page.data)
+        
+        stem = os.path.splitext(os.path.basename(page.filename))[0]
+        images = []
+        equations = []
+        
+        async def process(index: int, bbox: BBox, data: bytes) -> dict:
+            try:
+                crop = await io_executor.run(ImagePayload, data, f"{stem}_line{index + 1}.png")
+                metadata = await io_executor.run(storage_service.write_image, crop)
+                images.append(metadata)
+                
+                latex_text, rendered_latex = await _recognize(crop)
+                equations.append((metadata["id"], latex_text, rendered_latex))
+                return {
+                    "index": index,
+                    "bbox": list(bbox),
+                    "id": metadata["id"],
+                    "latex": latex_text,
+                    "rendered_latex": rendered_latex
+                }
+            except Exception as e:
+                error = _ocr_error(e)
+                return {"index": index, "bbox": list(bbox), "status_code": error.status_code, "error": error.detail}
+        
+        results = await asyncio.gather(*(process(i, bbox, data) for i, (bbox, data) in enumerate(regions)))
+        saved = await io_executor.run(storage_service.save_image_batch, images, equations)
+        
+        return {
+            "filename": page.filename,
+            "regions": len(results),
+            "saved": saved,
+            "equations": results
+        }
+    
+    except Exception as e:
+        raise _ocr_error(e)
+
+@router.post("/ocr/jobs", status_code=202)
+async def submit_ocr_job(
+    file: UploadFile = File(...),
+    priority: int = Form(0),
+    callback_url: Optional[str] = Form(None)
+):
+    """
+    Queue an image for OCR and return immediately with a job ID
+    
+    Poll `GET /ocr/jobs/{job_id}` for the result, or pass `callback_url` to have
+    the finished job POSTed to it. Jobs with a higher priority run first.
+    """
+    try:
+        if callback_url:
+            await asyncio.to_thread(check_callback_url, callback_url)
+        
+        image = await read_image_upload(file)
+        image_id = await io_executor.run(storage_service.save_image, image)
+        
+        job = await job_workers.submit(
+            image_id=image_id,
+            image_path=image.path,
+            filename=image.filename,
+            priority=priority,
+            callback_url=callback_url
+        )
+        return public_job(job)
+    
+    except CallbackURLError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    except Exception as e:
+        raise _ocr_error(e)
+
+@router.get("/ocr/jobs/stats")
+async def get_ocr_job_stats():
+    """
+    Get OCR job queue length, outcomes, queue wait and run times
+    """
+    try:
+        return await job_workers.stats()
+    
+    except PoolSaturatedError as e:
+        raise _saturated(e)
+
+@router.get("/ocr/jobs/{job_id}")
+async def get_ocr_job(job_id: str):
+    """
+    Get the status (and, once finished, the result) of an OCR job
+    """
+    try:
+        job = await job_workers.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        
+        return public_job(job)
+    
+    except HTTPException:
+        raise
+    except PoolSaturatedError as e:
+        raise _saturated(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get job: {str(e)}")
+
+@router.delete("/ocr/jobs/{job_id}")
+async def cancel_ocr_job(job_id: str):
+    """
+    Cancel a queued or running OCR job
+    """
+    try:
+        job = await job_workers.cancel(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job["status"] != CANCELLED:
+            raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+        
+        return public_job(job)
+    
+    except HTTPException:
+        raise
+    except PoolSaturatedError as e:
+        raise _saturated(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to cancel job: {str(e)}")
+
+@router.get("/ocr/stats")
+async def get_ocr_stats():
+    """
+    Get OCR metrics (local batching or remote replica routing, image preprocessing, LaTeX parsing, correction log)
+    """
+    return {
+        **ocr_engine.stats(),
+        "preprocessing": image_preprocessor.stats(),
+        "latex": latex_service.stats(),
+        "corrections": correction_log.stats(),
+    }
 
 @router.put("/equations/{equation_id}", response_model=EquationResponse)
 async def update_equation(equation_id: str, latex: str = Form(...)):
     """
     Update an existing equation with corrected LaTeX
     """
+    trace_capture.request(latex=latex)
     try:
+        # Reject invalid corrections before they are stored
+        latex_service.check(latex)
+        
         # New LaTeX rendering
         rendered_latex = latex_service.render(latex)
         
         # Update equation
-        success = storage_service.update_equation(equation_id, latex, rendered_latex)
+        success = await io_executor.run(storage_service.update_equation, equation_id, latex, rendered_latex)
         
         if not success:
             raise HTTPException(status_code=404, detail="Equation not found")
@@ -88,6 +400,12 @@ async def update_equation(equation_id: str, latex: str = Form(...)):
         
         return response
     
+    except HTTPException:
+        raise
+    except InvalidLaTeXError as e:
+        raise HTTPException(status_code=422, detail=e.detail())
+    except PoolSaturatedError as e:
+        raise _saturated(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update equation: {str(e)}")
 
@@ -96,19 +414,19 @@ async def save_solution(equation_id: str = Form(...), solution: str = Form(...))
     """
     Save a solution for an equation and verify if it's correct
     """
+    trace_capture.request(equation_id=equation_id, solution=solution)
     try:
-        equation_path = os.path.join(storage_service.equations_dir, f"{equation_id}.json")
-        if not os.path.exists(equation_path):
+        equation_data = await io_executor.run(storage_service.get_equation, equation_id)
+        if equation_data is None:
             raise HTTPException(status_code=404, detail="Equation not found")
             
-        with open(equation_path, "r") as f:
-            equation_data = json.load(f)
-            
         latex = equation_data["latex"]
         
-        verification_result = reasoning_service.verify_solution(latex, solution)
+        verification_result = await reasoning_service.verify_solution(latex, solution)
+        trace_capture.response(is_correct=verification_result["is_correct"])
 
-        solution_id = storage_service.save_solution(
+        solution_id = await io_executor.run(
+            storage_service.save_solution,
             equation_id=equation_id,
             solution=solution,
             is_correct=verification_result["is_correct"],
@@ -121,6 +439,12 @@ async def save_solution(equation_id: str = Form(...), solution: str = Form(...))
             "step_by_step": verification_result["step_by_step"]
         }
     
+    except HTTPException:
+        raise
+    except PoolSaturatedError as e:
+        raise _saturated(e)
+    except ReasoningUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save solution: {str(e)}")
 
@@ -130,18 +454,51 @@ async def get_equation(equation_id: str):
     Get the equation by ID
     """
     try:
-        equation_path = os.path.join(storage_service.equations_dir, f"{equation_id}.json")
-        if not os.path.exists(equation_path):
+        equation_data = await io_executor.run(storage_service.get_equation, equation_id)
+        if equation_data is None:
             raise HTTPException(status_code=404, detail="Equation not found")
-            
-        with open(equation_path, "r") as f:
-            equation_data = json.load(f)
         
+        trace_capture.response(latex=equation_data["latex"])
         return EquationResponse(
             id=equation_id,
             latex=equation_data["latex"],
             rendered_latex=equation_data["rendered_latex"]
         )
     
+    except HTTPException:
+        raise
+    except PoolSaturatedError as e:
+        raise _saturated(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get equation: {str(e)}")
+
+@router.get("/equations", response_model=List[dict])
+async def list_equations(
+    since: Optional[str] = Query(None, description="Inclusive lower bound, YYYYMMDDHHMMSS or a prefix such as YYYYMMDD"),
+    until: Optional[str] = Query(None, description="Exclusive upper bound, same format"),
+    limit: int = Query(100, ge=1, le=1000),
+    latex: Optional[str] = Query(None, description="Only equations equivalent to this LaTeX after canonicalization")
+):
+    """
+    List equations created in a time range, newest first
+    """
+    try:
+        return await io_executor.run(storage_service.list_equations, since, until, limit, latex)
+    
+    except PoolSaturatedError as e:
+        raise _saturated(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to list equations: {str(e)}")
+
+@router.get("/equations/{equation_id}/solutions", response_model=List[dict])
+async def list_solutions(equation_id: str, limit: int = Query(100, ge=1, le=1000)):
+    """
+    List solutions submitted for an equation, newest first
+    """
+    try:
+        return await io_executor.run(storage_service.list_solutions, equation_id, limit)
+    
+    except PoolSaturatedError as e:
+        raise _saturated(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to list solutions: {str(e)}")
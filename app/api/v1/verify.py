@@ -1,21 +1,41 @@
 from fastapi import APIRouter, HTTPException, Body
+from fastapi.responses import StreamingResponse
+import json
+from services.latex_service import InvalidLaTeXError, LaTeXService
 from services.reasoning_service import ReasoningService
+from services.executor_service import PoolSaturatedError
+from services.reasoning_client import ReasoningUnavailableError
+from services.trace_capture import trace_capture
 from models.solution import SolutionRequest, SolutionResponse, SolutionRequestWithPrompt
 
 router = APIRouter()
+# Shared with the OCR router so both use one verification cache
 reasoning_service = ReasoningService()
+latex_service = LaTeXService()
+
+@router.get("/verify/stats")
+async def get_verification_stats():
+    """
+    Get verification cache and request coalescing metrics
+    """
+    return reasoning_service.stats()
 
 @router.post("/verify/", response_model=SolutionResponse)
 async def verify_solution(request: SolutionRequest = Body(...)):
     """
     Verify a solution for a given math equation
     """
+    trace_capture.request(latex=request.latex, solution=request.solution)
     try:
+        # Reject malformed problems before any verification work
+        latex_service.check(request.latex)
+        
         # Process solution using reasoning service
-        verification_result = reasoning_service.verify_solution(
+        verification_result = await reasoning_service.verify_solution(
             request.latex,
             request.solution
         )
+        trace_capture.response(is_correct=verification_result["is_correct"])
         
         return {
             "is_correct": verification_result["is_correct"],
@@ -23,6 +43,12 @@ async def verify_solution(request: SolutionRequest = Body(...)):
             "step_by_step": verification_result["step_by_step"]
         }
     
+    except InvalidLaTeXError as e:
+        raise HTTPException(status_code=422, detail=e.detail())
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except ReasoningUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Verification failed: {str(e)}")
 
@@ -31,12 +57,14 @@ async def verify_solution_with_prompt(request: SolutionRequestWithPrompt = Body(
     """
     Verify a solution for a given math equation with custom prompt
     """
+    trace_capture.request(prompt=request.prompt, solution=request.solution)
     try:
         # Process solution using reasoning service with custom prompt
-        verification_result = reasoning_service.verify_solution_with_prompt(
+        verification_result = await reasoning_service.verify_solution_with_prompt(
             request.prompt,
             request.solution
         )
+        trace_capture.response(is_correct=verification_result["is_correct"])
         
         return {
             "is_correct": verification_result["is_correct"],
@@ -44,5 +72,67 @@ async def verify_solution_with_prompt(request: SolutionRequestWithPrompt = Body(
             "step_by_step": verification_result["step_by_step"]
         }
     
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except ReasoningUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Verification failed: {str(e)}")
+
+def _sse(event: str, data: dict) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _verification_events(kind: str, problem: str, solution: str):
+    """
+    Relay verification progress as server-sent events
+    
+    Emits "token" events as the model's answer streams in, a "step" event for each
+    completed line, and a terminal "result" event with the SolutionResponse (or an
+    "error" event with the status code that the non-streaming endpoint would return).
+    """
+    step_index = 0
+    try:
+        async for event, payload in reasoning_service.stream_verification(kind, problem, solution):
+            if event == "token":
+                yield _sse("token", {"text": payload})
+            elif event == "step":
+                yield _sse("step", {"index": step_index, "text": payload})
+                step_index += 1
+            else:
+                trace_capture.response(is_correct=payload["is_correct"])
+                yield _sse("result", SolutionResponse(**payload).model_dump())
+    except PoolSaturatedError as e:
+        yield _sse("error", {"status_code": 429, "detail": str(e)})
+    except ReasoningUnavailableError as e:
+        yield _sse("error", {"status_code": 503, "detail": str(e)})
+    except Exception as e:
+        yield _sse("error", {"status_code": 500, "detail": f"Verification failed: {str(e)}"})
+
+def _event_stream(kind: str, problem: str, solution: str) -> StreamingResponse:
+    return StreamingResponse(
+        _verification_events(kind, problem, solution),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/verify/stream")
+async def verify_solution_stream(request: SolutionRequest = Body(...)):
+    """
+    Verify a solution for a given math equation, streaming the answer as server-sent events
+    """
+    trace_capture.request(latex=request.latex, solution=request.solution)
+    # Rejected before the stream starts, so the client gets a plain 422
+    try:
+        latex_service.check(request.latex)
+    except InvalidLaTeXError as e:
+        raise HTTPException(status_code=422, detail=e.detail())
+    return _event_stream("latex", request.latex, request.solution)
+
+@router.post("/verify-with-prompt/stream")
+async def verify_solution_with_prompt_stream(request: SolutionRequestWithPrompt = Body(...)):
+    """
+    Verify a solution with custom prompt, streaming the answer as server-sent events
+    """
+    trace_capture.request(prompt=request.prompt, solution=request.solution)
+    return _event_stream("prompt", request.prompt, request.solution)
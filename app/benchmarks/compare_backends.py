@@ -0,0 +1,192 @@
+"""
+Compare OCR inference backends for latency and LaTeX quality.
+
+Each backend is loaded in turn and run over the same images. Outputs are
+compared with the reference backend (fp32 "torch" by default) and, when a
+labels file is given, with the ground truth. The recommended backend is the
+fastest one whose mean character error rate stays within --max-cer.
+
+Usage (from the app directory):
+    python -m benchmarks.compare_backends --images data/images \
+        --backends torch,torch-int8,onnx --output backend_comparison.json
+
+The labels file is a JSON object mapping image filenames to their LaTeX.
+"""
+import argparse
+import json
+import logging
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from services.inference_backends import INFERENCE_BACKENDS
+from services.ocr_service import OCRService
+from services.upload_service import ImagePayload
+
+logging.basicConfig(level=logging.INFO)
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".webp"}
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Levenshtein distance between two strings"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def compare_outputs(outputs: List[str], references: List[str]) -> Dict[str, float]:
+    """Exact-match rate and mean character error rate, ignoring whitespace"""
+    exact = 0
+    errors = []
+    for output, reference in zip(outputs, references):
+        output = "".join(output.split())
+        reference = "".join(reference.split())
+        exact += output == reference
+        errors.append(edit_distance(output, reference) / max(1, len(reference)))
+    return {
+        "exact_match": exact / len(outputs) if outputs else 0.0,
+        "mean_cer": statistics.mean(errors) if errors else 0.0,
+    }
+
+
+def run_backend(backend: str, images: List[Image.Image], batch_size: int) -> Optional[Dict]:
+    """Load a backend and time it over the images (the first batch is a warm-up)"""
+    started = time.perf_counter()
+    service = OCRService(inference_backend=backend)
+    load_seconds = time.perf_counter() - started
+
+    if service.model is None or service.inference_backend != backend:
+        logging.error(f"Backend {backend} could not be loaded, skipping")
+        return None
+
+    service._generate(images[:batch_size])
+
+    outputs = []
+    latencies = []
+    for i in range(0, len(images), batch_size):
+        batch = images[i:i + batch_size]
+        batch_started = time.perf_counter()
+        outputs.extend(service._generate(batch))
+        latencies.extend([(time.perf_counter() - batch_started) / len(batch)] * len(batch))
+
+    latencies.sort()
+    return {
+        "load_seconds": load_seconds,
+        "latency_seconds": {
+            "mean": statistics.mean(latencies),
+            "p50": latencies[len(latencies) // 2],
+            "p95": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))],
+        },
+        "outputs": outputs,
+    }
+
+
+def compare(
+    image_dir: Path,
+    backends: List[str],
+    reference: str,
+    labels_path: Optional[Path],
+    batch_size: int,
+    max_cer: float,
+    limit: int,
+) -> Dict:
+    """
+    Run every backend over the images and score them
+
+    Returns:
+        Per-backend latency and accuracy, per-image outputs and the recommended backend
+    """
+    paths = sorted(path for path in image_dir.iterdir() if path.suffix.lower() in IMAGE_SUFFIXES)[:limit]
+    if not paths:
+        raise SystemExit(f"No images found in {image_dir}")
+    images = [ImagePayload.from_file(str(path)).image for path in paths]
+    labels = json.loads(labels_path.read_text()) if labels_path else None
+
+    if reference not in backends:
+        backends = [reference] + backends
+
+    results = {}
+    for backend in backends:
+        logging.info(f"Running {backend} over {len(images)} images")
+        result = run_backend(backend, images, batch_size)
+        if result is not None:
+            results[backend] = result
+
+    if reference not in results:
+        raise SystemExit(f"Reference backend {reference} failed to load")
+
+    reference_outputs = results[reference]["outputs"]
+    for backend, result in results.items():
+        result["vs_reference"] = compare_outputs(result["outputs"], reference_outputs)
+        if labels:
+            labelled = [(output, labels[path.name]) for output, path in zip(result["outputs"], paths) if path.name in labels]
+            result["vs_labels"] = compare_outputs([o for o, _ in labelled], [l for _, l in labelled])
+        result["outputs"] = {path.name: output for path, output in zip(paths, result["outputs"])}
+
+    # Cheapest backend that keeps quality within the allowed error rate
+    quality_key = "vs_labels" if labels else "vs_reference"
+    acceptable = [
+        backend for backend, result in results.items()
+        if backend == reference or result[quality_key]["mean_cer"] <= max_cer
+    ]
+    recommended = min(acceptable, key=lambda backend: results[backend]["latency_seconds"]["mean"])
+
+    return {
+        "images": len(images),
+        "batch_size": batch_size,
+        "reference": reference,
+        "max_cer": max_cer,
+        "recommended": recommended,
+        "backends": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare OCR inference backends")
+    parser.add_argument("--images", required=True, help="Directory of equation images")
+    parser.add_argument("--backends", default=",".join(INFERENCE_BACKENDS), help="Comma-separated backends to compare")
+    parser.add_argument("--reference", default="torch", help="Backend the others are compared against")
+    parser.add_argument("--labels", help="JSON object mapping image filenames to ground-truth LaTeX")
+    parser.add_argument("--batch-size", type=int, default=1, help="Images per model call")
+    parser.add_argument("--max-cer", type=float, default=0.02, help="Largest acceptable mean character error rate")
+    parser.add_argument("--limit", type=int, default=100, help="Maximum number of images")
+    parser.add_argument("--output", help="Write the full report (including outputs) to this JSON file")
+    args = parser.parse_args()
+
+    report = compare(
+        Path(args.images),
+        [backend.strip() for backend in args.backends.split(",") if backend.strip()],
+        args.reference,
+        Path(args.labels) if args.labels else None,
+        max(1, args.batch_size),
+        args.max_cer,
+        args.limit,
+    )
+
+    print(f"{'backend':<12} {'load s':>8} {'mean s':>8} {'p95 s':>8} {'exact':>7} {'CER':>7}")
+    for backend, result in report["backends"].items():
+        quality = result.get("vs_labels", result["vs_reference"])
+        latency = result["latency_seconds"]
+        print(
+            f"{backend:<12} {result['load_seconds']:>8.1f} {latency['mean']:>8.3f} {latency['p95']:>8.3f} "
+            f"{quality['exact_match']:>7.2%} {quality['mean_cer']:>7.3f}"
+        )
+    print(f"Recommended: {report['recommended']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
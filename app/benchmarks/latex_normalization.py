@@ -0,0 +1,106 @@
+"""
+Measure LaTeX canonicalization throughput.
+
+Each equation is parsed and canonicalized with the memo caches cleared (the cost
+of a new equation) and then again with them warm (the cost of a repeat, which is
+what most cache and dedup lookups pay). Also reports how many distinct canonical
+forms the inputs collapse to.
+
+Usage (from the app directory):
+    python -m benchmarks.latex_normalization --equations equations.txt --repeat 20
+
+The equations file has one LaTeX equation per line; without it a built-in set
+of Nougat-style equations (with equivalent spellings) is used.
+"""
+import argparse
+import json
+import time
+from typing import Dict, List
+
+from services.latex_normalizer import canonical_latex, latex_hash
+from services.latex_parser import parse_latex
+
+SAMPLE_EQUATIONS = [
+    r"\[x^{2}+2x+1=0\]",
+    r"x^2 + 2 x + 1 = 0",
+    r"1 + 2x + x^{2} = 0",
+    r"\[\frac{d}{dx}\left(x^{3}+2x^{2}-5x+1\right)=3x^{2}+4x-5\]",
+    r"\[\left(x+1\right)^{2}=x^{2}+2x+1\]",
+    r"(1 + x)^2 = x^2 + 2x + 1",
+    r"\[\int_{0}^{1}x^{2}\,dx=\frac{1}{3}\]",
+    r"\[\sum_{i=1}^{n}i=\frac{n(n+1)}{2}\]",
+    r"\[\lim_{x\to 0}\frac{\sin x}{x}=1\]",
+    r"\[x=\frac{-b\pm\sqrt{b^{2}-4ac}}{2a}\]",
+    r"\[\begin{pmatrix}1&2\\3&4\end{pmatrix}\begin{pmatrix}x\\y\end{pmatrix}=\begin{pmatrix}5\\6\end{pmatrix}\]",
+    r"\[f(x)=\begin{cases}x^{2}&x\geq 0\\-x&x<0\end{cases}\]",
+    r"\[\sqrt[3]{27}+\log_{2}8=6\]",
+    r"\[a\cdot b=b\cdot a\]",
+    r"\[\dfrac{1}{2}\le\frac{x}{y}\]",
+    r"\[\sin^{2}\theta+\cos^{2}\theta=1\]",
+]
+
+
+def _clear_caches():
+    parse_latex.cache_clear()
+    canonical_latex.cache_clear()
+
+
+def measure(equations: List[str], repeat: int) -> Dict:
+    """
+    Time canonicalization and hashing of the equations
+
+    Returns:
+        Cold and warm throughput (equations/second) and the number of distinct canonical forms
+    """
+    cold = []
+    for _ in range(repeat):
+        _clear_caches()
+        started = time.perf_counter()
+        for equation in equations:
+            latex_hash(equation)
+        cold.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for equation in equations:
+            latex_hash(equation)
+    warm = time.perf_counter() - started
+
+    total = len(equations) * repeat
+    return {
+        "equations": len(equations),
+        "distinct_canonical_forms": len({canonical_latex(equation) for equation in equations}),
+        "invalid": sum(not parse_latex(equation).valid for equation in equations),
+        "cold_equations_per_second": total / sum(cold),
+        "warm_equations_per_second": total / warm,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure LaTeX canonicalization throughput")
+    parser.add_argument("--equations", help="File with one LaTeX equation per line")
+    parser.add_argument("--repeat", type=int, default=20, help="Passes over the equations")
+    parser.add_argument("--output", help="Write the measurements to this JSON file")
+    args = parser.parse_args()
+
+    if args.equations:
+        with open(args.equations) as f:
+            equations = [line.strip() for line in f if line.strip()]
+    else:
+        equations = SAMPLE_EQUATIONS
+    if not equations:
+        raise SystemExit("No equations to measure")
+
+    report = measure(equations, max(1, args.repeat))
+
+    print(f"Equations: {report['equations']} ({report['distinct_canonical_forms']} distinct canonical forms, {report['invalid']} invalid)")
+    print(f"Cold (parse + canonicalize + hash): {report['cold_equations_per_second']:>12,.0f} equations/s")
+    print(f"Warm (memoized):                    {report['warm_equations_per_second']:>12,.0f} equations/s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+"""
+Load-test the API in-process with offline stubs.
+
+Synthetic handwritten-style equation images (benchmarks.synthetic_images) are
+sent through the real app (main:app, driven over ASGI without a network hop),
+one endpoint at a time with --concurrency requests in flight:
+
+    POST /api/v1/ocr/                 every image
+    GET  /api/v1/equations/{id}       every equation created by the OCR phase
+    POST /api/v1/verify/              every problem with its solution
+    POST /api/v1/solutions/           every equation with its solution
+
+By default the OCR model is replaced by a synthetic one that returns each
+image's LaTeX after a simulated inference delay (--ocr-ms-per-batch +
+--ocr-ms-per-image), so the run measures everything around the model; --ocr model
+loads the real OCRService instead (point --ocr-model at a small checkpoint).
+Verifications the symbolic fast path doesn't absorb go to services.openai_stub,
+started as a subprocess on a local port, so RSS is the app's own.
+
+Each run starts from an empty working directory (database, caches, correction
+log) with a fixed --seed, so runs on different commits are comparable. The
+report is JSON with throughput, latency percentiles, errors and RSS per endpoint
+(keys sorted, so reports diff cleanly); --baseline prints the change against an
+earlier report and --max-regression turns it into a gate (exit status 1).
+
+Usage (from the app directory):
+    python -m benchmarks.load_test --requests 200 --concurrency 16 --output load.json
+    python -m benchmarks.load_test --requests 200 --concurrency 16 --baseline load.json --max-regression 10
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.synthetic_images import generate_samples
+
+APP_DIR = Path(__file__).resolve().parents[1]
+MB = 1024 * 1024
+ENDPOINTS = ["ocr", "equations", "verify", "solutions"]
+ROUTES = {
+    "ocr": "POST /api/v1/ocr/",
+    "equations": "GET /api/v1/equations/{id}",
+    "verify": "POST /api/v1/verify/",
+    "solutions": "POST /api/v1/solutions/",
+}
+
+
+class SyntheticOCRService:
+    """
+    Stand-in for OCRService without a model
+
+    Returns the LaTeX each synthetic image was generated from (looked up by
+    content hash) after sleeping like a batched model call would.
+    """
+
+    def __init__(self, labels: Dict[str, str], ms_per_batch: float, ms_per_image: float):
+        self.labels = labels
+        self.ms_per_batch = ms_per_batch
+        self.ms_per_image = ms_per_image
+        self.model_path = "synthetic"
+        self.inference_backend = "synthetic"
+        self.model = self
+        self.batches = 0
+
+    def warm_up(self):
+        pass
+
+    def process_images(self, images: List[Any]) -> List[str]:
+        self.batches += 1
+        time.sleep((self.ms_per_batch + self.ms_per_image * len(images)) / 1000)
+        return [self.labels.get(getattr(image, "sha256", None), "x=0") for image in images]
+
+    def process_image(self, image: Any) -> str:
+        return self.process_images([image])[0]
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        return None
+
+    def decoding_stats(self) -> Optional[Dict[str, Any]]:
+        return None
+
+
+def read_rss() -> int:
+    """Current resident set size of this process in bytes (peak RSS where /proc isn't available)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_openai_stub(latency_ms: float, jitter_ms: float, timeout: float = 30) -> Tuple[subprocess.Popen, str]:
+    """
+    Serve services.openai_stub on a free local port
+
+    Returns:
+        The stub process and its base URL
+    """
+    port = _free_port()
+    env = dict(os.environ, STUB_LATENCY_MS=str(latency_ms), STUB_LATENCY_JITTER_MS=str(jitter_ms))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "services.openai_stub:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=APP_DIR,
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return process, url
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.terminate()
+    raise SystemExit("OpenAI stub did not start")
+
+
+def configure_environment(args, workdir: Path, stub_url: str):
+    """Point the app at the working directory and the stub (read by core.config at import)"""
+    os.environ.update({
+        "OCR_MODE": "local",
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": f"{stub_url}/v1",
+        "REASONING_RATE_PER_SECOND": str(args.reasoning_rate),
+    })
+    if args.ocr == "model" and args.ocr_model:
+        os.environ["OCR_MODEL_PATH"] = args.ocr_model
+    if str(APP_DIR) not in sys.path:
+        sys.path.insert(0, str(APP_DIR))
+    # Every data path in the app is relative to the working directory
+    os.chdir(workdir)
+
+
+class RSSSampler:
+    """Samples RSS in the background while a phase runs"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.start = self.peak = self.end = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            self.peak = max(self.peak, read_rss())
+            await asyncio.sleep(self.interval)
+
+    def __enter__(self):
+        self.start = self.peak = read_rss()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+        self.end = read_rss()
+        self.peak = max(self.peak, self.end)
+        return False
+
+
+async def run_phase(
+    calls: List[Callable[[], Awaitable[httpx.Response]]], concurrency: int
+) -> Tuple[Dict[str, Any], List[Optional[httpx.Response]]]:
+    """
+    Issue the calls with at most `concurrency` in flight
+
+    Returns:
+        Throughput, latency percentiles (successful requests), error counts by status and RSS;
+        and the response to each call (None if it raised)
+    """
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    responses: List[Optional[httpx.Response]] = [None] * len(calls)
+    pending = iter(range(len(calls)))
+
+    async def worker():
+        for i in pending:
+            started = time.perf_counter()
+            try:
+                response = await calls[i]()
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                continue
+            elapsed = time.perf_counter() - started
+            responses[i] = response
+            if response.status_code < 400:
+                latencies.append(elapsed)
+            else:
+                errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+
+    with RSSSampler() as rss:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        seconds = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(calls),
+        "ok": len(latencies),
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "throughput_rps": round(len(latencies) / seconds, 2) if seconds else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+        "rss_mb": {
+            "start": round(rss.start / MB, 1),
+            "end": round(rss.end / MB, 1),
+            "peak": round(rss.peak / MB, 1),
+        },
+    }, responses
+
+
+async def run_load_test(args, samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    import main
+    from api.v1 import ocr
+
+    if args.ocr == "stub":
+        labels = {hashlib.sha256(sample["data"]).hexdigest(): sample["latex"] for sample in samples}
+        ocr.model_registry.factory = lambda: SyntheticOCRService(labels, args.ocr_ms_per_batch, args.ocr_ms_per_image)
+
+    endpoints = [endpoint.strip() for endpoint in args.endpoints.split(",") if endpoint.strip()]
+    results: Dict[str, Any] = {}
+    transport = httpx.ASGITransport(app=main.app)
+
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=args.timeout) as client:
+            # Wait for the model, then warm up the OCR path outside the measurement
+            deadline = time.monotonic() + args.timeout
+            while (await client.get("/health/ready")).status_code != 200:
+                if time.monotonic() > deadline:
+                    raise SystemExit("OCR model did not become ready")
+                await asyncio.sleep(0.1)
+            for sample in samples[:args.warmup]:
+                await client.post("/api/v1/ocr/", files={"file": (sample["name"], sample["data"], sample["content_type"])})
+
+            def upload(sample):
+                return lambda: client.post("/api/v1/ocr/", files={"file": (sample["name"], sample["data"], sample["content_type"])})
+
+            equation_ids: List[Optional[str]] = []
+            if "ocr" in endpoints or "equations" in endpoints or "solutions" in endpoints:
+                phase, responses = await run_phase([upload(sample) for sample in samples], args.concurrency)
+                if "ocr" in endpoints:
+                    results[ROUTES["ocr"]] = phase
+                equation_ids = [
+                    response.json().get("id") if response is not None and response.status_code == 200 else None
+                    for response in responses
+                ]
+            created = [(sample, equation_id) for sample, equation_id in zip(samples, equation_ids) if equation_id]
+
+            if "equations" in endpoints:
+                results[ROUTES["equations"]], _ = await run_phase(
+                    [(lambda i=equation_id: client.get(f"/api/v1/equations/{i}")) for _, equation_id in created],
+                    args.concurrency,
+                )
+            if "verify" in endpoints:
+                results[ROUTES["verify"]], _ = await run_phase(
+                    [
+                        (lambda s=sample: client.post("/api/v1/verify/", json={"latex": s["latex"], "solution": s["solution"]}))
+                        for sample in samples
+                    ],
+                    args.concurrency,
+                )
+            if "solutions" in endpoints:
+                results[ROUTES["solutions"]], _ = await run_phase(
+                    [
+                        (lambda s=sample, i=equation_id: client.post(
+                            "/api/v1/solutions/", data={"equation_id": i, "solution": s["solution"]}
+                        ))
+                        for sample, equation_id in created
+                    ],
+                    args.concurrency,
+                )
+
+            stats = {
+                "ocr": (await client.get("/api/v1/ocr/stats")).json(),
+                "verify": (await client.get("/api/v1/verify/stats")).json(),
+            }
+
+    return {"endpoints": results, "stats": stats}
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(baseline: Dict[str, Any], report: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Relative change of each endpoint's throughput and latency percentiles against a baseline
+
+    Returns:
+        One row per endpoint present in both reports (changes in percent; positive latency = slower)
+    """
+    rows = []
+    for route, current in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(route)
+        if previous is None:
+            continue
+
+        def change(old: float, new: float) -> float:
+            return round((new - old) / old * 100, 1) if old else 0.0
+
+        row = {"endpoint": route, "throughput": change(previous["throughput_rps"], current["throughput_rps"])}
+        for key in ("p50", "p95", "p99"):
+            row[key] = change(previous["latency_ms"][key], current["latency_ms"][key])
+        row["rss_peak"] = change(previous["rss_mb"]["peak"], current["rss_mb"]["peak"])
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API in-process with offline OCR and OpenAI stubs")
+    parser.add_argument("--requests", type=int, default=200, help="Images (and so requests per endpoint)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help=f"Comma-separated subset of {','.join(ENDPOINTS)}")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic images and problems")
+    parser.add_argument("--warmup", type=int, default=8, help="OCR requests sent before measuring")
+    parser.add_argument("--ocr", choices=["stub", "model"], default="stub", help="Synthetic OCR or the real OCRService")
+    parser.add_argument("--ocr-model", help="OCR_MODEL_PATH for --ocr model (e.g. a small local checkpoint)")
+    parser.add_argument("--ocr-ms-per-batch", type=float, default=20, help="Synthetic OCR: fixed time per model call")
+    parser.add_argument("--ocr-ms-per-image", type=float, default=10, help="Synthetic OCR: time per image in a batch")
+    parser.add_argument("--stub-latency-ms", type=float, default=200, help="OpenAI stub response time")
+    parser.add_argument("--stub-jitter-ms", type=float, default=0, help="OpenAI stub response time jitter")
+    parser.add_argument("--reasoning-rate", type=float, default=0, help="REASONING_RATE_PER_SECOND (0: unlimited)")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for a response or the model")
+    parser.add_argument("--workdir", help="Working directory for the app's data (default: a new temporary directory)")
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    parser.add_argument("--max-regression", type=float, help="Fail if throughput drops or p95 grows by more than this percent")
+    args = parser.parse_args()
+
+    samples = generate_samples(max(1, args.requests), args.seed)
+    output = Path(args.output).resolve() if args.output else None
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+
+    stub, stub_url = start_openai_stub(args.stub_latency_ms, args.stub_jitter_ms)
+    temp_dir = None
+    if args.workdir:
+        workdir = Path(args.workdir).resolve()
+        workdir.mkdir(parents=True, exist_ok=True)
+    else:
+        temp_dir = tempfile.TemporaryDirectory(prefix="write2solve-load-")
+        workdir = Path(temp_dir.name)
+
+    try:
+        configure_environment(args, workdir, stub_url)
+        result = asyncio.run(run_load_test(args, samples))
+    finally:
+        stub.terminate()
+        stub.wait(timeout=10)
+        os.chdir(APP_DIR)
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    report = {
+        "benchmark": "load_test",
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "config": {
+            key: value for key, value in vars(args).items()
+            if key not in ("output", "baseline", "max_regression", "workdir")
+        },
+        "images_mb": round(sum(len(sample["data"]) for sample in samples) / MB, 2),
+        **result,
+    }
+
+    print(f"{'endpoint':<30} {'ok':>6} {'err':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'RSS MB':>8}")
+    for route, row in report["endpoints"].items():
+        latency = row["latency_ms"]
+        print(
+            f"{route:<30} {row['ok']:>6} {sum(row['errors'].values()):>5} {row['throughput_rps']:>8.1f} "
+            f"{latency['p50']:>9.1f} {latency['p95']:>9.1f} {latency['p99']:>9.1f} {row['rss_mb']['peak']:>8.0f}"
+        )
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if baseline is not None:
+        rows = compare(baseline, report)
+        print(f"\nChange vs {baseline.get('commit') or args.baseline} (%; latency and RSS: + is worse, throughput: - is worse)")
+        for row in rows:
+            print(
+                f"{row['endpoint']:<30} req/s {row['throughput']:>+7.1f}  p50 {row['p50']:>+7.1f}  "
+                f"p95 {row['p95']:>+7.1f}  p99 {row['p99']:>+7.1f}  RSS {row['rss_peak']:>+7.1f}"
+            )
+        if args.max_regression is not None:
+            regressed = [
+                row["endpoint"] for row in rows
+                if row["throughput"] < -args.max_regression or row["p95"] > args.max_regression
+            ]
+            if regressed:
+                print(f"FAIL: regression over {args.max_regression:.0f}% on {', '.join(regressed)}")
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+"""
+Replay captured request traces against a build and flag regressions.
+
+Reads the traces written with TRACE_CAPTURE_ENABLED=true (services.trace_capture)
+and re-issues the replayable requests against --target:
+
+    POST /api/v1/ocr/                        the captured image, found by SHA-256
+    GET, PUT /api/v1/equations/{id}
+    POST /api/v1/verify/, /verify-with-prompt/ (and their /stream variants)
+    POST /api/v1/solutions/
+
+Requests are sent at the captured rate (--speed 1), a multiple of it (--speed 4),
+or as fast as --max-in-flight allows (--speed 0). Equation IDs created by a
+replayed OCR request are substituted in the requests that used the captured ID;
+IDs from outside the trace are sent as captured (replay against a copy of the
+captured data to resolve them). Each replayed request carries X-Trace-ID
+"replay-<captured trace ID>".
+
+Images are looked up by content hash in --images directories (files named
+<sha256>.<ext>, e.g. extracted tools.export_dataset shards) and, with --storage,
+in the configured storage (run from the captured backend's app directory).
+Requests with redacted text, missing images or unsupported routes are skipped
+and counted.
+
+The report compares, per route, the replayed latency distribution with the
+captured one (or with the replayed one of an earlier report, --baseline, which
+is fairer across machines), status codes, and outputs: OCR LaTeX (compared in
+canonical form, so equivalent spellings match) and verification verdicts.
+--max-regression and --max-mismatch-rate make it a gate (exit status 1).
+
+Usage (from the app directory):
+    python -m benchmarks.replay --traces data/traces --images data/images --target http://localhost:8000 \
+        --speed 2 --output replay.json
+    python -m benchmarks.replay --traces data/traces --storage --target http://localhost:8000 \
+        --baseline replay.json --max-regression 15 --max-mismatch-rate 0.01
+"""
+import argparse
+import asyncio
+import json
+import mimetypes
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from services.correction_log import CorrectionLog
+from services.latex_normalizer import canonical_latex
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".webp", ".gif"}
+STREAM_ROUTES = {"/api/v1/verify/stream", "/api/v1/verify-with-prompt/stream"}
+
+
+class SkipRecord(Exception):
+    """A captured request that can't be replayed (the message is the reason)"""
+
+
+def percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+
+def latency_summary(samples: List[float]) -> Dict[str, Any]:
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "mean": round(sum(samples) / len(samples), 2) if samples else 0.0,
+        "p50": round(percentile(samples, 0.50), 2),
+        "p95": round(percentile(samples, 0.95), 2),
+        "p99": round(percentile(samples, 0.99), 2),
+    }
+
+
+def load_records(trace_dirs: List[str], include_active: bool) -> List[Dict[str, Any]]:
+    """Captured requests from every trace directory, in the order they started"""
+    records = []
+    for directory in trace_dirs:
+        log = CorrectionLog(directory, prefix="traces")
+        records.extend(record for record in log.iter_records(include_active=include_active) if record.get("type") == "request")
+    return sorted(records, key=lambda record: record["started"])
+
+
+class ImageSource:
+    """Finds captured images by content hash in image directories and, optionally, in storage"""
+
+    def __init__(self, directories: List[str], use_storage: bool):
+        self.files: Dict[str, Path] = {}
+        for directory in directories:
+            for path in Path(directory).rglob("*"):
+                if path.suffix.lower() in IMAGE_SUFFIXES:
+                    self.files.setdefault(path.stem, path)
+        self.storage = None
+        if use_storage:
+            from services.storage_service import StorageService
+            self.storage = StorageService()
+
+    def resolve(self, sha256: str) -> Optional[Path]:
+        path = self.files.get(sha256)
+        if path is None and self.storage is not None:
+            image = self.storage.find_images([sha256]).get(sha256)
+            if image is not None:
+                path = self.storage.image_file(image)
+                self.files[sha256] = path
+        return path if path is not None and path.exists() else None
+
+
+def _text(record: Dict[str, Any], field: str) -> str:
+    value = record["request"].get(field)
+    if value is None:
+        raise SkipRecord(f"no {field}")
+    if not isinstance(value, str):
+        raise SkipRecord("redacted")
+    return value
+
+
+def build_request(record: Dict[str, Any], images: ImageSource) -> Tuple[str, str, Dict[str, Any]]:
+    """
+    HTTP request that replays a captured one (equation IDs not yet substituted)
+
+    Returns:
+        (method, path, httpx request arguments)
+
+    Raises:
+        SkipRecord: If the request can't be replayed
+    """
+    route, method = record.get("route"), record.get("method")
+    equation_id = record.get("path_params", {}).get("equation_id")
+
+    if route == "/api/v1/ocr/" and method == "POST":
+        sha256 = record["request"].get("image_sha256")
+        path = images.resolve(sha256) if sha256 else None
+        if path is None:
+            raise SkipRecord("image not found")
+        content_type = mimetypes.guess_type(path.name)[0] or "image/png"
+        return method, route, {"files": {"file": (path.name, path.read_bytes(), content_type)}}
+    if route == "/api/v1/equations/{equation_id}" and method == "GET":
+        return method, f"/api/v1/equations/{equation_id}", {}
+    if route == "/api/v1/equations/{equation_id}" and method == "PUT":
+        return method, f"/api/v1/equations/{equation_id}", {"data": {"latex": _text(record, "latex")}}
+    if route in ("/api/v1/verify/", "/api/v1/verify/stream"):
+        return method, route, {"json": {"latex": _text(record, "latex"), "solution": _text(record, "solution")}}
+    if route in ("/api/v1/verify-with-prompt/", "/api/v1/verify-with-prompt/stream"):
+        return method, route, {"json": {"prompt": _text(record, "prompt"), "solution": _text(record, "solution")}}
+    if route == "/api/v1/solutions/" and method == "POST":
+        return method, route, {"data": {"equation_id": _text(record, "equation_id"), "solution": _text(record, "solution")}}
+    raise SkipRecord("unsupported route")
+
+
+def _stream_result(body: str) -> Optional[Dict[str, Any]]:
+    """The terminal "result" event of a server-sent verification stream"""
+    event = None
+    for line in body.splitlines():
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: ") and event == "result":
+            return json.loads(line[len("data: "):])
+    return None
+
+
+class Replayer:
+    """Re-issues captured requests and collects what the target returned"""
+
+    def __init__(self, client: httpx.AsyncClient, images: ImageSource, speed: float, max_in_flight: int):
+        self.client = client
+        self.images = images
+        self.speed = speed
+        self.slots = asyncio.Semaphore(max(1, max_in_flight))
+        # Captured equation ID -> ID returned by the replayed OCR request that created it
+        self.equation_ids: Dict[str, asyncio.Future] = {}
+        self.skipped: Dict[str, int] = {}
+        self.results: List[Dict[str, Any]] = []
+
+    async def run(self, records: List[Dict[str, Any]]):
+        loop = asyncio.get_running_loop()
+        prepared = []
+        for record in records:
+            try:
+                prepared.append((record, build_request(record, self.images)))
+            except SkipRecord as e:
+                self.skipped[str(e)] = self.skipped.get(str(e), 0) + 1
+                continue
+            created = record["response"].get("equation_id") if record["route"] == "/api/v1/ocr/" else None
+            if created:
+                self.equation_ids[created] = loop.create_future()
+
+        if not prepared:
+            return
+        first = prepared[0][0]["started"]
+        started = time.monotonic()
+        tasks = []
+        for record, request in prepared:
+            if self.speed > 0:
+                delay = (record["started"] - first) / self.speed - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await self.slots.acquire()
+            tasks.append(loop.create_task(self._replay(record, request)))
+        await asyncio.gather(*tasks)
+
+    async def _resolve_id(self, equation_id: str) -> str:
+        future = self.equation_ids.get(equation_id)
+        if future is None:
+            return equation_id
+        # Waits for the replayed OCR request; falls back to the captured ID if it failed
+        return await future or equation_id
+
+    async def _replay(self, record: Dict[str, Any], request: Tuple[str, str, Dict[str, Any]]):
+        method, path, kwargs = request
+        result = {"record": record, "status": None, "latency_ms": None, "output": {}}
+        try:
+            captured_id = record.get("path_params", {}).get("equation_id") or record["request"].get("equation_id")
+            if captured_id and captured_id in self.equation_ids:
+                replayed_id = await self._resolve_id(captured_id)
+                path = path.replace(captured_id, replayed_id)
+                if "data" in kwargs and "equation_id" in kwargs["data"]:
+                    kwargs = {**kwargs, "data": {**kwargs["data"], "equation_id": replayed_id}}
+
+            headers = {"X-Trace-ID": f"replay-{record['trace_id']}"} if record.get("trace_id") else None
+            sent = time.perf_counter()
+            response = await self.client.request(method, path, headers=headers, **kwargs)
+            result["latency_ms"] = (time.perf_counter() - sent) * 1000
+            result["status"] = response.status_code
+            if response.status_code < 400:
+                result["output"] = self._output(record["route"], response)
+        except Exception as e:
+            result["error"] = type(e).__name__
+        finally:
+            self.slots.release()
+            created = record["response"].get("equation_id") if record["route"] == "/api/v1/ocr/" else None
+            if created and not self.equation_ids[created].done():
+                self.equation_ids[created].set_result(result["output"].get("equation_id"))
+            self.results.append(result)
+
+    def _output(self, route: str, response: httpx.Response) -> Dict[str, Any]:
+        if route in STREAM_ROUTES:
+            payload = _stream_result(response.text) or {}
+            return {"is_correct": payload.get("is_correct")}
+        payload = response.json()
+        if route == "/api/v1/ocr/":
+            return {"equation_id": payload.get("id"), "latex": payload.get("latex")}
+        if route in ("/api/v1/verify/", "/api/v1/verify-with-prompt/", "/api/v1/solutions/"):
+            return {"is_correct": payload.get("is_correct")}
+        return {}
+
+
+def _change(old: float, new: float) -> float:
+    return round((new - old) / old * 100, 1) if old else 0.0
+
+
+def build_report(
+    records: List[Dict[str, Any]],
+    replayer: Replayer,
+    baseline: Optional[Dict[str, Any]],
+    examples: int,
+) -> Dict[str, Any]:
+    """
+    Compare the replay with the capture (or a baseline replay)
+
+    Returns:
+        Report with per-route latency distributions and changes, status and output mismatches
+    """
+    captured: Dict[str, List[float]] = {}
+    for record in records:
+        if record.get("route") and record.get("status", 500) < 400:
+            captured.setdefault(f"{record['method']} {record['route']}", []).append(record["duration_ms"])
+
+    replayed: Dict[str, List[float]] = {}
+    status_mismatches = []
+    outputs = {"ocr_latex": {"compared": 0, "different": 0, "examples": []}, "verdict": {"compared": 0, "different": 0, "examples": []}}
+    for result in replayer.results:
+        record = result["record"]
+        key = f"{record['method']} {record['route']}"
+        if result["status"] is not None and result["status"] < 400:
+            replayed.setdefault(key, []).append(result["latency_ms"])
+        if result["status"] != record.get("status"):
+            status_mismatches.append({
+                "route": key, "trace_id": record.get("trace_id"),
+                "captured": record.get("status"), "replayed": result["status"] or result.get("error"),
+            })
+
+        output = result["output"]
+        if "latex" in output and isinstance(record["response"].get("latex"), str):
+            outputs["ocr_latex"]["compared"] += 1
+            if canonical_latex(output["latex"] or "") != canonical_latex(record["response"]["latex"]):
+                outputs["ocr_latex"]["different"] += 1
+                outputs["ocr_latex"]["examples"].append({
+                    "trace_id": record.get("trace_id"), "image_sha256": record["request"].get("image_sha256"),
+                    "captured": record["response"]["latex"], "replayed": output["latex"],
+                })
+        if "is_correct" in output and record["response"].get("is_correct") is not None:
+            outputs["verdict"]["compared"] += 1
+            if output["is_correct"] != record["response"]["is_correct"]:
+                outputs["verdict"]["different"] += 1
+                outputs["verdict"]["examples"].append({
+                    "route": key, "trace_id": record.get("trace_id"),
+                    "captured": record["response"]["is_correct"], "replayed": output["is_correct"],
+                })
+
+    routes = {}
+    for key in sorted(set(captured) | set(replayed)):
+        reference_name = "baseline" if baseline is not None else "captured"
+        if baseline is not None:
+            reference = baseline.get("routes", {}).get(key, {}).get("replayed", latency_summary([]))
+        else:
+            reference = latency_summary(captured.get(key, []))
+        current = latency_summary(replayed.get(key, []))
+        routes[key] = {
+            reference_name: reference,
+            "replayed": current,
+            "change_percent": {p: _change(reference[p], current[p]) for p in ("p50", "p95", "p99")},
+        }
+
+    for output in outputs.values():
+        output["mismatch_rate"] = round(output["different"] / output["compared"], 4) if output["compared"] else 0.0
+        output["examples"] = output["examples"][:examples]
+
+    return {
+        "records": len(records),
+        "replayed": len(replayer.results),
+        "skipped": replayer.skipped,
+        "routes": routes,
+        "status_mismatches": {"count": len(status_mismatches), "examples": status_mismatches[:examples]},
+        "outputs": outputs,
+    }
+
+
+def find_regressions(report: Dict[str, Any], max_regression: Optional[float], max_mismatch_rate: Optional[float]) -> List[str]:
+    regressions = []
+    if max_regression is not None:
+        for route, row in report["routes"].items():
+            if row["replayed"]["count"] and row["change_percent"]["p95"] > max_regression:
+                regressions.append(f"{route}: p95 {row['change_percent']['p95']:+.1f}%")
+    if max_mismatch_rate is not None:
+        for name, output in report["outputs"].items():
+            if output["mismatch_rate"] > max_mismatch_rate:
+                regressions.append(f"{name}: {output['different']}/{output['compared']} outputs differ")
+        if report["replayed"] and report["status_mismatches"]["count"] / report["replayed"] > max_mismatch_rate:
+            regressions.append(f"status: {report['status_mismatches']['count']}/{report['replayed']} status codes differ")
+    return regressions
+
+
+async def replay(args, records: List[Dict[str, Any]]) -> Replayer:
+    images = ImageSource(args.images or [], args.storage)
+    async with httpx.AsyncClient(base_url=args.target, timeout=args.timeout) as client:
+        replayer = Replayer(client, images, args.speed, args.max_in_flight)
+        await replayer.run(records)
+    return replayer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured request traces and flag regressions")
+    parser.add_argument("--traces", action="append", help="Trace capture directory (repeatable; default data/traces)")
+    parser.add_argument("--target", default="http://localhost:8000", help="Base URL of the build under test")
+    parser.add_argument("--images", action="append", help="Directory of images named <sha256>.<ext> (repeatable)")
+    parser.add_argument("--storage", action="store_true", help="Also resolve images from the configured storage")
+    parser.add_argument("--speed", type=float, default=1.0, help="Rate multiplier (1: as captured, 0: as fast as possible)")
+    parser.add_argument("--max-in-flight", type=int, default=64, help="Replayed requests in flight at once")
+    parser.add_argument("--include-active", action="store_true", help="Also read trace segments still being written")
+    parser.add_argument("--limit", type=int, help="Replay only the first N captured requests")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for each response")
+    parser.add_argument("--baseline", help="Earlier replay report to compare latencies against (instead of the capture)")
+    parser.add_argument("--max-regression", type=float, help="Fail if a route's p95 grows by more than this percent")
+    parser.add_argument("--max-mismatch-rate", type=float, help="Fail if more than this fraction of outputs or statuses differ")
+    parser.add_argument("--examples", type=int, default=20, help="Mismatch examples kept in the report")
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    records = load_records(args.traces or ["data/traces"], args.include_active)
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        raise SystemExit("No captured requests found")
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+
+    started = time.perf_counter()
+    replayer = asyncio.run(replay(args, records))
+    report = build_report(records, replayer, baseline, args.examples)
+    report.update({
+        "target": args.target,
+        "speed": args.speed,
+        "seconds": round(time.perf_counter() - started, 3),
+        "captured_seconds": round(records[-1]["started"] - records[0]["started"], 3),
+    })
+    report["regressions"] = find_regressions(report, args.max_regression, args.max_mismatch_rate)
+
+    reference = "baseline" if baseline is not None else "captured"
+    print(f"Replayed {report['replayed']} of {report['records']} requests in {report['seconds']:.1f}s; skipped: {report['skipped'] or 'none'}")
+    print(f"{'route':<45} {'count':>6} {reference + ' p95':>13} {'p95 ms':>9} {'change':>8}")
+    for route, row in report["routes"].items():
+        print(
+            f"{route:<45} {row['replayed']['count']:>6} {row[reference]['p95']:>13.1f} "
+            f"{row['replayed']['p95']:>9.1f} {row['change_percent']['p95']:>+7.1f}%"
+        )
+    for name, output in report["outputs"].items():
+        print(f"{name}: {output['different']}/{output['compared']} differ")
+    print(f"status codes: {report['status_mismatches']['count']} differ")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if report["regressions"]:
+        print("FAIL: " + "; ".join(report["regressions"]))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
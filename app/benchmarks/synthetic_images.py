@@ -0,0 +1,195 @@
+"""
+Generate synthetic handwritten-style equation images.
+
+Each sample is a random problem (linear and quadratic equations, derivatives,
+integrals, sums) with its LaTeX, a correct or wrong solution, and an image of
+the equation drawn glyph by glyph with jittered size, baseline and slant, then
+rotated, blurred, noised and scaled, and saved as PNG or JPEG, so the load test
+sees a spread of image sizes and preprocessing work. The images are for
+exercising the pipeline, not for measuring OCR accuracy.
+
+The same --seed always produces the same samples.
+
+Usage (from the app directory):
+    python -m benchmarks.synthetic_images --out data/synthetic --count 200 --seed 0
+
+Writes the images plus labels.json (filename -> LaTeX, the labels format of
+benchmarks.compare_backends) and problems.json (the full samples without image bytes).
+"""
+import argparse
+import io
+import json
+import random
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+
+def _linear(rng: random.Random) -> Tuple[str, str, str, str]:
+    x, a, b = rng.randint(-9, 9), rng.randint(2, 9), rng.randint(1, 20)
+    c = a * x + b
+    return f"{a}x+{b}={c}", f"{a}x + {b} = {c}", f"x={x}", f"x={x + rng.choice([-1, 1])}"
+
+
+def _quadratic(rng: random.Random) -> Tuple[str, str, str, str]:
+    r1, r2 = rng.randint(-6, 6), rng.randint(-6, 6)
+    b, c = -(r1 + r2), r1 * r2
+    linear = f"{'+' if b >= 0 else '-'}{abs(b)}x" if b else ""
+    constant = f"{'+' if c >= 0 else '-'}{abs(c)}" if c else ""
+    latex = f"x^{{2}}{linear}{constant}=0"
+    text = " ".join(["x^2"] + [part for term in (linear, constant) if term for part in (term[0], term[1:])] + ["=", "0"])
+    return latex, text, f"x={r1}, x={r2}", f"x={r1 + 1}, x={r2}"
+
+
+def _derivative(rng: random.Random) -> Tuple[str, str, str, str]:
+    n, a = rng.randint(2, 6), rng.randint(1, 9)
+    latex = f"\\frac{{d}}{{dx}}\\left(x^{{{n}}}+{a}x\\right)"
+    return latex, f"d/dx (x^{n} + {a}x)", f"{n}x^{{{n - 1}}}+{a}", f"{n}x^{{{n}}}+{a}"
+
+
+def _integral(rng: random.Random) -> Tuple[str, str, str, str]:
+    n = rng.randint(1, 5)
+    latex = f"\\int_{{0}}^{{1}}x^{{{n}}}\\,dx"
+    return latex, f"int_0^1 x^{n} dx", f"\\frac{{1}}{{{n + 1}}}", f"\\frac{{1}}{{{n}}}"
+
+
+def _sum(rng: random.Random) -> Tuple[str, str, str, str]:
+    n = rng.randint(3, 20)
+    latex = f"\\sum_{{i=1}}^{{{n}}}i"
+    return latex, f"sum_(i=1)^{n} i", f"{n * (n + 1) // 2}", f"{n * n // 2}"
+
+
+# Problem kinds and their share of the samples
+PROBLEMS: List[Tuple[str, Callable, float]] = [
+    ("linear", _linear, 0.3),
+    ("quadratic", _quadratic, 0.25),
+    ("derivative", _derivative, 0.2),
+    ("integral", _integral, 0.15),
+    ("sum", _sum, 0.1),
+]
+
+
+def _font(size: int) -> ImageFont.ImageFont:
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 only has the fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def render_equation(text: str, rng: random.Random) -> Image.Image:
+    """
+    Draw text as an uneven, hand-written looking equation on paper
+
+    Args:
+        text: Equation text (ASCII)
+        rng: Random source (all variation comes from it)
+
+    Returns:
+        Grayscale image
+    """
+    size = rng.randint(28, 48)
+    font = _font(size)
+    ink = rng.randint(0, 60)
+    paper = rng.randint(225, 255)
+    width = int(len(text) * size * 0.8) + 2 * size
+    height = size * 3
+    page = Image.new("L", (width, height), paper)
+
+    x = size
+    for char in text:
+        glyph_size = max(12, int(size * rng.uniform(0.85, 1.15)))
+        glyph_font = _font(glyph_size)
+        tile = Image.new("L", (glyph_size * 2, glyph_size * 2), 0)
+        ImageDraw.Draw(tile).text(
+            (glyph_size // 2, glyph_size // 3), char, fill=255, font=glyph_font, stroke_width=rng.randint(0, 1)
+        )
+        tile = tile.rotate(rng.uniform(-12, 12), resample=Image.BILINEAR)
+        y = height // 2 - glyph_size + int(rng.gauss(0, size * 0.08))
+        page.paste(Image.new("L", tile.size, ink), (x - glyph_size // 2, y), tile)
+        x += int(font.getlength(char) * rng.uniform(0.9, 1.25)) if char != " " else int(size * rng.uniform(0.3, 0.6))
+
+    page = page.crop((0, 0, min(width, x + size), height))
+    page = page.rotate(rng.uniform(-4, 4), resample=Image.BILINEAR, expand=True, fillcolor=paper)
+    page = page.filter(ImageFilter.GaussianBlur(rng.uniform(0.3, 1.0)))
+
+    noise = np.random.default_rng(rng.getrandbits(32)).normal(0, rng.uniform(2, 8), (page.height, page.width))
+    page = Image.fromarray(np.clip(np.asarray(page, dtype=np.float32) + noise, 0, 255).astype(np.uint8))
+
+    # Phone photos are larger than the rendering; scans are about its size
+    scale = rng.uniform(0.8, 3.0)
+    return page.resize((int(page.width * scale), int(page.height * scale)), Image.BILINEAR)
+
+
+def generate_samples(count: int, seed: int = 0, wrong_rate: float = 0.3) -> List[Dict[str, Any]]:
+    """
+    Generate problems with their images
+
+    Args:
+        count: Number of samples
+        seed: Random seed
+        wrong_rate: Share of samples whose solution is wrong
+
+    Returns:
+        Samples with name, kind, latex, text, solution, correct, data (encoded image) and content_type
+    """
+    rng = random.Random(seed)
+    kinds = [kind for kind, _, _ in PROBLEMS]
+    weights = [weight for _, _, weight in PROBLEMS]
+    generators = {kind: generator for kind, generator, _ in PROBLEMS}
+
+    samples = []
+    for i in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        latex, text, solution, wrong_solution = generators[kind](rng)
+        correct = rng.random() >= wrong_rate
+        image = render_equation(text, rng).convert("RGB")
+
+        buffer = io.BytesIO()
+        if rng.random() < 0.3:
+            image.save(buffer, "JPEG", quality=rng.randint(70, 95))
+            extension, content_type = "jpg", "image/jpeg"
+        else:
+            image.save(buffer, "PNG")
+            extension, content_type = "png", "image/png"
+
+        samples.append({
+            "name": f"equation_{i:05d}.{extension}",
+            "kind": kind,
+            "latex": latex,
+            "text": text,
+            "solution": solution if correct else wrong_solution,
+            "correct": correct,
+            "data": buffer.getvalue(),
+            "content_type": content_type,
+        })
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic handwritten-style equation images")
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--count", type=int, default=200, help="Number of images")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--wrong-rate", type=float, default=0.3, help="Share of samples with a wrong solution")
+    args = parser.parse_args()
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    samples = generate_samples(args.count, args.seed, args.wrong_rate)
+    for sample in samples:
+        (out_dir / sample["name"]).write_bytes(sample["data"])
+
+    with open(out_dir / "labels.json", "w") as f:
+        json.dump({sample["name"]: sample["latex"] for sample in samples}, f, indent=2)
+    with open(out_dir / "problems.json", "w") as f:
+        json.dump([{k: v for k, v in sample.items() if k != "data"} for sample in samples], f, indent=2)
+
+    total = sum(len(sample["data"]) for sample in samples)
+    print(f"Wrote {len(samples)} images ({total / 1024 / 1024:.1f} MB) to {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
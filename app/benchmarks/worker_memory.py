@@ -0,0 +1,128 @@
+"""
+Measure how OCR worker memory grows as workers are added.
+
+Worker processes are started one at a time, the way `uvicorn --workers` starts
+them (spawned, each loading and warming up its own OCRService). After each
+start, the RSS and PSS (proportional set size: shared pages split between the
+processes sharing them) of all workers are read from /proc. With the
+"torch-mmap" backend the weights are shared, so each added worker should only
+cost its private memory (interpreter, torch runtime, activations), not another
+copy of the model.
+
+Exits with status 1 if the average PSS growth per added worker exceeds
+--max-growth-mb, so it can gate a deployment change.
+
+Usage (from the app directory, Linux only):
+    python -m benchmarks.worker_memory --workers 4 --backend torch-mmap --max-growth-mb 600
+"""
+import argparse
+import json
+import multiprocessing
+import sys
+from typing import Dict, List
+
+from services.inference_backends import INFERENCE_BACKENDS
+
+MB = 1024 * 1024
+
+
+def read_memory(pid: int) -> Dict[str, int]:
+    """Rss, Pss and private bytes of a process, from /proc/<pid>/smaps_rollup"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def _worker(backend: str, ready, stop):
+    from services.ocr_service import OCRService
+
+    service = OCRService(inference_backend=backend)
+    if service.model is None:
+        ready.put(("error", "model failed to load"))
+        return
+    service.warm_up()
+    ready.put(("ready", service.inference_backend))
+    stop.wait()
+
+
+def measure(backend: str, workers: int, timeout: float) -> List[Dict]:
+    """
+    Start workers one by one and record total memory after each start
+
+    Returns:
+        One row per worker count with total RSS, total PSS and the newest worker's private memory (MB)
+    """
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    stop = context.Event()
+    processes = []
+    rows = []
+
+    try:
+        for count in range(1, workers + 1):
+            process = context.Process(target=_worker, args=(backend, ready, stop), daemon=True)
+            process.start()
+            processes.append(process)
+
+            status, detail = ready.get(timeout=timeout)
+            if status != "ready":
+                raise SystemExit(f"Worker {count} failed: {detail}")
+            if detail != backend:
+                raise SystemExit(f"Worker {count} fell back to the {detail} backend")
+
+            memory = [read_memory(p.pid) for p in processes]
+            rows.append({
+                "workers": count,
+                "total_rss_mb": sum(m["rss"] for m in memory) / MB,
+                "total_pss_mb": sum(m["pss"] for m in memory) / MB,
+                "newest_private_mb": memory[-1]["private"] / MB,
+            })
+    finally:
+        stop.set()
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure OCR worker memory as workers are added")
+    parser.add_argument("--workers", type=int, default=4, help="Number of workers to start")
+    parser.add_argument("--backend", default="torch-mmap", choices=INFERENCE_BACKENDS, help="Inference backend")
+    parser.add_argument("--max-growth-mb", type=float, help="Fail if PSS grows more than this per added worker")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds to wait for each worker to load")
+    parser.add_argument("--output", help="Write the measurements to this JSON file")
+    args = parser.parse_args()
+
+    rows = measure(args.backend, max(1, args.workers), args.timeout)
+
+    print(f"{'workers':>7} {'RSS MB':>10} {'PSS MB':>10} {'new private MB':>15}")
+    for row in rows:
+        print(f"{row['workers']:>7} {row['total_rss_mb']:>10.0f} {row['total_pss_mb']:>10.0f} {row['newest_private_mb']:>15.0f}")
+
+    growth = None
+    if len(rows) > 1:
+        growth = (rows[-1]["total_pss_mb"] - rows[0]["total_pss_mb"]) / (len(rows) - 1)
+        print(f"PSS growth per added worker: {growth:.0f} MB (first worker: {rows[0]['total_pss_mb']:.0f} MB)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"backend": args.backend, "rows": rows, "growth_per_worker_mb": growth}, f, indent=2)
+
+    if args.max_growth_mb is not None and growth is not None and growth > args.max_growth_mb:
+        print(f"FAIL: growth exceeds {args.max_growth_mb:.0f} MB per worker")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import os
+
+# OCR micro-batching
+# Requests arriving within the batching window are run through the model together
+OCR_BATCH_MAX_SIZE = int(os.getenv("OCR_BATCH_MAX_SIZE", "8"))
+OCR_BATCH_WINDOW_MS = float(os.getenv("OCR_BATCH_WINDOW_MS", "20"))
+# Maximum number of requests waiting for a batch before new ones are rejected (429)
+OCR_MAX_QUEUE = int(os.getenv("OCR_MAX_QUEUE", "64"))
+
+# Execution pools
+# I/O-bound work (LLM calls, file access) and CPU-bound model inference run in
+# separate bounded pools so neither can stall the event loop or starve the other
+IO_POOL_WORKERS = int(os.getenv("IO_POOL_WORKERS", "16"))
+IO_POOL_QUEUE = int(os.getenv("IO_POOL_QUEUE", "64"))
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", "1"))
+CPU_POOL_QUEUE = int(os.getenv("CPU_POOL_QUEUE", "4"))
+
+# OCR backend selection
+# "local" loads the Nougat model in this process, "remote" sends images to the
+# standalone OCR service (comma-separated OCR_SERVICE_URL for multiple replicas)
+OCR_MODE = os.getenv("OCR_MODE", "local").lower()
+OCR_SERVICE_URLS = [url.strip() for url in os.getenv("OCR_SERVICE_URL", "").split(",") if url.strip()]
+OCR_REMOTE_TIMEOUT = float(os.getenv("OCR_REMOTE_TIMEOUT", "120"))
+OCR_REMOTE_CONNECT_TIMEOUT = float(os.getenv("OCR_REMOTE_CONNECT_TIMEOUT", "3"))
+OCR_REMOTE_RETRIES = int(os.getenv("OCR_REMOTE_RETRIES", "2"))
+OCR_REMOTE_MAX_CONNECTIONS = int(os.getenv("OCR_REMOTE_MAX_CONNECTIONS", "32"))
+
+# OCR model lifecycle
+# "background" starts loading the model when the app starts, "lazy" on the first
+# OCR request; either way requests wait for the load and /health/ready reports 503
+# until the model is loaded and warmed up on a synthetic image
+OCR_MODEL_LOAD = os.getenv("OCR_MODEL_LOAD", "background").lower()
+OCR_MODEL_WARMUP = os.getenv("OCR_MODEL_WARMUP", "true").lower() == "true"
+# If the model fails to load, OCR falls back to a mock that returns placeholder LaTeX;
+# /health/ready then reports 503 unless the mock is allowed (local development without
+# the model), in which case it reports "degraded"
+OCR_ALLOW_MOCK = os.getenv("OCR_ALLOW_MOCK", "false").lower() == "true"
+# Local safetensors copy of a downloaded model, saved on first load and memory-mapped
+# on later starts (empty to always load from OCR_MODEL_PATH)
+OCR_MODEL_SNAPSHOT_DIR = os.getenv("OCR_MODEL_SNAPSHOT_DIR", "data/models/snapshots")
+
+# OCR inference backend
+# "torch" (fp32), "torch-mmap" (fp32 weights memory-mapped from OCR_MMAP_DIR and
+# shared by every worker process), "torch-int8" (dynamic int8 quantization) or
+# "onnx" (ONNX Runtime with KV-cache; needs optimum[onnxruntime], exported once to OCR_ONNX_DIR)
+OCR_INFERENCE_BACKEND = os.getenv("OCR_INFERENCE_BACKEND", "torch").lower()
+OCR_ONNX_DIR = os.getenv("OCR_ONNX_DIR", "data/models/onnx")
+OCR_MMAP_DIR = os.getenv("OCR_MMAP_DIR", "data/models/mmap")
+# Intra-op threads per process (0 for torch's default of one per core); with several
+# workers, set it to cores / workers so they don't oversubscribe the CPU
+OCR_TORCH_THREADS = int(os.getenv("OCR_TORCH_THREADS", "0"))
+
+# Adaptive OCR decoding
+# Greedy decoding with a token budget estimated from the image's aspect ratio;
+# results below the log-probability thresholds (or cut off by the budget) are
+# re-decoded with beam search and the full budget
+OCR_ADAPTIVE_DECODING = os.getenv("OCR_ADAPTIVE_DECODING", "true").lower() == "true"
+OCR_DECODE_MIN_MEAN_LOGPROB = float(os.getenv("OCR_DECODE_MIN_MEAN_LOGPROB", "-0.15"))
+OCR_DECODE_MIN_TOKEN_LOGPROB = float(os.getenv("OCR_DECODE_MIN_TOKEN_LOGPROB", "-3.0"))
+OCR_DECODE_TOKENS_PER_LINE = int(os.getenv("OCR_DECODE_TOKENS_PER_LINE", "96"))
+OCR_DECODE_MIN_TOKENS = int(os.getenv("OCR_DECODE_MIN_TOKENS", "48"))
+# Stop generating once the first display equation (\[ ... \]) is closed
+OCR_DECODE_STOP_AT_EQUATION_END = os.getenv("OCR_DECODE_STOP_AT_EQUATION_END", "true").lower() == "true"
+
+# OCR image preprocessing
+# Uploads are decoded at reduced size, cropped to the ink, deskewed and
+# downscaled to the model's input resolution before OCR
+OCR_PREPROCESS_ENABLED = os.getenv("OCR_PREPROCESS_ENABLED", "true").lower() == "true"
+OCR_PREPROCESS_WORKING_SIZE = int(os.getenv("OCR_PREPROCESS_WORKING_SIZE", "2048"))
+OCR_PREPROCESS_TARGET_SIZE = int(os.getenv("OCR_PREPROCESS_TARGET_SIZE", "896"))
+OCR_PREPROCESS_MAX_DESKEW_DEGREES = float(os.getenv("OCR_PREPROCESS_MAX_DESKEW_DEGREES", "15"))
+OCR_PREPROCESS_CACHE_MB = int(os.getenv("OCR_PREPROCESS_CACHE_MB", "64"))
+
+# Page segmentation (POST /ocr/page)
+# A page is split into equation lines wherever the gap between rows of ink is
+# larger than OCR_SEGMENT_GAP_RATIO times the taller neighbouring line
+OCR_SEGMENT_GAP_RATIO = float(os.getenv("OCR_SEGMENT_GAP_RATIO", "0.5"))
+OCR_SEGMENT_MIN_LINE_PX = int(os.getenv("OCR_SEGMENT_MIN_LINE_PX", "8"))
+OCR_SEGMENT_MAX_REGIONS = int(os.getenv("OCR_SEGMENT_MAX_REGIONS", "50"))
+
+# OCR result cache
+# Keyed by decoded image content plus model path, inference backend and generation parameters
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true"
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "data/cache/ocr")
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "1024"))
+OCR_CACHE_MAX_DISK_MB = int(os.getenv("OCR_CACHE_MAX_DISK_MB", "256"))
+OCR_CACHE_TTL_SECONDS = float(os.getenv("OCR_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+# Correction log
+# OCR outputs and user corrections are queued in memory and appended in batches
+# by a background thread to gzip JSONL segments, sealed at a size or age limit;
+# records are dropped (and counted) when the queue is full
+CORRECTION_LOG_ENABLED = os.getenv("CORRECTION_LOG_ENABLED", "true").lower() == "true"
+CORRECTION_LOG_DIR = os.getenv("CORRECTIONS_PATH", "data/corrections")
+CORRECTION_LOG_QUEUE = int(os.getenv("CORRECTION_LOG_QUEUE", "10000"))
+CORRECTION_LOG_BATCH = int(os.getenv("CORRECTION_LOG_BATCH", "512"))
+CORRECTION_LOG_FLUSH_SECONDS = float(os.getenv("CORRECTION_LOG_FLUSH_SECONDS", "1"))
+CORRECTION_LOG_SEGMENT_MB = int(os.getenv("CORRECTION_LOG_SEGMENT_MB", "64"))
+CORRECTION_LOG_SEGMENT_SECONDS = float(os.getenv("CORRECTION_LOG_SEGMENT_SECONDS", "3600"))
+
+# Request trace capture (replayed by benchmarks.replay)
+# Off by default. Sampled requests are written like the correction log: route,
+# status, timing and payload references (image SHA-256, LaTeX, solution text,
+# OCR and verification outputs). Headers, client addresses, query strings and file
+# names are never recorded; TRACE_CAPTURE_REDACT_TEXT replaces text with its hash
+TRACE_CAPTURE_ENABLED = os.getenv("TRACE_CAPTURE_ENABLED", "false").lower() == "true"
+TRACE_CAPTURE_DIR = os.getenv("TRACE_CAPTURE_DIR", "data/traces")
+TRACE_CAPTURE_SAMPLE_RATE = float(os.getenv("TRACE_CAPTURE_SAMPLE_RATE", "1"))
+TRACE_CAPTURE_REDACT_TEXT = os.getenv("TRACE_CAPTURE_REDACT_TEXT", "false").lower() == "true"
+
+# LaTeX validation
+# OCR output and submitted problems are parsed (balanced braces and delimiters,
+# known commands and environments) before storage or verification; parse results
+# are memoized per input string
+LATEX_PARSE_CACHE_SIZE = int(os.getenv("LATEX_PARSE_CACHE_SIZE", "4096"))
+
+# Reasoning (solution verification) model
+REASONING_MODEL = os.getenv("REASONING_MODEL", "o3-mini")
+REASONING_EFFORT = os.getenv("REASONING_EFFORT", "high")
+
+# Symbolic verification fast path
+# Equations in one variable, derivatives and simplifications are checked with SymPy
+# before calling the reasoning model; anything else (or anything slower than the
+# timeout) is escalated to the model
+VERIFY_SYMBOLIC_ENABLED = os.getenv("VERIFY_SYMBOLIC_ENABLED", "true").lower() == "true"
+VERIFY_SYMBOLIC_TIMEOUT_SECONDS = float(os.getenv("VERIFY_SYMBOLIC_TIMEOUT_SECONDS", "2"))
+VERIFY_SYMBOLIC_MAX_CHARS = int(os.getenv("VERIFY_SYMBOLIC_MAX_CHARS", "300"))
+# Larger polynomial degrees and exponents are escalated before SymPy works on them
+# (solving or expanding them can take minutes, and a timed-out thread can't be stopped)
+VERIFY_SYMBOLIC_MAX_DEGREE = int(os.getenv("VERIFY_SYMBOLIC_MAX_DEGREE", "12"))
+VERIFY_SYMBOLIC_MAX_EXPONENT = int(os.getenv("VERIFY_SYMBOLIC_MAX_EXPONENT", "1000"))
+
+# Verification result cache
+# Keyed by canonical problem + canonical solution (services.latex_normalizer) + model/effort
+VERIFICATION_CACHE_ENABLED = os.getenv("VERIFICATION_CACHE_ENABLED", "true").lower() == "true"
+VERIFICATION_CACHE_DIR = os.getenv("VERIFICATION_CACHE_DIR", "data/cache/verification")
+VERIFICATION_CACHE_MAX_ENTRIES = int(os.getenv("VERIFICATION_CACHE_MAX_ENTRIES", "4096"))
+VERIFICATION_CACHE_MAX_DISK_MB = int(os.getenv("VERIFICATION_CACHE_MAX_DISK_MB", "128"))
+VERIFICATION_CACHE_TTL_SECONDS = float(os.getenv("VERIFICATION_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+# Reasoning client
+# OPENAI_BASE_URL can point at services.openai_stub for offline/load testing
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+REASONING_MAX_IN_FLIGHT = int(os.getenv("REASONING_MAX_IN_FLIGHT", "16"))
+REASONING_RATE_PER_SECOND = float(os.getenv("REASONING_RATE_PER_SECOND", "5"))
+REASONING_BURST = int(os.getenv("REASONING_BURST", "10"))
+REASONING_MAX_RETRIES = int(os.getenv("REASONING_MAX_RETRIES", "3"))
+REASONING_TIMEOUT_SECONDS = float(os.getenv("REASONING_TIMEOUT_SECONDS", "180"))
+REASONING_BREAKER_THRESHOLD = int(os.getenv("REASONING_BREAKER_THRESHOLD", "5"))
+REASONING_BREAKER_COOLDOWN_SECONDS = float(os.getenv("REASONING_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# Storage
+# "sqlite" (default) keeps metadata, equations and solutions in an indexed WAL-mode
+# database; "json" keeps the original one-file-per-record layout under data/
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite").lower()
+STORAGE_DB_PATH = os.getenv("STORAGE_DB_PATH", "data/write2solve.db")
+
+# Uploads
+# Uploads are read into memory once (the multipart parser spools bodies over 1MB
+# to disk first); larger uploads are rejected (413)
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+# Batch uploads (/ocr/batch): images may be sent individually and/or as zip archives
+UPLOAD_BATCH_MAX_IMAGES = int(os.getenv("UPLOAD_BATCH_MAX_IMAGES", "200"))
+UPLOAD_ARCHIVE_MAX_BYTES = int(os.getenv("UPLOAD_ARCHIVE_MAX_BYTES", str(200 * 1024 * 1024)))
+# Total bytes of a batch's images once archives are expanded (all of them are held in
+# memory; a small zip can expand to many times its size)
+UPLOAD_BATCH_MAX_BYTES = int(os.getenv("UPLOAD_BATCH_MAX_BYTES", str(200 * 1024 * 1024)))
+# Images of one batch request in flight at once (decoded and queued for OCR)
+OCR_BATCH_REQUEST_CONCURRENCY = int(os.getenv("OCR_BATCH_REQUEST_CONCURRENCY", "16"))
+
+# Asynchronous OCR jobs (/ocr/jobs)
+# Jobs are persisted in their own SQLite database and drained by a pool of workers
+# feeding the same OCR engine as synchronous requests
+OCR_JOB_DB_PATH = os.getenv("OCR_JOB_DB_PATH", "data/jobs.db")
+OCR_JOB_WORKERS = int(os.getenv("OCR_JOB_WORKERS", "8"))
+OCR_JOB_MAX_QUEUED = int(os.getenv("OCR_JOB_MAX_QUEUED", "1000"))
+OCR_JOB_POLL_INTERVAL = float(os.getenv("OCR_JOB_POLL_INTERVAL", "1"))
+OCR_JOB_RETENTION_SECONDS = float(os.getenv("OCR_JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+# A running job whose worker hasn't finished it within the lease is assumed lost (its
+# process died) and is queued again; must exceed the longest job run time
+OCR_JOB_LEASE_SECONDS = float(os.getenv("OCR_JOB_LEASE_SECONDS", "600"))
+OCR_JOB_CALLBACK_TIMEOUT = float(os.getenv("OCR_JOB_CALLBACK_TIMEOUT", "10"))
+OCR_JOB_CALLBACK_RETRIES = int(os.getenv("OCR_JOB_CALLBACK_RETRIES", "3"))
+# Hosts callbacks may be sent to (comma-separated). When empty, any host is accepted
+# as long as it resolves to public addresses only (no loopback, private or link-local)
+OCR_JOB_CALLBACK_ALLOWED_HOSTS = [
+    host.strip().lower() for host in os.getenv("OCR_JOB_CALLBACK_ALLOWED_HOSTS", "").split(",") if host.strip()
+]
+
+# Metrics and tracing
+# Stage timings and request latencies are exported at /metrics (Prometheus text
+# format) on the backend and the OCR service; every request gets a trace ID
+# (X-Trace-ID). When disabled, spans are shared no-ops and /metrics isn't served
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "write2solve_")
+# Latency histogram bucket bounds in seconds (comma-separated)
+METRICS_BUCKETS = [
+    float(bound) for bound in os.getenv(
+        "METRICS_BUCKETS", "0.001,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60"
+    ).split(",") if bound.strip()
+]
@@ -0,0 +1,330 @@
+import contextvars
+import logging
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+
+from core.config import METRICS_BUCKETS, METRICS_ENABLED, METRICS_PREFIX
+
+# Trace ID of the request being handled (None outside a request)
+trace_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+
+TRACE_HEADERS = (b"x-trace-id", b"x-request-id")
+TRACE_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def current_trace_id() -> Optional[str]:
+    """Trace ID of the current request, if any"""
+    return trace_id_var.get()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter per label combination"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}_total{_labels(self.labelnames, key)} {_number(value)}" for key, value in values]
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label combination (Prometheus semantics: le is inclusive)"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = METRICS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = sorted(buckets)
+        # Per label combination: [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + [float("inf")], counts):
+                cumulative += bucket_count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time (queue depths, in-flight work)"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, callback: Callable[[], Union[float, Dict[Tuple[str, ...], float]]], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def samples(self) -> List[str]:
+        try:
+            values = self.callback()
+        except Exception as e:
+            logging.warning(f"Metric {self.name} unavailable: {str(e)}")
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in sorted(values.items())]
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics, rendered in the Prometheus text format
+
+    Metrics are registered once by name (prefixed with METRICS_PREFIX); registering
+    a name again returns the existing metric, so modules can declare theirs at import.
+    """
+
+    def __init__(self, prefix: str = METRICS_PREFIX):
+        self.prefix = prefix
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        name = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = METRICS_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help, labelnames, buckets)
+
+    def gauge(self, name: str, help: str, callback: Callable, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, help, callback, labelnames)
+
+    def render(self) -> str:
+        """
+        Exposition of every registered metric
+
+        Returns:
+            Prometheus text format (version 0.0.4)
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "stage_duration_seconds", "Time spent in each stage of the OCR, verification and storage paths", ("stage", "outcome")
+)
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template and status", ("method", "route", "status")
+)
+
+
+class _Span:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        STAGE_SECONDS.observe(time.perf_counter() - self.started, stage=self.stage, outcome="error" if exc_type else "ok")
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(stage: str):
+    """
+    Time a block as one stage ("with span('ocr.generate'): ...")
+
+    Works in threads and coroutines alike; the duration is recorded with outcome
+    "error" if the block raises. A shared no-op when metrics are disabled.
+    """
+    return _Span(stage) if METRICS_ENABLED else _NO_SPAN
+
+
+def timed(stage: str):
+    """Decorator timing every call of a function as one stage (the function itself when metrics are disabled)"""
+    def decorate(func):
+        if not METRICS_ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def observe_stage(stage: str, seconds: float, outcome: str = "ok"):
+    """Record a stage duration measured elsewhere (e.g. time spent queued)"""
+    STAGE_SECONDS.observe(seconds, stage=stage, outcome=outcome)
+
+
+def _incoming_trace_id(headers: List[Tuple[bytes, bytes]]) -> Optional[str]:
+    for name, value in headers:
+        if name in TRACE_HEADERS:
+            trace_id = value.decode("latin-1")
+            if TRACE_ID_PATTERN.match(trace_id):
+                return trace_id
+    return None
+
+
+class MetricsMiddleware:
+    """
+    Assigns each HTTP request a trace ID and records its latency
+
+    The trace ID is taken from an incoming X-Trace-ID / X-Request-ID header (so a
+    caller's ID carries across services) or generated, is visible to logging and
+    outgoing OCR requests through `current_trace_id()`, and is returned in the
+    X-Trace-ID response header. Latency is recorded per route template, not per
+    path, to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = _incoming_trace_id(scope["headers"]) or uuid.uuid4().hex
+        token = trace_id_var.set(trace_id)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_trace_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", trace_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status),
+            )
+            trace_id_var.reset(token)
+
+
+def install(app: FastAPI):
+    """
+    Add request tracing and the /metrics endpoint to an app (nothing when METRICS_ENABLED is false)
+
+    Args:
+        app: FastAPI application
+    """
+    if not METRICS_ENABLED:
+        return
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", response_class=PlainTextResponse, tags=["Health"], include_in_schema=False)
+    async def metrics():
+        """Prometheus metrics"""
+        return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+
+# Log records carry the trace ID of the request they were emitted in ("-" outside one)
+_record_factory = logging.getLogRecordFactory()
+
+
+def _record_with_trace_id(*args, **kwargs) -> logging.LogRecord:
+    record = _record_factory(*args, **kwargs)
+    record.trace_id = trace_id_var.get() or "-"
+    return record
+
+
+logging.setLogRecordFactory(_record_with_trace_id)
+LOG_FORMAT = "%(levelname)s:%(name)s:[%(trace_id)s] %(message)s"
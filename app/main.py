@@ -1,6 +1,12 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from api.v1 import ocr, verify, knowledge
+from core import metrics
+from services.correction_log import correction_log
+from services.executor_service import executor_stats
+from services.trace_capture import CaptureMiddleware, trace_capture
 import logging
 import os
 
@@ -9,12 +15,26 @@ os.makedirs("data/corrections", exist_ok=True)
 os.makedirs("data/local/solutions", exist_ok=True)
 
 # 로깅 설정
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=logging.INFO, format=metrics.LOG_FORMAT, force=True)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if ocr.model_registry is not None:
+        ocr.model_registry.start()
+    ocr.job_workers.start()
+    yield
+    await ocr.job_workers.stop()
+    await ocr.ocr_engine.aclose()
+    await verify.reasoning_service.aclose()
+    # Write out queued correction records and seal the active log segment
+    await asyncio.to_thread(correction_log.close)
+    await asyncio.to_thread(trace_capture.close)
 
 app = FastAPI(
     title="Write2Solve API",
     description="API for OCR of handwritten math equations with solutions",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -24,8 +44,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-ID"],
 )
 
+# Opt-in request capture for replay (inside the tracing middleware, so records carry the trace ID)
+if trace_capture.enabled:
+    app.add_middleware(CaptureMiddleware)
+
+# Trace IDs, request latency and the /metrics endpoint
+metrics.install(app)
+
 # Include routers
 app.include_router(ocr.router, prefix="/api/v1", tags=["OCR"])
 app.include_router(verify.router, prefix="/api/v1", tags=["Verification"])
@@ -35,6 +63,32 @@ app.include_router(knowledge.router, prefix="/api/v1", tags=["Knowledge"])
 async def root():
     return {"message": "Write2Solve API is running"}
 
+@app.get("/health/live", tags=["Health"])
+async def liveness():
+    """Liveness: the process is up and serving requests (the model may still be loading)"""
+    return {"status": "ok"}
+
+@app.get("/health/ready", tags=["Health"])
+async def readiness(response: Response):
+    """Readiness: the OCR model is loaded and warmed up, not the mock (always ready with OCR_MODE=remote)"""
+    if ocr.model_registry is None:
+        return {"status": "ready", "ocr_mode": "remote"}
+    
+    status = ocr.model_registry.health
+    if status == "not_ready":
+        response.status_code = 503
+    return {"status": status, "model": ocr.model_registry.status()}
+
+@app.get("/stats/executors", tags=["Health"])
+async def get_executor_stats():
+    """Execution pool metrics (in-flight work, rejections, queue wait and run times)"""
+    return executor_stats()
+
+@app.get("/stats/traces", tags=["Health"])
+async def get_trace_capture_stats():
+    """Request trace capture metrics (captured, written and dropped records)"""
+    return trace_capture.stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
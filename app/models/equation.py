@@ -12,6 +12,7 @@ class EquationCreate(EquationBase):
 
 class EquationResponse(EquationBase):
     """Response model for equations"""
+    id: Optional[str] = None
     rendered_latex: str
     
 class EquationInDB(EquationBase):
@@ -0,0 +1,248 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class TieredCache:
+    """
+    Two-tier key/value cache: an in-memory LRU in front of an on-disk store
+
+    Values must be JSON-serializable. Entries older than `ttl_seconds` are treated
+    as misses in both tiers. The memory tier holds at most `max_entries` items; the
+    disk tier is trimmed (oldest files first) once it grows past `max_disk_bytes`.
+    Safe to use from multiple threads.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        disk_dir: Optional[str],
+        max_entries: int = 1024,
+        max_disk_bytes: int = 256 * 1024 * 1024,
+        ttl_seconds: float = 7 * 24 * 3600,
+    ):
+        self.name = name
+        self.max_entries = max(1, max_entries)
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+
+        # Counters
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._disk_evictions = 0
+
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(path.stat().st_size for path in self.disk_dir.glob("*/*.json"))
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created > self.ttl_seconds
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Look up a value in memory, then on disk
+
+        Args:
+            key: Cache key (hex digest)
+
+        Returns:
+            Cached value, or None on a miss
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created):
+                    self._memory.move_to_end(key)
+                    self._memory_hits += 1
+                    return value
+                del self._memory[key]
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self._misses += 1
+                return None
+            value, created = entry
+            self._disk_hits += 1
+            self._store_memory(key, value, created)
+            return value
+
+    def set(self, key: str, value: Any):
+        """
+        Store a value in both tiers
+
+        Args:
+            key: Cache key (hex digest)
+            value: JSON-serializable value
+        """
+        created = time.time()
+        with self._lock:
+            self._store_memory(key, value, created)
+        self._write_disk(key, value, created)
+
+    def _store_memory(self, key: str, value: Any, created: float):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._evictions += 1
+
+    def _read_disk(self, key: str) -> Optional[tuple]:
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Unreadable {self.name} cache entry {key}: {str(e)}")
+            return None
+
+        if self._expired(entry["created"]):
+            self._remove_disk(path)
+            return None
+        return entry["value"], entry["created"]
+
+    def _write_disk(self, key: str, value: Any, created: float):
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            # Write to a temporary file and rename so readers never see partial entries
+            fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"value": value, "created": created}, f)
+            # An overwritten entry no longer counts towards the disk size
+            try:
+                old_size = path.stat().st_size
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(temp_path, path)
+            size = path.stat().st_size
+        except Exception as e:
+            logging.warning(f"Failed to write {self.name} cache entry {key}: {str(e)}")
+            return
+
+        with self._lock:
+            self._disk_bytes += size - old_size
+            over_limit = self._disk_bytes > self.max_disk_bytes
+        if over_limit:
+            self._trim_disk()
+
+    def _remove_disk(self, path: Path):
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._disk_bytes -= size
+            self._disk_evictions += 1
+
+    def _trim_disk(self):
+        """Remove expired and then oldest entries until the disk tier is at 90% of its limit"""
+        entries = []
+        for path in self.disk_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        target = self.max_disk_bytes * 0.9
+        for mtime, size, path in entries:
+            if total <= target and not self._expired(mtime):
+                break
+            self._remove_disk(path)
+            total -= size
+
+        with self._lock:
+            self._disk_bytes = max(0, total)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Cache metrics
+
+        Returns:
+            Dictionary with hit/miss counters, sizes and evictions
+        """
+        with self._lock:
+            lookups = self._memory_hits + self._disk_hits + self._misses
+            return {
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "disk_bytes": self._disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "memory_hits": self._memory_hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": (self._memory_hits + self._disk_hits) / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "disk_evictions": self._disk_evictions,
+            }
+
+
+class AsyncSingleFlight:
+    """
+    Coalesce concurrent async calls with the same key into one execution
+
+    The first caller for a key starts the coroutine as a task; callers arriving
+    while it is still running await the same task. The task is shielded, so a
+    caller that goes away doesn't cancel the work for the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._executions = 0
+        self._coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn once for all concurrent callers with the same key
+
+        Args:
+            key: Identity of the call
+            fn: Zero-argument coroutine function to run
+
+        Returns:
+            Result of fn
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+            self._executions += 1
+        else:
+            self._coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._calls),
+            "executions": self._executions,
+            "coalesced": self._coalesced,
+        }
@@ -0,0 +1,297 @@
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from core.config import (
+    CORRECTION_LOG_BATCH,
+    CORRECTION_LOG_DIR,
+    CORRECTION_LOG_ENABLED,
+    CORRECTION_LOG_FLUSH_SECONDS,
+    CORRECTION_LOG_QUEUE,
+    CORRECTION_LOG_SEGMENT_MB,
+    CORRECTION_LOG_SEGMENT_SECONDS,
+)
+
+SEGMENT_SUFFIX = ".jsonl.gz"
+ACTIVE_SUFFIX = ".jsonl.gz.active"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_segment(path: Path) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the records of one segment file
+
+    Each flush appended its own gzip member, so a segment cut off mid-flush (by a
+    crash) still yields every record before the damaged member.
+    """
+    with gzip.open(path, "rt") as f:
+        try:
+            for line in f:
+                if line.endswith("\n"):
+                    yield json.loads(line)
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            logging.warning(f"Truncated correction log segment {path.name}, skipping its last flush")
+
+
+class CorrectionLog:
+    """
+    Append-only log of OCR outputs and user corrections, for building training data
+
+    `append` only puts the record on a bounded in-memory queue, so the request path
+    never touches the disk; records are dropped (and counted) if the queue is full.
+    A background thread writes them in batches to gzip-compressed JSONL segments,
+    one gzip member per flush. The active segment ends in ".active"; it is sealed
+    (renamed to ".jsonl.gz") once it reaches `segment_bytes` or `segment_seconds`,
+    and on shutdown. Segment names start with their creation time, so they sort
+    chronologically. Several processes may share the directory: each writes its own
+    segments.
+
+    Records reference images by content hash (`image_sha256`, indexed in storage)
+    rather than by temporary file names.
+
+    The same writer backs other append-only logs (request trace capture); their
+    segments are told apart by `prefix`.
+    """
+
+    def __init__(
+        self,
+        directory: str = CORRECTION_LOG_DIR,
+        enabled: bool = CORRECTION_LOG_ENABLED,
+        max_queue: int = CORRECTION_LOG_QUEUE,
+        batch_size: int = CORRECTION_LOG_BATCH,
+        flush_seconds: float = CORRECTION_LOG_FLUSH_SECONDS,
+        segment_bytes: int = CORRECTION_LOG_SEGMENT_MB * 1024 * 1024,
+        segment_seconds: float = CORRECTION_LOG_SEGMENT_SECONDS,
+        prefix: str = "corrections",
+    ):
+        self.directory = Path(directory)
+        self.prefix = prefix
+        self.enabled = enabled
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max(1, max_queue))
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._segment: Optional[Path] = None
+        self._segment_started = 0.0
+        self._segment_size = 0
+        self._sequence = 0
+
+        # Counters
+        self._appended = 0
+        self._written = 0
+        self._dropped = 0
+        self._flushes = 0
+        self._sealed = 0
+        self._write_errors = 0
+
+    def append(self, record: Dict[str, Any]):
+        """
+        Queue a record for writing (never blocks)
+
+        Args:
+            record: JSON-serializable record; a "timestamp" is added if missing
+        """
+        if not self.enabled or self._closed:
+            return
+        self._ensure_started()
+        record.setdefault("timestamp", datetime.now().strftime("%Y%m%d%H%M%S"))
+        try:
+            self._queue.put_nowait(record)
+            with self._lock:
+                self._appended += 1
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+                dropped = self._dropped
+            if dropped == 1 or dropped % 1000 == 0:
+                logging.warning(f"Correction log queue full, {dropped} records dropped so far")
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._seal_orphans()
+            self._thread = threading.Thread(target=self._run, name="correction-log", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _seal_orphans(self):
+        """Seal active segments left behind by processes that have exited"""
+        for path in self.directory.glob(f"{self.prefix}-*{ACTIVE_SUFFIX}"):
+            try:
+                pid = int(path.name[len(self.prefix):].split("-")[2])
+            except (IndexError, ValueError):
+                continue
+            # This process hasn't opened a segment yet, so one with its PID is from an earlier run
+            if pid == os.getpid() or not _pid_alive(pid):
+                os.replace(path, path.with_name(path.name[: -len(".active")]))
+
+    def _run(self):
+        while True:
+            batch: List[Dict[str, Any]] = []
+            deadline = time.monotonic() + self.flush_seconds
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    record = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                    break
+                batch.append(record)
+
+            if batch:
+                self._write(batch)
+            if self._segment is not None and (
+                stop
+                or self._segment_size >= self.segment_bytes
+                or time.monotonic() - self._segment_started >= self.segment_seconds
+            ):
+                self._seal()
+            if stop:
+                return
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        payload = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in batch)
+        member = gzip.compress(payload.encode(), compresslevel=6)
+        try:
+            if self._segment is None:
+                self._open_segment()
+            with open(self._segment, "ab") as f:
+                f.write(member)
+            self._segment_size += len(member)
+            with self._lock:
+                self._written += len(batch)
+                self._flushes += 1
+        except Exception as e:
+            with self._lock:
+                self._write_errors += 1
+                self._dropped += len(batch)
+            logging.error(f"Failed to write correction log: {str(e)}")
+
+    def _open_segment(self):
+        self._sequence += 1
+        started = datetime.now().strftime("%Y%m%d%H%M%S")
+        self._segment = self.directory / f"{self.prefix}-{started}-{os.getpid()}-{self._sequence:04d}{ACTIVE_SUFFIX}"
+        self._segment_started = time.monotonic()
+        self._segment_size = 0
+
+    def _seal(self):
+        """Make the active segment durable and visible to readers"""
+        segment, self._segment = self._segment, None
+        try:
+            with open(segment, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(segment, segment.with_name(segment.name[: -len(".active")]))
+            with self._lock:
+                self._sealed += 1
+        except FileNotFoundError:
+            # Sealed by another process that took this one for dead
+            pass
+        except Exception as e:
+            logging.error(f"Failed to seal correction log segment {segment.name}: {str(e)}")
+
+    def close(self, timeout: float = 10.0):
+        """Write everything queued and seal the active segment"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def segments(self, include_active: bool = False) -> List[Path]:
+        """
+        Segment files, oldest first
+
+        Args:
+            include_active: Also list segments still being written (possibly incomplete)
+
+        Returns:
+            Paths of the segments
+        """
+        if not self.directory.exists():
+            return []
+        paths = list(self.directory.glob(f"{self.prefix}-*{SEGMENT_SUFFIX}"))
+        if include_active:
+            paths += list(self.directory.glob(f"{self.prefix}-*{ACTIVE_SUFFIX}"))
+        return sorted(paths, key=lambda path: path.name)
+
+    def iter_records(self, skip: Iterable[str] = (), include_active: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Stream records segment by segment, without loading the log into memory
+
+        Segments are sealed in no particular name order when several processes
+        write, so incremental readers remember which segments they have read rather
+        than the newest name.
+
+        Args:
+            skip: Names of segments to leave out (e.g. read by a previous export)
+            include_active: Also read segments still being written
+
+        Yields:
+            Records in write order within each segment
+        """
+        skip = set(skip)
+        for path in self.segments(include_active):
+            if path.name in skip:
+                continue
+            try:
+                yield from read_segment(path)
+            except FileNotFoundError:
+                # An active segment sealed while listing
+                sealed = path.with_name(path.name[: -len(".active")])
+                if sealed.exists():
+                    yield from read_segment(sealed)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Correction log metrics
+
+        Returns:
+            Dictionary with queued, written and dropped records, flushes and sealed segments
+        """
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "queued": self._queue.qsize(),
+                "appended": self._appended,
+                "written": self._written,
+                "dropped": self._dropped,
+                "flushes": self._flushes,
+                "sealed_segments": self._sealed,
+                "write_errors": self._write_errors,
+                "active_segment": self._segment.name if self._segment is not None else None,
+            }
+
+
+# Shared by every OCRService and StorageService in the process
+correction_log = CorrectionLog()
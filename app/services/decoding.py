@@ -0,0 +1,183 @@
+import threading
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+from transformers import StoppingCriteria
+
+from core.config import (
+    OCR_DECODE_MIN_MEAN_LOGPROB,
+    OCR_DECODE_MIN_TOKEN_LOGPROB,
+    OCR_DECODE_MIN_TOKENS,
+    OCR_DECODE_TOKENS_PER_LINE,
+)
+
+# Display equation delimiters in Nougat's output
+EQUATION_OPEN = "\\["
+EQUATION_CLOSE = "\\]"
+
+
+def estimate_token_budget(
+    size: Tuple[int, int],
+    max_tokens: int,
+    tokens_per_line: int = OCR_DECODE_TOKENS_PER_LINE,
+    min_tokens: int = OCR_DECODE_MIN_TOKENS,
+) -> int:
+    """
+    Token budget for an image, from its aspect ratio
+
+    A handwritten line is assumed to be at most about a quarter as tall as it is
+    wide, so a wide crop gets a single line's worth of tokens and taller images
+    proportionally more. Outputs that hit the budget are re-decoded with the full
+    budget, so an underestimate costs time, not accuracy.
+
+    Args:
+        size: (width, height) of the image
+        max_tokens: Upper bound (the full generation budget)
+        tokens_per_line: Tokens allowed per estimated line
+        min_tokens: Lower bound
+
+    Returns:
+        Number of new tokens to allow
+    """
+    width, height = size
+    lines = max(1, round(4 * height / max(1, width)))
+    return max(min_tokens, min(max_tokens, lines * tokens_per_line))
+
+
+def truncate_at_equation_end(text: str) -> str:
+    """Drop anything generated after the first complete display equation"""
+    start = text.find(EQUATION_OPEN)
+    if start == -1:
+        return text
+    end = text.find(EQUATION_CLOSE, start + len(EQUATION_OPEN))
+    return text if end == -1 else text[:end + len(EQUATION_CLOSE)]
+
+
+class EndOfEquationCriteria(StoppingCriteria):
+    """
+    Stop generating once every sequence has closed its display equation
+
+    Only the last few tokens are decoded at each step. Sequences that finish
+    early keep generating until the whole batch is done; their extra tokens are
+    removed with truncate_at_equation_end.
+    """
+
+    def __init__(self, tokenizer, eos_token_id: Optional[int], window: int = 4):
+        self.tokenizer = tokenizer
+        self.eos_token_id = eos_token_id
+        self.window = window
+        self._opened = None
+        self._done = None
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> bool:
+        if self._done is None:
+            self._opened = [False] * input_ids.shape[0]
+            self._done = [False] * input_ids.shape[0]
+
+        for i, sequence in enumerate(input_ids):
+            if self._done[i]:
+                continue
+            if self.eos_token_id is not None and sequence[-1].item() == self.eos_token_id:
+                self._done[i] = True
+                continue
+            tail = self.tokenizer.decode(sequence[-self.window:], skip_special_tokens=True)
+            if EQUATION_OPEN in tail:
+                self._opened[i] = True
+            if self._opened[i] and tail.rstrip().endswith(EQUATION_CLOSE):
+                self._done[i] = True
+
+        return all(self._done)
+
+
+def sequence_confidences(
+    sequences: torch.LongTensor,
+    scores: Tuple[torch.FloatTensor, ...],
+    eos_token_id: Optional[int],
+) -> List[Dict[str, Any]]:
+    """
+    Log-probability statistics of greedily generated sequences
+
+    Args:
+        sequences: Generated token IDs (decoder start token first)
+        scores: Per-step logits returned by generate(output_scores=True)
+        eos_token_id: End-of-sequence token; tokens after it are padding
+
+    Returns:
+        Per sequence: generated token count, whether it ended with EOS, and the mean
+        and minimum token log-probability
+    """
+    generated = sequences[:, -len(scores):]
+    log_probs = torch.stack(scores, dim=1).float().log_softmax(dim=-1)
+    token_log_probs = log_probs.gather(-1, generated.unsqueeze(-1)).squeeze(-1)
+
+    results = []
+    for tokens, values in zip(generated.tolist(), token_log_probs.tolist()):
+        length = len(tokens)
+        ended = eos_token_id is not None and eos_token_id in tokens
+        if ended:
+            length = tokens.index(eos_token_id) + 1
+        values = values[:length]
+        results.append({
+            "tokens": length,
+            "ended": ended,
+            "mean_logprob": sum(values) / len(values) if values else 0.0,
+            "min_logprob": min(values) if values else 0.0,
+        })
+    return results
+
+
+def fallback_reason(confidence: Dict[str, Any], text: str, budget: int) -> Optional[str]:
+    """
+    Why a greedy result should be re-decoded with beam search (None to accept it)
+
+    Args:
+        confidence: Entry from sequence_confidences
+        text: Decoded text
+        budget: Token budget the sequence was generated with
+    """
+    closed = truncate_at_equation_end(text).rstrip().endswith(EQUATION_CLOSE)
+    if not confidence["ended"] and not closed and confidence["tokens"] >= budget:
+        return "truncated"
+    if confidence["mean_logprob"] < OCR_DECODE_MIN_MEAN_LOGPROB:
+        return "low_mean_confidence"
+    if confidence["min_logprob"] < OCR_DECODE_MIN_TOKEN_LOGPROB:
+        return "low_token_confidence"
+    return None
+
+
+class DecodeStats:
+    """Counters for adaptive decoding (greedy acceptance rate, fallbacks, timings)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._images = 0
+        self._greedy_accepted = 0
+        self._fallbacks = Counter()
+        self._budgets = deque(maxlen=1024)
+        self._greedy_seconds = 0.0
+        self._beam_seconds = 0.0
+        self._calls = 0
+
+    def record(self, budgets: List[int], reasons: List[Optional[str]], greedy_seconds: float, beam_seconds: float):
+        with self._lock:
+            self._calls += 1
+            self._images += len(reasons)
+            self._greedy_accepted += sum(reason is None for reason in reasons)
+            self._fallbacks.update(reason for reason in reasons if reason is not None)
+            self._budgets.extend(budgets)
+            self._greedy_seconds += greedy_seconds
+            self._beam_seconds += beam_seconds
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "images": self._images,
+                "greedy_accepted": self._greedy_accepted,
+                "greedy_acceptance_rate": self._greedy_accepted / self._images if self._images else 0.0,
+                "fallbacks": dict(self._fallbacks),
+                "mean_token_budget": sum(self._budgets) / len(self._budgets) if self._budgets else 0.0,
+                "greedy_seconds": self._greedy_seconds,
+                "beam_seconds": self._beam_seconds,
+                "mean_seconds_per_call": (self._greedy_seconds + self._beam_seconds) / self._calls if self._calls else 0.0,
+            }
@@ -0,0 +1,175 @@
+import asyncio
+import contextvars
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from core.config import CPU_POOL_QUEUE, CPU_POOL_WORKERS, IO_POOL_QUEUE, IO_POOL_WORKERS
+from core.metrics import observe_stage, registry
+
+
+class PoolSaturatedError(Exception):
+    """Raised when a pool has no free worker or queue slot for new work"""
+
+    def __init__(self, pool_name: str):
+        super().__init__(f"{pool_name} pool is saturated, retry later")
+        self.pool_name = pool_name
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a hard limit on queued + running work
+
+    Blocking calls are run off the asyncio event loop. Once `max_workers + max_queue`
+    calls are in flight, new calls are rejected with PoolSaturatedError instead of
+    queueing without bound.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{name}-pool")
+
+        # Metrics (only touched from the event loop thread)
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+        self._run_time_total = 0.0
+        self._run_time_max = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run a blocking function in the pool and wait for its result
+
+        Args:
+            fn: Blocking function to run
+            *args, **kwargs: Arguments passed to fn
+
+        Returns:
+            Return value of fn
+
+        Raises:
+            PoolSaturatedError: If the pool is at capacity
+        """
+        if self._in_flight >= self.capacity:
+            self._rejected += 1
+            logging.warning(f"{self.name} pool saturated ({self._in_flight} in flight)")
+            raise PoolSaturatedError(self.name)
+
+        self._in_flight += 1
+        self._max_in_flight = max(self._max_in_flight, self._in_flight)
+        self._submitted += 1
+        submitted = time.perf_counter()
+        timings = {}
+
+        def timed_call():
+            started = time.perf_counter()
+            timings["queue_wait"] = started - submitted
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                timings["run_time"] = time.perf_counter() - started
+
+        # Run in a copy of the caller's context, so its trace ID follows it into the pool
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._pool.submit(context.run, timed_call)
+        except RuntimeError:
+            # Pool shut down
+            self._in_flight -= 1
+            raise
+        # Counted as in flight until the thread is done, not until the caller stops
+        # waiting: a cancelled or timed-out caller leaves the call running
+        future.add_done_callback(lambda done: self._call_soon(loop, self._finished, done, timings))
+        return await asyncio.wrap_future(future)
+
+    @staticmethod
+    def _call_soon(loop: asyncio.AbstractEventLoop, callback: Callable, *args):
+        try:
+            loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # Event loop already closed (shutdown)
+            pass
+
+    def _finished(self, future: Future, timings: Dict[str, float]):
+        """Account for a call once it has stopped running (on the event loop thread)"""
+        self._in_flight -= 1
+        if future.cancelled():
+            # Never started
+            return
+        if future.exception() is None:
+            self._completed += 1
+        else:
+            self._failed += 1
+        self._record_timings(timings)
+
+    def _record_timings(self, timings: Dict[str, float]):
+        queue_wait = timings.get("queue_wait", 0.0)
+        run_time = timings.get("run_time", 0.0)
+        self._queue_wait_total += queue_wait
+        self._queue_wait_max = max(self._queue_wait_max, queue_wait)
+        self._run_time_total += run_time
+        self._run_time_max = max(self._run_time_max, run_time)
+        observe_stage(f"executor.{self.name}.queue_wait", queue_wait)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Pool metrics
+
+        Returns:
+            Dictionary with limits, in-flight counts, outcomes and timings (seconds)
+        """
+        finished = self._completed + self._failed
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "max_in_flight": self._max_in_flight,
+            "submitted": self._submitted,
+            "completed": self._completed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "queue_wait_seconds": {
+                "mean": self._queue_wait_total / finished if finished else 0.0,
+                "max": self._queue_wait_max,
+            },
+            "run_time_seconds": {
+                "mean": self._run_time_total / finished if finished else 0.0,
+                "max": self._run_time_max,
+            },
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Shared pools: I/O-bound work (LLM calls, file access) and CPU-bound model inference
+io_executor = BoundedExecutor("io", IO_POOL_WORKERS, IO_POOL_QUEUE)
+cpu_executor = BoundedExecutor("cpu", CPU_POOL_WORKERS, CPU_POOL_QUEUE)
+
+
+def executor_stats() -> Dict[str, Any]:
+    """Metrics for all shared pools"""
+    return {executor.name: executor.stats() for executor in (io_executor, cpu_executor)}
+
+
+registry.gauge(
+    "executor_in_flight", "Work submitted to each shared pool and not yet finished",
+    lambda: {(executor.name,): executor._in_flight for executor in (io_executor, cpu_executor)}, ("pool",)
+)
+registry.gauge(
+    "executor_rejected", "Submissions rejected by each shared pool since startup",
+    lambda: {(executor.name,): executor._rejected for executor in (io_executor, cpu_executor)}, ("pool",)
+)
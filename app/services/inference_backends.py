@@ -0,0 +1,111 @@
+import logging
+import os
+from pathlib import Path
+from typing import Any, Tuple
+
+import torch
+from accelerate import init_empty_weights
+from transformers import AutoConfig, AutoModelForVision2Seq
+
+# Selectable with OCR_INFERENCE_BACKEND
+INFERENCE_BACKENDS = ("torch", "torch-mmap", "torch-int8", "onnx")
+
+
+def load_vision2seq_model(model_path: str, backend: str, onnx_dir: str, mmap_dir: str) -> Tuple[Any, str]:
+    """
+    Load the OCR model for an inference backend
+
+    - "torch": fp32 PyTorch model (on the GPU when available)
+    - "torch-mmap": fp32 PyTorch model whose weights are memory-mapped from a file
+      in `mmap_dir` (written on first use); every process mapping the file shares
+      one copy of the weights in the page cache (CPU)
+    - "torch-int8": PyTorch model with dynamic int8 quantization of its Linear
+      layers; weights are stored as int8 and activations quantized on the fly (CPU)
+    - "onnx": ONNX Runtime encoder/decoder with KV-cache, exported with optimum
+      on first use and reused from `onnx_dir` afterwards (CPU)
+
+    All backends expose the same `generate()` as the PyTorch model.
+
+    Args:
+        model_path: Hugging Face model ID or local path
+        backend: One of INFERENCE_BACKENDS
+        onnx_dir: Directory holding exported ONNX models
+        mmap_dir: Directory holding memory-mappable weight files
+
+    Returns:
+        (model, device the inputs must be moved to)
+    """
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown OCR inference backend {backend!r}, expected one of {', '.join(INFERENCE_BACKENDS)}")
+
+    if backend == "onnx":
+        return _load_onnx(model_path, onnx_dir), "cpu"
+
+    if backend == "torch-mmap":
+        return _load_mmap(model_path, mmap_dir), "cpu"
+
+    # Weights are read straight into the model (memory-mapped from safetensors files)
+    # instead of first being materialized in a randomly initialized copy
+    model = AutoModelForVision2Seq.from_pretrained(model_path, low_cpu_mem_usage=True)
+    model.eval()
+
+    if backend == "torch-int8":
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model, "cpu"
+
+    if torch.cuda.is_available():
+        return model.to("cuda"), "cuda"
+    return model, "cpu"
+
+
+def _load_onnx(model_path: str, onnx_dir: str):
+    """Load (exporting on first use) the ONNX Runtime version of the model"""
+    try:
+        from optimum.onnxruntime import ORTModelForVision2Seq
+    except ImportError as e:
+        raise RuntimeError("The onnx backend requires optimum: pip install optimum[onnxruntime]") from e
+
+    export_dir = Path(onnx_dir) / _model_slug(model_path)
+    if (export_dir / "config.json").exists():
+        logging.info(f"Loading exported ONNX model from {export_dir}")
+        return ORTModelForVision2Seq.from_pretrained(export_dir, use_cache=True)
+
+    logging.info(f"Exporting {model_path} to ONNX (one-time), saving to {export_dir}")
+    model = ORTModelForVision2Seq.from_pretrained(model_path, export=True, use_cache=True)
+    model.save_pretrained(export_dir)
+    return model
+
+
+def _load_mmap(model_path: str, mmap_dir: str):
+    """
+    Load the model with its weights memory-mapped from a torch.save file
+
+    The model is built without allocating parameters, then the mapped tensors are
+    assigned to it directly. Weights are only read during inference, so their
+    pages stay shared between every worker process that maps the same file.
+    """
+    weights_path = Path(mmap_dir) / f"{_model_slug(model_path)}.pt"
+    if not weights_path.exists():
+        logging.info(f"Writing memory-mappable weights for {model_path} to {weights_path} (one-time)")
+        model = AutoModelForVision2Seq.from_pretrained(model_path, low_cpu_mem_usage=True)
+        weights_path.parent.mkdir(parents=True, exist_ok=True)
+        # Written under a temporary name and renamed, so other workers never map a partial file
+        partial = weights_path.with_suffix(f".{os.getpid()}.partial")
+        torch.save(model.state_dict(), partial)
+        os.replace(partial, weights_path)
+        del model
+
+    with init_empty_weights():
+        model = AutoModelForVision2Seq.from_config(AutoConfig.from_pretrained(model_path))
+    state_dict = torch.load(weights_path, map_location="cpu", mmap=True, weights_only=True)
+    model.load_state_dict(state_dict, assign=True)
+    model.tie_weights()
+
+    if any(param.is_meta for param in model.parameters()):
+        raise RuntimeError(f"{weights_path} does not contain every model parameter")
+    model.eval()
+    return model
+
+
+def _model_slug(model_path: str) -> str:
+    return model_path.strip("/").replace("/", "--")
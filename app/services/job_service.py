@@ -0,0 +1,571 @@
+import asyncio
+import ipaddress
+import json
+import logging
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from core.config import (
+    OCR_JOB_CALLBACK_ALLOWED_HOSTS,
+    OCR_JOB_CALLBACK_RETRIES,
+    OCR_JOB_CALLBACK_TIMEOUT,
+    OCR_JOB_DB_PATH,
+    OCR_JOB_LEASE_SECONDS,
+    OCR_JOB_MAX_QUEUED,
+    OCR_JOB_POLL_INTERVAL,
+    OCR_JOB_RETENTION_SECONDS,
+    OCR_JOB_WORKERS,
+)
+from services.executor_service import PoolSaturatedError, io_executor
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobQueueFullError(Exception):
+    """Raised when too many jobs are already waiting"""
+
+
+class CallbackURLError(ValueError):
+    """Raised for a callback URL the server won't call"""
+
+
+def check_callback_url(url: str, allowed_hosts: List[str] = OCR_JOB_CALLBACK_ALLOWED_HOSTS):
+    """
+    Make sure a callback URL can't be used to reach internal services
+
+    Hosts in `allowed_hosts` are accepted as they are. Without an allowlist the host
+    must resolve to public addresses only. Resolves DNS, so call it off the event loop.
+
+    Raises:
+        CallbackURLError: If the URL isn't http(s), its host isn't allowed, or it
+            resolves to a loopback, private, link-local or otherwise non-public address
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise CallbackURLError("callback_url must be an http(s) URL")
+
+    host = parts.hostname.lower()
+    if allowed_hosts:
+        if host not in allowed_hosts:
+            raise CallbackURLError(f"callback_url host {host} is not allowed")
+        return
+
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)}
+    except (socket.gaierror, ValueError):
+        raise CallbackURLError(f"callback_url host {host} does not resolve")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if not ip.is_global or ip.is_multicast:
+            raise CallbackURLError(f"callback_url host {host} resolves to a non-public address")
+
+
+def public_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Job as returned to clients (without server-side file paths)"""
+    return {key: value for key, value in job.items() if key != "image_path"}
+
+
+class JobQueue:
+    """
+    Persistent job queue in a SQLite database (WAL mode)
+
+    Jobs survive restarts: a claimed job holds a lease, and a job still running
+    when its lease expires (its worker process died) is put back in the queue,
+    so several processes can share the database without taking over each
+    other's jobs. Each claim increments the job's attempt number, and outcomes
+    are only recorded for the current attempt. Jobs are claimed highest priority
+    first, then oldest first. Each thread gets its own connection.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        priority INTEGER NOT NULL DEFAULT 0,
+        image_id TEXT NOT NULL,
+        image_path TEXT NOT NULL,
+        filename TEXT,
+        callback_url TEXT,
+        callback_status TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        result TEXT,
+        error TEXT,
+        status_code INTEGER,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority DESC, created_at);
+    CREATE INDEX IF NOT EXISTS idx_jobs_finished_at ON jobs (finished_at);
+    """
+
+    def __init__(self, db_path: str = OCR_JOB_DB_PATH, lease_seconds: float = OCR_JOB_LEASE_SECONDS):
+        self.db_path = Path(db_path)
+        self.lease_seconds = lease_seconds
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+        self.recover()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _to_job(self, row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def submit(
+        self,
+        image_id: str,
+        image_path: str,
+        filename: Optional[str] = None,
+        priority: int = 0,
+        callback_url: Optional[str] = None,
+        max_queued: int = OCR_JOB_MAX_QUEUED,
+    ) -> Dict[str, Any]:
+        """
+        Add a job to the queue
+
+        Args:
+            image_id: ID of the stored image to process
+            image_path: Path of the stored image file
+            filename: Original upload filename
+            priority: Higher runs first
+            callback_url: URL to POST the finished job to
+            max_queued: Largest accepted number of waiting jobs
+
+        Returns:
+            The new job
+
+        Raises:
+            JobQueueFullError: If max_queued jobs are already waiting
+        """
+        job_id = str(uuid.uuid4())
+        with self._transaction() as conn:
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+            if queued >= max_queued:
+                raise JobQueueFullError(f"OCR job queue is full ({queued} jobs waiting), retry later")
+
+            conn.execute(
+                "INSERT INTO jobs (id, status, priority, image_id, image_path, filename, callback_url, callback_status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, priority, image_id, image_path, filename, callback_url,
+                 "pending" if callback_url else None, time.time()),
+            )
+        return self.get(job_id)
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Take the next queued job and mark it running
+
+        Returns:
+            The claimed job, or None if the queue is empty
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY priority DESC, created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (RUNNING, time.time(), row["id"]),
+            )
+        return self.get(row["id"])
+
+    def finish(
+        self,
+        job_id: str,
+        attempt: int,
+        status: str,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+        status_code: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Record the outcome of a running job
+
+        Args:
+            job_id: Job ID
+            attempt: Attempt number of the claim being finished
+            status: SUCCEEDED or FAILED
+            result: Result of a successful job
+            error: Error message of a failed job
+            status_code: HTTP status matching the error
+
+        Returns:
+            The finished job, or None if it was no longer running this attempt
+            (cancelled, or its lease expired and it was claimed again)
+        """
+        updated = self._conn().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, status_code = ?, finished_at = ? "
+            "WHERE id = ? AND status = ? AND attempts = ?",
+            (status, json.dumps(result) if result is not None else None, error, status_code, time.time(),
+             job_id, RUNNING, attempt),
+        ).rowcount
+        return self.get(job_id) if updated else None
+
+    def requeue(self, job_id: str, attempt: int):
+        """Put a running job back in the queue (e.g. when OCR was saturated or its worker stopped)"""
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, started_at = NULL WHERE id = ? AND status = ? AND attempts = ?",
+            (QUEUED, job_id, RUNNING, attempt),
+        )
+
+    def recover(self) -> int:
+        """
+        Put running jobs whose lease expired back in the queue
+
+        Returns:
+            Number of requeued jobs
+        """
+        recovered = self._conn().execute(
+            "UPDATE jobs SET status = ?, started_at = NULL WHERE status = ? AND started_at < ?",
+            (QUEUED, RUNNING, time.time() - self.lease_seconds),
+        ).rowcount
+        if recovered:
+            logging.info(f"Requeued {recovered} OCR jobs whose lease expired")
+        return recovered
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Cancel a queued or running job (cancelled jobs get no callback)
+
+        Returns:
+            The job after the call (unchanged if it had already finished), or None if not found
+        """
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, callback_status = CASE WHEN callback_url IS NULL THEN NULL ELSE 'skipped' END "
+            "WHERE id = ? AND status IN (?, ?)",
+            (CANCELLED, time.time(), job_id, QUEUED, RUNNING),
+        )
+        return self.get(job_id)
+
+    def set_callback_status(self, job_id: str, callback_status: str):
+        self._conn().execute("UPDATE jobs SET callback_status = ? WHERE id = ?", (callback_status, job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._to_job(self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def counts(self) -> Dict[str, Any]:
+        """Number of jobs in each state and age of the oldest waiting job (seconds)"""
+        conn = self._conn()
+        counts = {state: 0 for state in (QUEUED, RUNNING) + FINISHED_STATES}
+        for row in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+            counts[row["status"]] = row["n"]
+        oldest = conn.execute("SELECT MIN(created_at) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+        counts["oldest_queued_age_seconds"] = time.time() - oldest if oldest else 0.0
+        return counts
+
+    def purge(self, older_than_seconds: float) -> int:
+        """Delete finished jobs older than the retention period"""
+        return self._conn().execute(
+            f"DELETE FROM jobs WHERE status IN ({', '.join('?' for _ in FINISHED_STATES)}) AND finished_at < ?",
+            (*FINISHED_STATES, time.time() - older_than_seconds),
+        ).rowcount
+
+
+class JobWorkerPool:
+    """
+    Asyncio workers draining a JobQueue
+
+    Each worker claims a job, runs `handler(job)` and records the result, then POSTs
+    the finished job to its callback URL (if any). Because the workers feed the
+    same OCR engine as synchronous requests, concurrent jobs share batched model
+    calls. Jobs rejected by a saturated OCR pool are put back in the queue.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        describe_error: Callable[[Exception], Tuple[int, str]],
+        workers: int = OCR_JOB_WORKERS,
+        poll_interval: float = OCR_JOB_POLL_INTERVAL,
+        retention_seconds: float = OCR_JOB_RETENTION_SECONDS,
+        callback_timeout: float = OCR_JOB_CALLBACK_TIMEOUT,
+        callback_retries: int = OCR_JOB_CALLBACK_RETRIES,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.describe_error = describe_error
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self.callback_timeout = callback_timeout
+        self.callback_retries = max(0, callback_retries)
+
+        self._tasks = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._attempts: Dict[str, int] = {}
+        self._cancel_requested = set()
+        self._callbacks = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._http: Optional[httpx.AsyncClient] = None
+        self._last_purge = 0.0
+        self._last_recover = time.monotonic()
+
+        # Metrics
+        self._submitted = 0
+        self._succeeded = 0
+        self._failed = 0
+        self._cancelled = 0
+        self._requeued = 0
+        self._callbacks_delivered = 0
+        self._callbacks_failed = 0
+        self._queue_waits = deque(maxlen=1024)
+        self._run_times = deque(maxlen=1024)
+
+    def start(self):
+        """Start the workers on the running event loop"""
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._http = httpx.AsyncClient(timeout=self.callback_timeout)
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        logging.info(f"Started {self.workers} OCR job workers")
+
+    async def stop(self):
+        """Stop the workers and put the jobs they were running back in the queue"""
+        interrupted = list(self._attempts.items())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._callbacks, return_exceptions=True)
+        self._tasks = []
+        for job_id, attempt in interrupted:
+            try:
+                await asyncio.to_thread(self.queue.requeue, job_id, attempt)
+            except Exception as e:
+                logging.warning(f"Failed to requeue OCR job {job_id}; it is recovered when its lease expires: {str(e)}")
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def submit(self, **kwargs) -> Dict[str, Any]:
+        """
+        Queue a job and wake a worker
+
+        Args:
+            **kwargs: Arguments passed to JobQueue.submit
+
+        Returns:
+            The new job
+        """
+        job = await io_executor.run(self.queue.submit, **kwargs)
+        self._submitted += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await io_executor.run(self.queue.get, job_id)
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Cancel a queued or running job
+
+        Returns:
+            The job after the call, or None if not found
+        """
+        job = await io_executor.run(self.queue.cancel, job_id)
+        task = self._running.get(job_id)
+        if job is not None and job["status"] == CANCELLED and task is not None:
+            self._cancel_requested.add(job_id)
+            task.cancel()
+        return job
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await io_executor.run(self.queue.claim)
+            except PoolSaturatedError:
+                job = None
+            except Exception as e:
+                logging.error(f"Failed to claim OCR job: {str(e)}")
+                job = None
+
+            if job is None:
+                await self._idle()
+                continue
+
+            try:
+                await self._run(job)
+            except Exception as e:
+                # Never let one job take the worker down; the job is recovered when its lease expires
+                logging.error(f"OCR job worker failed on job {job['id']}: {type(e).__name__}: {str(e)}")
+
+    async def _idle(self):
+        """Wait for a submission (or the poll interval), recover lost jobs and purge old ones now and then"""
+        if time.monotonic() - self._last_recover > self.queue.lease_seconds / 4:
+            self._last_recover = time.monotonic()
+            try:
+                await asyncio.to_thread(self.queue.recover)
+            except Exception as e:
+                logging.warning(f"Failed to recover OCR jobs: {str(e)}")
+
+        if time.monotonic() - self._last_purge > 3600:
+            self._last_purge = time.monotonic()
+            try:
+                purged = await io_executor.run(self.queue.purge, self.retention_seconds)
+                if purged:
+                    logging.info(f"Purged {purged} finished OCR jobs")
+            except Exception as e:
+                logging.warning(f"Failed to purge OCR jobs: {str(e)}")
+
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self, job: Dict[str, Any]):
+        self._queue_waits.append(job["started_at"] - job["created_at"])
+        started = time.perf_counter()
+        task = asyncio.get_running_loop().create_task(self.handler(job))
+        self._running[job["id"]] = task
+        self._attempts[job["id"]] = job["attempts"]
+
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if job["id"] not in self._cancel_requested:
+                # The worker itself is being stopped, which requeues the job
+                task.cancel()
+                raise
+            self._cancelled += 1
+            return
+        except PoolSaturatedError:
+            # The handler was rejected by a busy pool: back off and let the job wait its turn again
+            await asyncio.to_thread(self.queue.requeue, job["id"], job["attempts"])
+            self._requeued += 1
+            await asyncio.sleep(random.uniform(0.5, 1.5))
+            return
+        except Exception as e:
+            status_code, detail = self.describe_error(e)
+            logging.warning(f"OCR job {job['id']} failed: {detail}")
+            outcome = {"status": FAILED, "error": detail, "status_code": status_code}
+        else:
+            outcome = {"status": SUCCEEDED, "result": result}
+        finally:
+            self._running.pop(job["id"], None)
+            self._attempts.pop(job["id"], None)
+            self._cancel_requested.discard(job["id"])
+
+        # Job state writes are small and must not be rejected by a saturated pool
+        # (a finished job would be requeued and run twice), so they bypass it
+        finished = await asyncio.to_thread(self.queue.finish, job["id"], job["attempts"], **outcome)
+        if outcome["status"] == SUCCEEDED:
+            self._succeeded += 1
+        else:
+            self._failed += 1
+
+        self._run_times.append(time.perf_counter() - started)
+        if finished is not None and finished["callback_url"]:
+            callback = asyncio.get_running_loop().create_task(self._send_callback(finished))
+            self._callbacks.add(callback)
+            callback.add_done_callback(self._callbacks.discard)
+
+    async def _send_callback(self, job: Dict[str, Any]):
+        """POST the finished job to its callback URL, retrying with backoff"""
+        try:
+            # Checked again at delivery: the host may resolve differently than at submission
+            await asyncio.to_thread(check_callback_url, job["callback_url"])
+        except CallbackURLError as e:
+            logging.warning(f"Callback for OCR job {job['id']} refused: {str(e)}")
+            callback_status = "refused"
+        else:
+            for attempt in range(self.callback_retries + 1):
+                if attempt > 0:
+                    await asyncio.sleep(random.uniform(0, 0.5 * 2 ** attempt))
+                try:
+                    response = await self._http.post(job["callback_url"], json=public_job(job))
+                    if response.status_code < 500:
+                        callback_status = "delivered" if response.status_code < 400 else "failed"
+                        break
+                except httpx.HTTPError as e:
+                    logging.warning(f"Callback for OCR job {job['id']} failed (attempt {attempt + 1}): {type(e).__name__}")
+            else:
+                callback_status = "failed"
+
+        if callback_status == "delivered":
+            self._callbacks_delivered += 1
+        else:
+            self._callbacks_failed += 1
+        try:
+            await asyncio.to_thread(self.queue.set_callback_status, job["id"], callback_status)
+        except Exception as e:
+            logging.warning(f"Failed to record callback status for OCR job {job['id']}: {str(e)}")
+
+    async def stats(self) -> Dict[str, Any]:
+        """
+        Queue length, job outcomes and latency metrics
+
+        Returns:
+            Dictionary with job counts by state, queue wait and run times (seconds)
+        """
+
+        def summarize(samples) -> Dict[str, float]:
+            values = sorted(samples)
+            if not values:
+                return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+            return {
+                "mean": sum(values) / len(values),
+                "p50": values[len(values) // 2],
+                "p95": values[min(len(values) - 1, int(0.95 * len(values)))],
+                "max": values[-1],
+            }
+
+        return {
+            "workers": self.workers,
+            "jobs": await io_executor.run(self.queue.counts),
+            "submitted": self._submitted,
+            "succeeded": self._succeeded,
+            "failed": self._failed,
+            "cancelled": self._cancelled,
+            "requeued": self._requeued,
+            "callbacks_delivered": self._callbacks_delivered,
+            "callbacks_failed": self._callbacks_failed,
+            "queue_wait_seconds": summarize(self._queue_waits),
+            "run_seconds": summarize(self._run_times),
+        }
@@ -0,0 +1,302 @@
+import hashlib
+import re
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from core.config import LATEX_PARSE_CACHE_SIZE
+from services.latex_parser import Node, parse_latex
+
+# Part of every hash; bump it whenever the canonical form changes so old cache entries
+# stop matching, then refill stored equation hashes with
+# `python -m tools.migrate_storage --latex-hashes --refresh`
+CANONICAL_VERSION = "3"
+
+RELATIONS = {
+    "=", "<", ">", "\\leq", "\\geq", "\\neq", "\\approx", "\\equiv", "\\sim", "\\simeq", "\\cong",
+    "\\propto", "\\ll", "\\gg", "\\in", "\\notin", "\\ni", "\\subset", "\\subseteq", "\\supset",
+    "\\supseteq", "\\rightarrow", "\\leftarrow", "\\Rightarrow", "\\Leftarrow", "\\leftrightarrow",
+    "\\Leftrightarrow", "\\iff", "\\mapsto", "\\longrightarrow", "\\perp", "\\parallel", "\\mid",
+    "\\leqq", "\\geqq", "\\nleq", "\\ngeq", "\\lesssim", "\\gtrsim", "\\prec", "\\succ", "\\preceq",
+    "\\succeq", "\\subsetneq", "\\supsetneq", "\\Longrightarrow", "\\Longleftarrow", "\\Longleftrightarrow",
+    "\\longleftarrow", "\\longleftrightarrow", "\\longmapsto", "\\models", "\\vdash",
+}
+# Operators whose scope extends over the terms that follow them, or that act on what follows
+# (\nabla \cdot F is not F \cdot \nabla); terms and factors around them keep their order
+PREFIX_OPERATORS = {
+    "sum", "prod", "coprod", "int", "iint", "iiint", "oint", "bigcup", "bigcap",
+    "lim", "limsup", "liminf", "max", "min", "sup", "inf",
+    "nabla", "partial", "operatorname",
+}
+# Numerators of derivative operators written as fractions: \frac{d}{dx}, \frac{\partial^{2}}{\partial x^{2}}
+DERIVATIVE_NUMERATORS = ("d", "\\partial", "\\mathrm{d}")
+# After these a sign is unary (a \cdot -b)
+BINARY_OPERATORS = {"\\cdot", "\\times", "\\div", "/", "*", "\\pm", "\\mp"}
+PLAIN_DELIMITERS = {"( )", "( ]", "[ )", "[ ]", "\\{ \\}"}
+COMMAND_END = re.compile(r"\\[a-zA-Z]+\*?$")
+
+
+def normalize_whitespace(text: str) -> str:
+    """Drop insignificant whitespace (all of it except a single space ending a LaTeX command name)"""
+    text = re.sub(r"(\\[a-zA-Z]+)\s+(?=[a-zA-Z])", "\\1\x00", text)
+    return re.sub(r"\s+", "", text).replace("\x00", " ")
+
+
+@lru_cache(maxsize=LATEX_PARSE_CACHE_SIZE)
+def canonical_latex(latex: str) -> str:
+    """
+    Canonical form of a LaTeX equation
+
+    Spellings of the same equation map to one string: whitespace, redundant braces,
+    math delimiters and \\left/\\right are dropped, as are parentheses around a
+    single letter, number or command ((x)^{2}) or a whole side, arguments and scripts are always
+    braced (x_{1}^{2}), command aliases are unified (\\le -> \\leq, \\dfrac -> \\frac),
+    and the terms of sums and the factors of \\cdot products are sorted. Terms and
+    factors next to an operator whose scope is ambiguous or that acts on what
+    follows (\\sum, \\int, \\lim, d/dx, \\nabla, \\partial) keep their order, as do
+    \\times products and the sides of relations. LaTeX that doesn't parse, or
+    uses commands the parser doesn't know (whose arguments can't be told apart
+    from what follows), only has its whitespace normalized.
+
+    Args:
+        latex: LaTeX source
+
+    Returns:
+        Canonical LaTeX
+    """
+    result = parse_latex(latex)
+    if not result.valid or result.warnings:
+        return normalize_whitespace(latex)
+    return _sequence(result.nodes)
+
+
+def latex_hash(latex: str) -> str:
+    """
+    Stable hash of an equation's canonical form (the key for caches and dedup indexes)
+
+    Args:
+        latex: LaTeX source
+
+    Returns:
+        SHA-256 hex digest
+    """
+    return hashlib.sha256(f"{CANONICAL_VERSION}\x1f{canonical_latex(latex)}".encode()).hexdigest()
+
+
+def canonical_solution(text: str) -> str:
+    """
+    Canonical form of a free-form solution: each line canonicalized on its own
+
+    Lines with a % (a percentage in prose, a comment in LaTeX) only have their
+    whitespace normalized, so text after it isn't dropped.
+
+    Args:
+        text: Solution text, one step per line
+
+    Returns:
+        Canonical lines joined by newlines
+    """
+    lines = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        lines.append(normalize_whitespace(line) if "%" in line.replace("\\%", "") else canonical_latex(line))
+    return "\n".join(lines)
+
+
+def _join(pieces: List[str]) -> str:
+    """Concatenate rendered pieces, keeping a command name apart from a following letter"""
+    out = []
+    for piece in pieces:
+        if piece and out and piece[0].isalpha() and COMMAND_END.search(out[-1]):
+            out.append(" ")
+        out.append(piece)
+    return "".join(out)
+
+
+def _flatten(nodes: Tuple[Node, ...]) -> List[Node]:
+    """Inline groups and math segments, which don't change the meaning of a sequence"""
+    flat = []
+    for node in nodes:
+        if node.kind in ("group", "math"):
+            flat.extend(_flatten(node.children))
+        else:
+            flat.append(node)
+    return flat
+
+
+def _token(node: Node) -> Optional[str]:
+    """Operator text of a symbol or argument-less command node"""
+    if node.kind == "symbol":
+        return node.value
+    if node.kind == "command" and not node.children:
+        return "\\" + node.value
+    return None
+
+
+def _sequence(nodes: Tuple[Node, ...]) -> str:
+    """Canonical rendering of a sequence: split at separators and relations, then sort terms"""
+    pieces = []
+    chunk: List[Node] = []
+    for node in _flatten(nodes):
+        token = _token(node)
+        if node.kind == "separator" or token in RELATIONS or token in (",", ";"):
+            pieces.append(_sum(_unwrap(chunk)))
+            pieces.append(node.value if node.kind == "separator" else token)
+            chunk = []
+        else:
+            chunk.append(node)
+    pieces.append(_sum(_unwrap(chunk)))
+    return _join(pieces)
+
+
+def _unwrap(nodes: List[Node]) -> List[Node]:
+    """Drop parentheses around a whole sum or side of a relation: (x+1)=0 is x+1=0"""
+    while len(nodes) == 1 and nodes[0].kind == "delimited" and nodes[0].value == "( )":
+        content = _flatten(nodes[0].children)
+        # Tuples and intervals, (a, b)
+        if any(node.kind == "separator" or _token(node) in (",", ";") or (_token(node) or "").startswith("\\middle") for node in content):
+            break
+        nodes = content
+    return nodes
+
+
+def _sum(nodes: List[Node]) -> str:
+    """Canonical rendering of a sum: terms sorted, unless an operator's scope makes order matter"""
+    terms: List[Tuple[bool, List[Node]]] = []
+    negative = False
+    current: List[Node] = []
+    for node in nodes:
+        token = _token(node)
+        if token in ("\\pm", "\\mp") and not current:
+            return _plain(nodes)
+        if token in ("+", "-") and (not current or _token(current[-1]) not in BINARY_OPERATORS):
+            if current:
+                terms.append((negative, current))
+                negative, current = False, []
+            if token == "-":
+                negative = not negative
+            continue
+        current.append(node)
+    if not current:
+        # Nothing after the last sign
+        return _plain(nodes)
+    terms.append((negative, current))
+
+    rendered = [(_product(term), negative) for negative, term in terms]
+    if not any(_has_prefix_operator(term) for _, term in terms):
+        rendered.sort()
+    pieces = []
+    for i, (text, negative) in enumerate(rendered):
+        pieces.append("-" if negative else ("+" if i else ""))
+        pieces.append(text)
+    return _join(pieces)
+
+
+def _product(nodes: List[Node]) -> str:
+    """Canonical rendering of a term: factors separated by \\cdot sorted"""
+    factors: List[List[Node]] = [[]]
+    for node in nodes:
+        if _token(node) == "\\cdot":
+            factors.append([])
+        else:
+            factors[-1].append(node)
+    if len(factors) == 1 or any(not factor for factor in factors) or _has_prefix_operator(nodes):
+        return _plain(nodes)
+    pieces = []
+    for factor in sorted(_plain(factor) for factor in factors):
+        pieces.extend(["\\cdot", factor] if pieces else [factor])
+    return _join(pieces)
+
+
+def _has_prefix_operator(nodes: List[Node]) -> bool:
+    for node in nodes:
+        if node.kind == "script":
+            node = node.children[0]
+        if node.kind != "command":
+            continue
+        if node.value in PREFIX_OPERATORS:
+            return True
+        if node.value == "frac":
+            # Derivative operators: \frac{d}{dx}, \frac{d^{2}}{dx^{2}}, \frac{\partial}{\partial x}
+            numerator = _plain(node.children[0].children)
+            if numerator in DERIVATIVE_NUMERATORS or numerator.startswith(tuple(f"{d}^" for d in DERIVATIVE_NUMERATORS)):
+                return True
+    return False
+
+
+def _plain(nodes) -> str:
+    """Render nodes in their original order"""
+    pieces = []
+    previous = None
+    for node in nodes:
+        pieces.append(_render(node, previous))
+        previous = node
+    return _join(pieces)
+
+
+def _redundant_parens(node: Node, previous: Optional[Node]) -> bool:
+    """
+    Whether the parentheses of (x), (2) or (\\pi) after `previous` can be dropped
+
+    They are kept for function calls (f(x), f'(x), \\sin(x)^{2}) and between
+    digits (2(3)), where dropping them changes the meaning.
+    """
+    if node.kind != "delimited" or node.value != "( )" or len(node.children) != 1:
+        return False
+    atom = node.children[0]
+    if atom.kind not in ("letter", "number") and not (atom.kind == "command" and not atom.children):
+        return False
+    if previous is None:
+        return True
+    if previous.kind == "number":
+        return atom.kind != "number"
+    if previous.kind == "delimited":
+        return True
+    return _token(previous) in BINARY_OPERATORS or (previous.kind == "symbol" and previous.value != "'")
+
+
+def _argument(node: Node) -> str:
+    return "{" + _sequence(node.children) + "}"
+
+
+def _render(node: Node, previous: Optional[Node] = None) -> str:
+    """Canonical rendering of a node; `previous` is the node before it, if any"""
+    kind = node.kind
+    if kind in ("number", "letter", "symbol", "separator"):
+        return node.value
+    if kind in ("group", "math"):
+        return _sequence(node.children)
+    if kind == "command":
+        if node.children and node.children[0].kind == "text":
+            return f"\\{node.value}{{{node.children[0].value}}}"
+        if node.value == "sqrt" and len(node.children) == 2:
+            return f"\\sqrt[{_sequence(node.children[0].children)}]{_argument(node.children[1])}"
+        return f"\\{node.value}" + "".join(_argument(child) for child in node.children)
+    if kind == "script":
+        base, sub, sup = node.children
+        if base.kind == "empty":
+            text = "{}"
+        elif base.kind == "group":
+            text = _argument(base) if len(base.children) != 1 else _render(base.children[0])
+        else:
+            text = _render(base, previous)
+        if sub.kind != "empty":
+            text += "_" + _argument(sub)
+        if sup.kind != "empty":
+            text += "^" + _argument(sup)
+        return text
+    if kind == "delimited":
+        if _redundant_parens(node, previous):
+            return _render(node.children[0])
+        opening, closing = node.value.split(" ")
+        content = _sequence(node.children)
+        if node.value in PLAIN_DELIMITERS and "\\middle" not in content:
+            return f"{opening}{content}{closing}"
+        return f"\\left{opening}{content}\\right{closing}"
+    if kind == "environment":
+        children = node.children
+        spec = ""
+        if node.value == "array" and children and children[0].kind == "group":
+            spec, children = _argument(children[0]), children[1:]
+        return f"\\begin{{{node.value}}}{spec}{_sequence(children)}\\end{{{node.value}}}"
+    return ""
@@ -0,0 +1,538 @@
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.config import LATEX_PARSE_CACHE_SIZE
+
+# Commands taking arguments: name -> number of required arguments
+ARGUMENT_COMMANDS = {
+    "frac": 2, "dfrac": 2, "tfrac": 2, "cfrac": 2, "binom": 2,
+    "overset": 2, "underset": 2, "stackrel": 2,
+    "sqrt": 1, "pmod": 1, "boxed": 1, "phantom": 1, "tag": 1,
+    "mathrm": 1, "mathbf": 1, "mathit": 1, "mathsf": 1, "mathtt": 1, "mathbb": 1,
+    "mathcal": 1, "mathfrak": 1, "mathscr": 1, "boldsymbol": 1, "bm": 1,
+    "operatorname": 1, "hat": 1, "widehat": 1, "tilde": 1, "widetilde": 1,
+    "bar": 1, "overline": 1, "underline": 1, "vec": 1, "dot": 1, "ddot": 1,
+    "overbrace": 1, "underbrace": 1, "overrightarrow": 1, "overleftarrow": 1, "check": 1,
+    "mathring": 1, "breve": 1, "acute": 1, "grave": 1, "hphantom": 1, "vphantom": 1,
+    "mathop": 1, "mathrel": 1, "mathbin": 1, "mathord": 1, "mathopen": 1, "mathclose": 1,
+    "hspace": 1, "vspace": 1, "xrightarrow": 1, "xleftarrow": 1,
+}
+# Commands whose argument is text rather than math
+TEXT_COMMANDS = {"text", "textrm", "textbf", "textit", "mbox", "hbox"}
+# Commands without arguments
+SYMBOL_COMMANDS = {
+    # Greek letters
+    "alpha", "beta", "gamma", "delta", "epsilon", "varepsilon", "zeta", "eta", "theta",
+    "vartheta", "iota", "kappa", "lambda", "mu", "nu", "xi", "pi", "varpi", "rho", "varrho",
+    "sigma", "varsigma", "tau", "upsilon", "phi", "varphi", "chi", "psi", "omega",
+    "Gamma", "Delta", "Theta", "Lambda", "Xi", "Pi", "Sigma", "Upsilon", "Phi", "Psi", "Omega",
+    # Operators and relations
+    "cdot", "times", "div", "pm", "mp", "ast", "star", "circ", "bullet", "oplus", "otimes",
+    "le", "leq", "ge", "geq", "ne", "neq", "approx", "equiv", "sim", "simeq", "cong", "propto",
+    "ll", "gg", "in", "notin", "ni", "subset", "subseteq", "supset", "supseteq", "cup", "cap",
+    "setminus", "to", "rightarrow", "leftarrow", "Rightarrow", "Leftarrow", "leftrightarrow",
+    "Leftrightarrow", "iff", "implies", "mapsto", "longrightarrow", "perp", "parallel", "mid",
+    "nmid", "land", "lor", "wedge", "vee", "neg", "lnot", "forall", "exists", "not", "colon",
+    "leqslant", "geqslant", "leqq", "geqq", "nleq", "ngeq", "lesssim", "gtrsim", "prec", "succ",
+    "preceq", "succeq", "subsetneq", "supsetneq", "sqsubseteq", "sqsupseteq", "nsubseteq",
+    "Longrightarrow", "Longleftarrow", "Longleftrightarrow", "longleftarrow", "longleftrightarrow",
+    "longmapsto", "uparrow", "downarrow", "updownarrow", "Uparrow", "Downarrow", "nearrow", "searrow",
+    "hookrightarrow", "rightharpoonup", "rightleftharpoons", "therefore", "because", "models",
+    "vdash", "dashv", "nexists", "odot", "ominus", "oslash", "uplus", "sqcup", "sqcap", "diamond",
+    "dagger", "ddagger", "wr", "amalg", "triangleleft", "triangleright", "cdotp", "ldotp",
+    # Large operators and named functions
+    "sum", "prod", "coprod", "int", "iint", "iiint", "oint", "bigcup", "bigcap",
+    "lim", "limsup", "liminf", "max", "min", "sup", "inf", "det", "gcd", "lcm", "deg", "dim",
+    "ker", "arg", "Pr", "exp", "log", "ln", "lg", "sin", "cos", "tan", "cot", "sec", "csc",
+    "arcsin", "arccos", "arctan", "sinh", "cosh", "tanh", "coth", "mod", "bmod",
+    # Other symbols
+    "infty", "partial", "nabla", "emptyset", "varnothing", "ell", "hbar", "prime", "angle",
+    "triangle", "square", "top", "bot", "degree", "ldots", "cdots", "dots", "vdots", "ddots",
+    "lfloor", "rfloor", "lceil", "rceil", "langle", "rangle", "lbrace", "rbrace", "vert",
+    "Vert", "backslash", "hline", "lvert", "rvert", "lVert", "rVert", "lbrack", "rbrack",
+    "aleph", "beth", "Re", "Im", "wp", "imath", "jmath", "complement", "flat", "sharp", "natural",
+    "checkmark", "dag", "S", "P", "pounds", "copyright", "circledR", "measuredangle", "sphericalangle",
+    # Spacing, style and sizing
+    "quad", "qquad", "displaystyle", "textstyle", "scriptstyle", "limits", "nolimits",
+    "big", "Big", "bigg", "Bigg", "bigl", "bigr", "Bigl", "Bigr", "biggl", "biggr",
+    "bigm", "Bigm", "biggm", "Biggm", "enspace", "thinspace", "medspace", "thickspace",
+    "negthinspace", "negmedspace", "negthickspace", "nobreakspace", "scriptscriptstyle",
+}
+ENVIRONMENTS = {
+    "matrix", "pmatrix", "bmatrix", "Bmatrix", "vmatrix", "Vmatrix", "smallmatrix", "array",
+    "cases", "aligned", "align", "align*", "gathered", "gather", "gather*", "split",
+    "equation", "equation*", "eqnarray", "eqnarray*", "multline", "multline*",
+}
+# Delimiters accepted after \left and \right
+DELIMITERS = {"(", ")", "[", "]", "|", ".", "/", "<", ">", "\\{", "\\}", "\\|", "\\langle", "\\rangle",
+              "\\lfloor", "\\rfloor", "\\lceil", "\\rceil", "\\vert", "\\Vert", "\\lbrace", "\\rbrace",
+              "\\lvert", "\\rvert", "\\lVert", "\\rVert", "\\lbrack", "\\rbrack", "\\backslash",
+              "\\uparrow", "\\downarrow", "\\updownarrow", "\\Uparrow", "\\Downarrow"}
+DELIMITER_ALIASES = {"\\lbrace": "\\{", "\\rbrace": "\\}", "\\vert": "|", "\\Vert": "\\|", "\\lvert": "|",
+                     "\\rvert": "|", "\\lVert": "\\|", "\\rVert": "\\|", "\\lbrack": "[", "\\rbrack": "]"}
+OPENING = {"(", "[", "\\{"}
+# Tokens closing a construct opened earlier
+CLOSERS = {"}", ")", "]", "\\}", "\\right", "\\end", "\\]", "\\)"}
+# Math mode delimiters: opening -> closing
+MATH_DELIMITERS = {"\\[": "\\]", "\\(": "\\)", "$$": "$$", "$": "$"}
+
+# Spelling variants mapped to one form in the normalized AST
+ALIASES = {
+    "dfrac": "frac", "tfrac": "frac", "le": "leq", "ge": "geq", "ne": "neq", "to": "rightarrow",
+    "lnot": "neg", "land": "wedge", "lor": "vee", "dots": "ldots",
+    "bm": "boldsymbol", "textrm": "text", "mbox": "text", "hbox": "text", "implies": "Rightarrow",
+    "leqslant": "leq", "geqslant": "geq", "lvert": "vert", "rvert": "vert", "lVert": "Vert", "rVert": "Vert",
+}
+# Commands with no meaning for the expression itself
+DROPPED = {"displaystyle", "textstyle", "scriptstyle", "scriptscriptstyle", "limits", "nolimits",
+           "quad", "qquad", "big", "Big", "bigg", "Bigg", "bigl", "bigr", "Bigl", "Bigr", "biggl", "biggr",
+           "bigm", "Bigm", "biggm", "Biggm", "enspace", "thinspace", "medspace", "thickspace",
+           "negthinspace", "negmedspace", "negthickspace", "nobreakspace", "hspace", "vspace"}
+SPACING = {",", ";", ":", "!", " "}
+# Deepest nesting of groups, arguments and delimiters parsed; each level takes a few
+# stack frames, and real equations stay far below it
+MAX_DEPTH = 100
+
+TOKEN = re.compile(
+    r"(?P<command>\\[a-zA-Z]+\*?)"
+    r"|(?P<control>\\[^a-zA-Z])"
+    r"|(?P<number>[0-9]+(?:\.[0-9]+)?)"
+    r"|(?P<space>\s+)"
+    r"|(?P<comment>%[^\n]*)"
+    r"|(?P<dollar>\$\$?)"
+    r"|(?P<char>.)",
+    re.DOTALL,
+)
+
+
+class LaTeXError:
+    """A syntax error at a character offset of the input"""
+
+    __slots__ = ("message", "position")
+
+    def __init__(self, message: str, position: int):
+        self.message = message
+        self.position = position
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"message": self.message, "position": self.position}
+
+    def __str__(self) -> str:
+        return f"{self.message} at position {self.position}"
+
+
+class Node:
+    """
+    A node of the normalized LaTeX AST
+
+    Kinds: "number", "letter", "symbol" (any other character), "command" (value is
+    the name, children its arguments), "text" (value is the raw text), "group",
+    "script" (children: base, subscript, superscript; missing scripts are "empty"),
+    "delimited" (value is the opening and closing delimiter, e.g. "( )"), "environment"
+    (value is the name; "&" and "\\\\" appear as "separator" nodes), "math" (a
+    delimited math segment) and "empty".
+
+    Nodes are immutable; parse results are shared between callers.
+    """
+
+    __slots__ = ("kind", "value", "children", "start", "end")
+
+    def __init__(self, kind: str, value: str = "", children: Tuple["Node", ...] = (), start: int = 0, end: int = 0):
+        self.kind = kind
+        self.value = value
+        self.children = children
+        self.start = start
+        self.end = end
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {"kind": self.kind}
+        if self.value:
+            result["value"] = self.value
+        if self.children:
+            result["children"] = [child.to_dict() for child in self.children]
+        return result
+
+    def __repr__(self) -> str:
+        return f"Node({self.kind!r}, {self.value!r}, {list(self.children)!r})"
+
+
+EMPTY = Node("empty")
+
+
+class ParseResult:
+    """
+    Normalized AST, syntax errors and warnings of a LaTeX string (valid if there are no errors)
+
+    Warnings are for commands, environments and delimiters the parser doesn't know:
+    the LaTeX may still be fine, but its AST is only approximate.
+    """
+
+    __slots__ = ("nodes", "errors", "warnings")
+
+    def __init__(self, nodes: Tuple[Node, ...], errors: Tuple[LaTeXError, ...], warnings: Tuple[LaTeXError, ...] = ()):
+        self.nodes = nodes
+        self.errors = errors
+        self.warnings = warnings
+
+    @property
+    def valid(self) -> bool:
+        return not self.errors
+
+
+class _Token:
+    __slots__ = ("kind", "text", "start")
+
+    def __init__(self, kind: str, text: str, start: int):
+        self.kind = kind
+        self.text = text
+        self.start = start
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.text)
+
+
+def tokenize(latex: str) -> List[_Token]:
+    """Split LaTeX into tokens, dropping whitespace and comments"""
+    tokens = []
+    for match in TOKEN.finditer(latex):
+        kind = match.lastgroup
+        if kind in ("space", "comment"):
+            continue
+        tokens.append(_Token(kind, match.group(), match.start()))
+    return tokens
+
+
+@lru_cache(maxsize=LATEX_PARSE_CACHE_SIZE)
+def parse_latex(latex: str) -> ParseResult:
+    """
+    Parse LaTeX math (the subset Nougat emits) into a normalized AST
+
+    Checks that braces, \\left/\\right pairs, brackets, math delimiters and
+    environments are balanced, that known commands have their arguments, and that
+    scripts have a base and aren't doubled. Unknown commands, environments and
+    delimiters are warnings, not errors: Nougat emits more of LaTeX than any list
+    covers. Results are memoized per input string.
+
+    Args:
+        latex: LaTeX source
+
+    Returns:
+        ParseResult with the AST, errors and warnings (with character offsets)
+    """
+    if not latex.strip():
+        return ParseResult((), (LaTeXError("Empty LaTeX", 0),))
+    parser = _Parser(latex)
+    nodes = parser.parse()
+    return ParseResult(tuple(nodes), tuple(parser.errors), tuple(parser.warnings))
+
+
+class _Parser:
+    """Recursive descent parser; errors are collected and parsing recovers where it can"""
+
+    def __init__(self, latex: str):
+        self.latex = latex
+        self.tokens = tokenize(latex)
+        self.index = 0
+        self.errors: List[LaTeXError] = []
+        self.warnings: List[LaTeXError] = []
+        self.environments: List[str] = []
+        self.depth = 0
+        self.too_deep = False
+
+    def parse(self) -> List[Node]:
+        return self._sequence(closing=None)
+
+    def _peek(self) -> Optional[_Token]:
+        return self.tokens[self.index] if self.index < len(self.tokens) else None
+
+    def _error(self, message: str, position: int):
+        # Once nesting is too deep the rest is skipped, and what it leaves unclosed isn't reported
+        if not self.too_deep:
+            self.errors.append(LaTeXError(message, position))
+
+    def _warn(self, message: str, position: int):
+        self.warnings.append(LaTeXError(message, position))
+
+    def _stops(self, token: _Token, closing: Optional[str]) -> bool:
+        """Whether the token ends a sequence: its own closer, or one of an enclosing construct"""
+        return token.text == closing or token.text in CLOSERS or (token.kind == "dollar" and closing is not None)
+
+    def _enter(self) -> bool:
+        """Go one nesting level deeper; past MAX_DEPTH, record an error and skip the rest of the input"""
+        if self.depth >= MAX_DEPTH:
+            if not self.too_deep:
+                token = self._peek()
+                self._error("Nesting too deep", token.start if token else len(self.latex))
+                self.too_deep = True
+            self.index = len(self.tokens)
+            return False
+        self.depth += 1
+        return True
+
+    def _sequence(self, closing: Optional[str]) -> List[Node]:
+        """Nodes up to (not including) the closing token, a closer of an enclosing construct or the end"""
+        if not self._enter():
+            return []
+        nodes = self._nodes(closing)
+        self.depth -= 1
+        return nodes
+
+    def _nodes(self, closing: Optional[str]) -> List[Node]:
+        nodes: List[Node] = []
+        while True:
+            token = self._peek()
+            if token is None:
+                return nodes
+            if self._stops(token, closing):
+                if closing is not None:
+                    return nodes
+                # Nothing encloses the top level, so the closer is unmatched
+                if token.text in ("\\right", "\\end"):
+                    self._command()
+                else:
+                    self._error(f"Unmatched '{token.text}'", token.start)
+                    self.index += 1
+                continue
+            if token.text in ("^", "_"):
+                self._script(nodes, token)
+                continue
+            node = self._atom()
+            if node is not None:
+                nodes.append(node)
+
+    def _script(self, nodes: List[Node], token: _Token):
+        self.index += 1
+        argument = self._argument(token)
+        if nodes:
+            base = nodes.pop()
+        else:
+            self._error(f"Missing base for '{token.text}'", token.start)
+            base = EMPTY
+        start = token.start if base is EMPTY else base.start
+
+        # x_1^2 and x^2_1 give the same node: script(x, 1, 2)
+        slot = 2 if token.text == "^" else 1
+        if base.kind == "script":
+            if base.children[slot].kind == "empty":
+                children = list(base.children)
+                children[slot] = argument
+                nodes.append(Node("script", children=tuple(children), start=start, end=argument.end))
+                return
+            self._error("Double superscript" if slot == 2 else "Double subscript", token.start)
+        children = [base, EMPTY, EMPTY]
+        children[slot] = argument
+        nodes.append(Node("script", children=tuple(children), start=start, end=argument.end))
+
+    def _argument(self, owner: _Token) -> Node:
+        """A command or script argument: a braced group or a single token, always returned as a group"""
+        if not self._enter():
+            return Node("group", start=owner.end, end=owner.end)
+        node = self._argument_node(owner)
+        self.depth -= 1
+        return node
+
+    def _argument_node(self, owner: _Token) -> Node:
+        token = self._peek()
+        if token is None or token.text in ("^", "_", "&") or token.text in CLOSERS:
+            self._error(f"Missing argument for '{owner.text}'", owner.end)
+            return Node("group", start=owner.end, end=owner.end)
+        if token.text == "{":
+            return self._group()
+        if token.kind == "number" and len(token.text) > 1:
+            # \frac12 and x^23: an undelimited argument is a single digit
+            self.tokens[self.index] = _Token("number", token.text[1:], token.start + 1)
+            node = Node("number", token.text[0], start=token.start, end=token.start + 1)
+            return Node("group", children=(node,), start=node.start, end=node.end)
+        node = self._atom()
+        if node is None:
+            return Node("group", start=token.start, end=token.end)
+        return Node("group", children=(node,), start=node.start, end=node.end)
+
+    def _group(self) -> Node:
+        opening = self.tokens[self.index]
+        self.index += 1
+        children = tuple(self._sequence(closing="}"))
+        token = self._peek()
+        if token is None or token.text != "}":
+            self._error("Unclosed '{'", opening.start)
+            return Node("group", children=children, start=opening.start, end=token.start if token else len(self.latex))
+        self.index += 1
+        return Node("group", children=children, start=opening.start, end=token.end)
+
+    def _atom(self) -> Optional[Node]:
+        token = self.tokens[self.index]
+        if token.text == "{":
+            return self._group()
+        if token.kind == "command":
+            return self._command()
+        if token.text in MATH_DELIMITERS:
+            return self._math(token)
+        if token.text in OPENING:
+            return self._delimited(token)
+
+        self.index += 1
+        if token.kind == "number":
+            return Node("number", token.text, start=token.start, end=token.end)
+        if token.kind == "char" and token.text.isalpha():
+            return Node("letter", token.text, start=token.start, end=token.end)
+        if token.text == "&":
+            if not self.environments:
+                self._error("'&' outside an environment", token.start)
+            return Node("separator", "&", start=token.start, end=token.end)
+        if token.text == "\\\\":
+            return Node("separator", "\\\\", start=token.start, end=token.end)
+        if token.kind == "control" and token.text[1:] in SPACING:
+            return None
+        return Node("symbol", token.text, start=token.start, end=token.end)
+
+    def _command(self) -> Optional[Node]:
+        token = self.tokens[self.index]
+        self.index += 1
+        name = token.text[1:]
+        base_name = name.rstrip("*")
+
+        if base_name == "left":
+            return self._left_right(token)
+        if base_name == "right":
+            self._error("'\\right' without '\\left'", token.start)
+            self._delimiter(token)
+            return None
+        if base_name == "begin":
+            return self._environment(token)
+        if base_name == "end":
+            self._error("'\\end' without '\\begin'", token.start)
+            self._argument(token)
+            return None
+        if base_name == "middle":
+            # \left( a \middle| b \right)
+            return Node("symbol", f"\\middle{self._delimiter(token)}", start=token.start, end=self.tokens[self.index - 1].end)
+        if base_name in TEXT_COMMANDS:
+            return self._text(token, ALIASES.get(base_name, base_name))
+        if base_name in ARGUMENT_COMMANDS:
+            children = []
+            if base_name == "sqrt" and self._peek() is not None and self._peek().text == "[":
+                children.append(self._optional_argument())
+            for _ in range(ARGUMENT_COMMANDS[base_name]):
+                children.append(self._argument(token))
+            if base_name in DROPPED:
+                return None
+            return Node("command", ALIASES.get(base_name, base_name), tuple(children), token.start, children[-1].end)
+        if base_name in SYMBOL_COMMANDS:
+            if base_name in DROPPED:
+                return None
+            return Node("command", ALIASES.get(base_name, base_name), start=token.start, end=token.end)
+
+        self._warn(f"Unknown command '\\{name}'", token.start)
+        return Node("command", name, start=token.start, end=token.end)
+
+    def _optional_argument(self) -> Node:
+        """[...] after \\sqrt, returned as a group"""
+        opening = self.tokens[self.index]
+        self.index += 1
+        children = tuple(self._sequence(closing="]"))
+        token = self._peek()
+        if token is None or token.text != "]":
+            self._error("Unclosed '['", opening.start)
+            return Node("group", children=children, start=opening.start, end=token.start if token else len(self.latex))
+        self.index += 1
+        return Node("group", children=children, start=opening.start, end=token.end)
+
+    def _text(self, token: _Token, name: str) -> Node:
+        """\\text{...}: the argument is kept as raw text (its braces must still balance)"""
+        opening = self._peek()
+        if opening is None or opening.text != "{":
+            self._error(f"Missing argument for '{token.text}'", token.end)
+            return Node("command", name, (Node("text"),), token.start, token.end)
+        depth = 0
+        while self.index < len(self.tokens):
+            current = self.tokens[self.index]
+            self.index += 1
+            if current.text == "{":
+                depth += 1
+            elif current.text == "}":
+                depth -= 1
+                if depth == 0:
+                    raw = " ".join(self.latex[opening.end:current.start].split())
+                    text = Node("text", raw, start=opening.end, end=current.start)
+                    return Node("command", name, (text,), token.start, current.end)
+        self._error("Unclosed '{'", opening.start)
+        text = Node("text", " ".join(self.latex[opening.end:].split()), start=opening.end, end=len(self.latex))
+        return Node("command", name, (text,), token.start, len(self.latex))
+
+    def _delimiter(self, owner: _Token) -> str:
+        """The delimiter following \\left or \\right"""
+        token = self._peek()
+        if token is None:
+            self._error(f"Missing delimiter after '{owner.text}'", owner.end)
+            return "."
+        self.index += 1
+        if token.text in DELIMITERS:
+            return DELIMITER_ALIASES.get(token.text, token.text)
+        if token.text in CLOSERS or token.text in ("{", "^", "_", "&"):
+            # Structure, not a delimiter
+            self._error(f"Invalid delimiter '{token.text}' after '{owner.text}'", token.start)
+        else:
+            self._warn(f"Unknown delimiter '{token.text}' after '{owner.text}'", token.start)
+        return token.text
+
+    def _left_right(self, token: _Token) -> Node:
+        opening = self._delimiter(token)
+        children = tuple(self._sequence(closing="\\right"))
+        right = self._peek()
+        if right is None or right.text != "\\right":
+            self._error("'\\left' without '\\right'", token.start)
+            return Node("delimited", f"{opening} .", children, token.start, right.start if right else len(self.latex))
+        self.index += 1
+        closing = self._delimiter(right)
+        return Node("delimited", f"{opening} {closing}", children, token.start, self.tokens[self.index - 1].end)
+
+    def _delimited(self, token: _Token) -> Node:
+        """Brackets: ( [ and \\{ must be closed; ( and [ close with either ) or ], for intervals"""
+        self.index += 1
+        closers = ("\\}",) if token.text == "\\{" else (")", "]")
+        children = tuple(self._sequence(closing=closers[0]))
+        current = self._peek()
+        if current is not None and current.text in closers:
+            self.index += 1
+            return Node("delimited", f"{token.text} {current.text}", children, token.start, current.end)
+        self._error(f"Unclosed '{token.text}'", token.start)
+        return Node("delimited", f"{token.text} .", children, token.start, current.start if current else len(self.latex))
+
+    def _environment(self, token: _Token) -> Node:
+        name = "".join(child.value for child in self._argument(token).children)
+        if name not in ENVIRONMENTS:
+            self._warn(f"Unknown environment '{name}'", token.start)
+        children = []
+        if name == "array":
+            # Column specification
+            children.append(self._argument(token))
+
+        self.environments.append(name)
+        children.extend(self._sequence(closing="\\end"))
+        self.environments.pop()
+
+        end_token = self._peek()
+        if end_token is None or end_token.text != "\\end":
+            self._error(f"Unclosed environment '{name}'", token.start)
+            end = end_token.start if end_token else len(self.latex)
+            return Node("environment", name, tuple(children), token.start, end)
+        self.index += 1
+        end_group = self._argument(end_token)
+        end_name = "".join(child.value for child in end_group.children)
+        if end_name != name:
+            self._error(f"'\\begin{{{name}}}' ended by '\\end{{{end_name}}}'", end_token.start)
+        return Node("environment", name, tuple(children), token.start, end_group.end)
+
+    def _math(self, token: _Token) -> Node:
+        """A math segment: \\[ ... \\], \\( ... \\), $$ ... $$ or $ ... $"""
+        self.index += 1
+        closing = MATH_DELIMITERS[token.text]
+        children = tuple(self._sequence(closing=closing))
+        current = self._peek()
+        if current is None or current.text != closing:
+            self._error(f"Unclosed math delimiter '{token.text}'", token.start)
+            return Node("math", token.text, children, token.start, current.start if current else len(self.latex))
+        self.index += 1
+        return Node("math", token.text, children, token.start, current.end)
@@ -1,12 +1,26 @@
 import os
 import tempfile
 import subprocess
-from typing import Optional
+from typing import Any, Dict, List, Optional
 import logging
 
+from services.latex_normalizer import canonical_latex, latex_hash
+from services.latex_parser import ParseResult, parse_latex
+
+class InvalidLaTeXError(ValueError):
+    """Raised when LaTeX fails to parse; carries the errors with their positions"""
+
+    def __init__(self, message: str, errors: List[Dict[str, Any]]):
+        super().__init__(message)
+        self.errors = errors
+
+    def detail(self) -> Dict[str, Any]:
+        """HTTP error detail"""
+        return {"message": str(self), "errors": self.errors}
+
 class LaTeXService:
     """
-    Service for rendering LaTeX equations
+    Service for validating and rendering LaTeX equations
     """
     
     def render(self, latex: str) -> str:
@@ -28,6 +42,18 @@ class LaTeXService:
         
         return mathjax_latex
     
+    def parse(self, latex: str) -> ParseResult:
+        """
+        Parse LaTeX into a normalized AST (memoized per input string)
+        
+        Args:
+            latex: LaTeX code to parse
+            
+        Returns:
+            ParseResult with the AST and any syntax errors
+        """
+        return parse_latex(latex)
+    
     def validate(self, latex: str) -> bool:
         """
         Validate if the LaTeX is syntactically correct
@@ -38,6 +64,77 @@ class LaTeXService:
         Returns:
             True if valid, False otherwise
         """
-        # TODO: Implement LaTeX validation
-        # This is a placeholder
-        return True
+        return parse_latex(latex).valid
+    
+    def errors(self, latex: str) -> List[Dict[str, Any]]:
+        """
+        Syntax errors of the LaTeX
+        
+        Args:
+            latex: LaTeX code to check
+            
+        Returns:
+            List of {"message", "position"} dictionaries (empty if valid)
+        """
+        return [error.to_dict() for error in parse_latex(latex).errors]
+    
+    def check(self, latex: str, message: str = "Invalid LaTeX"):
+        """
+        Reject invalid LaTeX before any downstream work
+        
+        Args:
+            latex: LaTeX code to check
+            message: Error message
+            
+        Raises:
+            InvalidLaTeXError: If the LaTeX has syntax errors
+        """
+        result = parse_latex(latex)
+        if not result.valid:
+            raise InvalidLaTeXError(message, [error.to_dict() for error in result.errors])
+    
+    def canonicalize(self, latex: str) -> str:
+        """
+        Canonical form of the LaTeX, shared by all equivalent spellings (memoized)
+        
+        Args:
+            latex: LaTeX code
+            
+        Returns:
+            Canonical LaTeX (see services.latex_normalizer)
+        """
+        return canonical_latex(latex)
+    
+    def hash(self, latex: str) -> str:
+        """
+        Stable hash of the canonical form, for cache keys and deduplication
+        
+        Args:
+            latex: LaTeX code
+            
+        Returns:
+            SHA-256 hex digest
+        """
+        return latex_hash(latex)
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Parse and canonicalization cache metrics
+        
+        Returns:
+            Dictionary with cache hits, misses, size and capacity of each memo
+        """
+        return {
+            "parse": self._cache_stats(parse_latex.cache_info()),
+            "canonical": self._cache_stats(canonical_latex.cache_info()),
+        }
+    
+    def _cache_stats(self, info) -> Dict[str, Any]:
+        lookups = info.hits + info.misses
+        return {
+            "cache_hits": info.hits,
+            "cache_misses": info.misses,
+            "cache_hit_rate": info.hits / lookups if lookups else 0.0,
+            "cache_size": info.currsize,
+            "cache_max_size": info.maxsize,
+        }
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+from core.config import OCR_ALLOW_MOCK, OCR_MODEL_LOAD, OCR_MODEL_WARMUP
+
+# Model lifecycle states
+NOT_LOADED = "not_loaded"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class ModelNotReadyError(Exception):
+    """Raised when the OCR model failed to load"""
+
+
+class ModelRegistry:
+    """
+    Lifecycle of the OCR model: loaded lazily or in the background, then warmed up
+
+    Nothing is loaded at import time, so the app starts (and reloads) immediately.
+    With `load_mode="background"` loading starts in a thread when the app starts;
+    with "lazy" it starts on the first request. Requests arriving while the model
+    loads wait for it. After loading, one warm-up inference on a synthetic image
+    moves allocator and kernel setup costs out of the first real request.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        load_mode: str = OCR_MODEL_LOAD,
+        warmup: bool = OCR_MODEL_WARMUP,
+        allow_mock: bool = OCR_ALLOW_MOCK,
+    ):
+        self.factory = factory
+        self.load_mode = load_mode
+        self.warmup = warmup
+        self.allow_mock = allow_mock
+
+        self.service: Optional[Any] = None
+        self.state = NOT_LOADED
+        self.error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        """
+        Whether the service should receive traffic
+
+        In lazy mode that's before the model is loaded (the first request loads it);
+        otherwise only once loading and warm-up have finished. A service that fell
+        back to the mock model is only ready if the mock is allowed.
+        """
+        if self.mock and not self.allow_mock:
+            return False
+        if self.load_mode == "lazy":
+            return self.state != FAILED
+        return self.state == READY
+
+    @property
+    def mock(self) -> bool:
+        """Whether the loaded service fell back to the mock model"""
+        return self.service is not None and getattr(self.service, "model", None) is None
+
+    @property
+    def health(self) -> str:
+        """Readiness status: "ready", "degraded" (ready on the mock model) or "not_ready" (503)"""
+        if not self.ready:
+            return "not_ready"
+        return "degraded" if self.mock else "ready"
+
+    def start(self):
+        """Begin loading in the background (call once the event loop is running)"""
+        if self.load_mode == "background":
+            self._ensure_loading()
+
+    async def get(self) -> Any:
+        """
+        The loaded OCR service, loading it first if needed
+
+        Raises:
+            ModelNotReadyError: If loading failed
+        """
+        if self.service is None:
+            # Shielded so a cancelled request doesn't cancel the load for everyone
+            await asyncio.shield(self._ensure_loading())
+        if self.service is None:
+            raise ModelNotReadyError(f"OCR model failed to load: {self.error}")
+        return self.service
+
+    def _ensure_loading(self) -> asyncio.Task:
+        # A failed load is retried by the next request
+        if self._task is None or (self._task.done() and self.service is None):
+            self.state = LOADING
+            self.error = None
+            self._task = asyncio.get_running_loop().create_task(self._load())
+        return self._task
+
+    async def _load(self):
+        try:
+            started = time.perf_counter()
+            service = await asyncio.to_thread(self.factory)
+            self.load_seconds = time.perf_counter() - started
+            logging.info(f"OCR model loaded in {self.load_seconds:.1f}s")
+
+            if self.warmup:
+                started = time.perf_counter()
+                try:
+                    await asyncio.to_thread(service.warm_up)
+                    self.warmup_seconds = time.perf_counter() - started
+                    logging.info(f"OCR model warmed up in {self.warmup_seconds:.1f}s")
+                except Exception as e:
+                    # A failed warm-up only costs the first request its speed
+                    logging.warning(f"OCR model warm-up failed: {str(e)}")
+
+            self.service = service
+            self.state = READY
+        except Exception as e:
+            logging.error(f"Failed to load OCR model: {str(e)}")
+            self.error = str(e)
+            self.state = FAILED
+
+    async def aclose(self):
+        """Stop a load still in progress (the loading thread itself runs to completion)"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Model lifecycle status
+
+        Returns:
+            Dictionary with state, load mode, load and warm-up times, and the last error
+        """
+        return {
+            "state": self.state,
+            "load_mode": self.load_mode,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "inference_backend": getattr(self.service, "inference_backend", None),
+            "mock": self.mock,
+            "error": self.error,
+        }
@@ -1,25 +1,66 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-import os
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, UploadFile, HTTPException, Response
+from core import metrics
 import logging
-import shutil
-import tempfile
 from typing import Dict
 from .ocr_service import OCRService
+from .ocr_batcher import OCRBatcher
+from .correction_log import correction_log
+from .executor_service import PoolSaturatedError, executor_stats
+from .model_registry import ModelNotReadyError, ModelRegistry
+from .preprocess_service import image_preprocessor
+from .upload_service import InvalidUploadError, UploadTooLargeError, read_image_upload
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=logging.INFO, format=metrics.LOG_FORMAT, force=True)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="OCR Service API", description="API for handwritten math OCR service")
+# The model is loaded after startup (in the background or on first use), so the
+# service is live immediately and reports ready once the model is warm
+model_registry = ModelRegistry(OCRService)
+ocr_batcher = OCRBatcher(model_registry)
 
-# Initialize OCR service
-ocr_service = OCRService()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    model_registry.start()
+    yield
+    await ocr_batcher.aclose()
+    # Write out queued OCR records and seal the active log segment
+    await asyncio.to_thread(correction_log.close)
+
+app = FastAPI(title="OCR Service API", description="API for handwritten math OCR service", lifespan=lifespan)
+# Trace IDs (continuing the backend's X-Trace-ID), request latency and /metrics
+metrics.install(app)
 
 @app.get("/")
 async def root():
     """Health check endpoint"""
     return {"status": "ok", "service": "ocr"}
 
+@app.get("/health/live")
+async def liveness():
+    """Liveness: the process is up (the model may still be loading)"""
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def readiness(response: Response):
+    """Readiness: the model is loaded and warmed up (not ready on the mock model unless OCR_ALLOW_MOCK)"""
+    status = model_registry.health
+    if status == "not_ready":
+        response.status_code = 503
+    return {"status": status, "model": model_registry.status()}
+
+@app.get("/stats")
+async def stats():
+    """OCR batching, preprocessing and correction log metrics endpoint"""
+    return {
+        "batching": ocr_batcher.stats(),
+        "preprocessing": image_preprocessor.stats(),
+        "corrections": correction_log.stats(),
+        "executors": executor_stats(),
+    }
+
 @app.post("/process")
 async def process_image(file: UploadFile = File(...)) -> Dict[str, str]:
     """
@@ -31,26 +72,27 @@ async def process_image(file: UploadFile = File(...)) -> Dict[str, str]:
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Uploaded file is not an image")
     
-    # Create a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
-        # Copy the uploaded file to the temporary file
-        shutil.copyfileobj(file.file, temp_file)
-        temp_path = temp_file.name
-    
     try:
+        # Decode the upload in memory; nothing is written to disk
+        image = await read_image_upload(file)
+        
         # Process the image
         logger.info(f"Processing image: {file.filename}")
-        latex_text = ocr_service.process_image(temp_path)
+        latex_text = await ocr_batcher.process_image(image)
         
         # Return the result
         return {
             "latex": latex_text,
             "filename": file.filename
         }
+    except InvalidUploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except ModelNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing image: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
-    finally:
-        # Clean up the temporary file
-        if os.path.exists(temp_path):
-            os.unlink(temp_path) 
\ No newline at end of file
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional, Union
+
+from core.config import OCR_BATCH_MAX_SIZE, OCR_BATCH_WINDOW_MS, OCR_MAX_QUEUE
+from core.metrics import observe_stage, registry, span, trace_id_var
+from services.executor_service import BoundedExecutor, PoolSaturatedError, cpu_executor
+from services.model_registry import ModelRegistry
+from services.upload_service import ImagePayload
+
+
+class OCRBatcher:
+    """
+    Dynamic micro-batching scheduler in front of OCRService (held by a ModelRegistry)
+
+    Concurrent requests are queued and collected for up to `window_ms` (or until
+    `max_batch_size` requests are waiting), then run through a single batched
+    model call. Each caller receives its own result.
+
+    Batches run on the CPU executor, with at most `executor.max_workers` batches in
+    flight; while all slots are busy new requests accumulate into the next batch.
+    """
+
+    def __init__(
+        self,
+        models: ModelRegistry,
+        max_batch_size: int = OCR_BATCH_MAX_SIZE,
+        window_ms: float = OCR_BATCH_WINDOW_MS,
+        max_queue: int = OCR_MAX_QUEUE,
+        executor: BoundedExecutor = cpu_executor,
+    ):
+        self.models = models
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = max(0.0, window_ms) / 1000
+        self.max_queue = max(1, max_queue)
+        self.executor = executor
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._batch_tasks = set()
+
+        # Metrics
+        self._requests = 0
+        self._batches = 0
+        self._batch_sizes = Counter()
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_samples = deque(maxlen=1024)
+        self._rejected = 0
+        registry.gauge(
+            "ocr_queue_depth", "OCR requests waiting for a batch",
+            lambda: self._queue.qsize() if self._queue is not None else 0
+        )
+
+    async def process_image(self, image: Union[ImagePayload, str]) -> str:
+        """
+        Queue an image for OCR and wait for its result
+
+        Args:
+            image: Decoded upload, or path to the image file
+
+        Returns:
+            LaTeX representation of the equation
+
+        Raises:
+            ModelNotReadyError: If the model failed to load
+            PoolSaturatedError: If too many requests are already waiting
+        """
+        # Wait for the model (loading it on first use) before taking a queue slot
+        await self.models.get()
+
+        self._ensure_worker()
+        if self._queue.qsize() >= self.max_queue:
+            self._rejected += 1
+            raise PoolSaturatedError("ocr")
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image, future, time.perf_counter()))
+        return await future
+
+    def _ensure_worker(self):
+        """Start the batching loop on the running event loop if needed"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.executor.max_workers)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _collect_batch(self) -> List[tuple]:
+        """Wait for the first request, then gather more until the window closes or the batch is full"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.window
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - loop.time()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+
+        # Callers that went away while waiting don't need a slot in the batch
+        return [item for item in batch if not item[1].cancelled()]
+
+    async def _run(self):
+        # Started from whichever request came first; batches don't belong to its trace
+        trace_id_var.set(None)
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a free executor slot before collecting, so requests keep
+            # accumulating into the next batch while the model is busy
+            await self._slots.acquire()
+            batch = await self._collect_batch()
+            if not batch:
+                self._slots.release()
+                continue
+
+            task = loop.create_task(self._process_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _process_batch(self, batch: List[tuple]):
+        try:
+            started = time.perf_counter()
+            self._record_batch(batch, started)
+
+            images = [image for image, _, _ in batch]
+            try:
+                with span("ocr.batch"):
+                    results = await self.executor.run(self.models.service.process_images, images)
+            except Exception as e:
+                logging.error(f"Batched OCR failed: {str(e)}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            for (_, future, _), latex_text in zip(batch, results):
+                if not future.done():
+                    future.set_result(latex_text)
+
+            logging.info(f"OCR batch of {len(batch)} processed in {time.perf_counter() - started:.3f}s")
+        finally:
+            self._slots.release()
+
+    def _record_batch(self, batch: List[tuple], started: float):
+        self._batches += 1
+        self._requests += len(batch)
+        self._batch_sizes[len(batch)] += 1
+        for _, _, enqueued in batch:
+            wait = started - enqueued
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._wait_samples.append(wait)
+            observe_stage("ocr.queue_wait", wait)
+
+    async def aclose(self):
+        """Stop the batching loop and any model load in progress"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        await self.models.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Batching metrics for tuning the window and batch size
+
+        Returns:
+            Dictionary with queue depth, batch size histogram and wait times (seconds)
+        """
+        samples = sorted(self._wait_samples)
+        service = self.models.service
+
+        def percentile(p: float) -> float:
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+        return {
+            "mode": "local",
+            "max_batch_size": self.max_batch_size,
+            "window_ms": self.window * 1000,
+            "max_queue": self.max_queue,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches_in_flight": len(self._batch_tasks),
+            "rejected": self._rejected,
+            "requests": self._requests,
+            "batches": self._batches,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+            "wait_seconds": {
+                "mean": self._wait_total / self._requests if self._requests else 0.0,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "max": self._wait_max,
+            },
+            "model": self.models.status(),
+            "cache": service.cache_stats() if service else None,
+            "decoding": service.decoding_stats() if service else None,
+        }
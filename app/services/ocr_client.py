@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Union
+
+import httpx
+
+from core.config import (
+    OCR_REMOTE_CONNECT_TIMEOUT,
+    OCR_REMOTE_MAX_CONNECTIONS,
+    OCR_REMOTE_RETRIES,
+    OCR_REMOTE_TIMEOUT,
+)
+from core.metrics import current_trace_id, span
+from services.executor_service import PoolSaturatedError, io_executor
+from services.upload_service import ImagePayload
+
+# Responses worth retrying on another replica
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class OCRServiceUnavailableError(Exception):
+    """Raised when no OCR replica could process the request"""
+
+
+class OCRReplica:
+    """Routing state for a single OCR service replica"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.latency_total = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+    def mark_success(self, latency: float):
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.latency_total += latency
+
+    def mark_failure(self):
+        self.errors += 1
+        self.consecutive_failures += 1
+        # Take the replica out of rotation for a short, growing cool-down
+        cooldown = min(30.0, 0.5 * 2 ** (self.consecutive_failures - 1))
+        self.unhealthy_until = time.monotonic() + cooldown
+
+    def stats(self) -> Dict[str, Any]:
+        succeeded = self.requests - self.errors
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "mean_latency_seconds": self.latency_total / succeeded if succeeded > 0 else 0.0,
+        }
+
+
+class RemoteOCRClient:
+    """
+    Client for the standalone OCR service (services/ocr_api.py)
+
+    Uses a pooled keep-alive HTTP connection to one or more OCR replicas. Each
+    request goes to the healthy replica with the fewest requests in flight and is
+    retried on another replica (with exponential backoff) on connection errors,
+    timeouts and 429/5xx responses.
+    """
+
+    def __init__(
+        self,
+        base_urls: List[str],
+        timeout: float = OCR_REMOTE_TIMEOUT,
+        connect_timeout: float = OCR_REMOTE_CONNECT_TIMEOUT,
+        max_retries: int = OCR_REMOTE_RETRIES,
+        max_connections: int = OCR_REMOTE_MAX_CONNECTIONS,
+    ):
+        if not base_urls:
+            raise ValueError("At least one OCR service URL is required")
+
+        self.replicas = [OCRReplica(url) for url in base_urls]
+        self.max_retries = max(0, max_retries)
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+        logging.info(f"Using remote OCR service: {', '.join(replica.url for replica in self.replicas)}")
+
+    def _pick_replica(self, tried: set) -> OCRReplica:
+        """Least-loaded routing, preferring healthy replicas not yet tried for this request"""
+        candidates = [r for r in self.replicas if r.healthy and r.url not in tried]
+        if not candidates:
+            candidates = [r for r in self.replicas if r.url not in tried] or self.replicas
+        return min(candidates, key=lambda r: (r.in_flight, r.requests))
+
+    async def process_image(self, image: Union[ImagePayload, str]) -> str:
+        """
+        Send an image to the OCR service and return the recognized LaTeX
+
+        Args:
+            image: Decoded upload (its original bytes are sent), or path to the image file
+
+        Returns:
+            LaTeX representation of the equation
+
+        Raises:
+            PoolSaturatedError: If every attempt was rejected by a saturated replica
+            OCRServiceUnavailableError: If no replica could process the image
+        """
+        if isinstance(image, ImagePayload):
+            image_bytes = image.data
+            filename = image.filename
+            content_type = image.content_type
+        else:
+            image_bytes = await io_executor.run(_read_file, image)
+            filename = os.path.basename(image)
+            content_type = "image/png"
+
+        # The OCR service logs under the same trace ID as this request
+        trace_id = current_trace_id()
+        headers = {"X-Trace-ID": trace_id} if trace_id else None
+        tried = set()
+        saturated = False
+        last_error: Optional[str] = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                # Exponential backoff with full jitter
+                await asyncio.sleep(random.uniform(0, 0.1 * 2 ** attempt))
+
+            replica = self._pick_replica(tried)
+            tried.add(replica.url)
+            replica.in_flight += 1
+            replica.requests += 1
+            started = time.perf_counter()
+
+            try:
+                with span("ocr.remote"):
+                    response = await self._client.post(
+                        f"{replica.url}/process",
+                        files={"file": (filename, image_bytes, content_type)},
+                        headers=headers,
+                    )
+            except httpx.TransportError as e:
+                replica.mark_failure()
+                last_error = f"{replica.url}: {type(e).__name__}"
+                logging.warning(f"OCR request to {last_error} failed (attempt {attempt + 1})")
+                continue
+            finally:
+                replica.in_flight -= 1
+
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                saturated = saturated or response.status_code == 429
+                replica.mark_failure()
+                last_error = f"{replica.url}: HTTP {response.status_code}"
+                logging.warning(f"OCR request to {last_error} (attempt {attempt + 1})")
+                continue
+
+            if response.status_code != 200:
+                replica.errors += 1
+                raise OCRServiceUnavailableError(f"OCR service error {response.status_code}: {response.text}")
+
+            replica.mark_success(time.perf_counter() - started)
+            return response.json()["latex"]
+
+        if saturated:
+            raise PoolSaturatedError("ocr")
+        raise OCRServiceUnavailableError(f"OCR service unavailable ({last_error})")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Routing metrics for each OCR replica
+
+        Returns:
+            Dictionary with per-replica load, health and latency
+        """
+        return {
+            "mode": "remote",
+            "max_retries": self.max_retries,
+            "replicas": [replica.stats() for replica in self.replicas],
+        }
+
+    async def aclose(self):
+        await self._client.aclose()
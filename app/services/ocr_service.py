@@ -1,39 +1,98 @@
 import os
-import json
+import hashlib
+import shutil
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Union
 import logging
-from PIL import Image
+import time
+from pathlib import Path
+from PIL import Image, ImageDraw
 import torch
-from transformers import AutoModelForVision2Seq, AutoProcessor
+from transformers import AutoProcessor, StoppingCriteriaList
+from core.config import (
+    OCR_ADAPTIVE_DECODING,
+    OCR_CACHE_DIR,
+    OCR_CACHE_ENABLED,
+    OCR_CACHE_MAX_DISK_MB,
+    OCR_CACHE_MAX_ENTRIES,
+    OCR_CACHE_TTL_SECONDS,
+    OCR_DECODE_STOP_AT_EQUATION_END,
+    OCR_INFERENCE_BACKEND,
+    OCR_MMAP_DIR,
+    OCR_MODEL_SNAPSHOT_DIR,
+    OCR_ONNX_DIR,
+    OCR_TORCH_THREADS,
+)
+from core.metrics import registry, span
+from services.cache_service import TieredCache
+from services.correction_log import correction_log
+from services.decoding import (
+    DecodeStats,
+    EndOfEquationCriteria,
+    estimate_token_budget,
+    fallback_reason,
+    sequence_confidences,
+    truncate_at_equation_end,
+)
+from services.inference_backends import load_vision2seq_model
+from services.upload_service import ImagePayload
+
+OCR_IMAGES = registry.counter("ocr_images", "Images recognized, by whether the result came from the OCR cache", ("result",))
 
 class OCRService:
     """ Service for Optical Character Recognition of handwritten math equations """
 
-    def __init__(self):
+    def __init__(self, inference_backend: Optional[str] = None):
         self.model_path = os.getenv("OCR_MODEL_PATH", "facebook/nougat-base")
-        self.corrections_path = os.getenv("CORRECTIONS_PATH", "data/corrections")
+        self.inference_backend = inference_backend or OCR_INFERENCE_BACKEND
+        self.device = "cpu"
+        
+        # Generation parameters (with adaptive decoding: the fallback beam search)
+        self.max_new_tokens = 512
+        self.num_beams = 4
+        self.adaptive_decoding = OCR_ADAPTIVE_DECODING
+        self.stop_at_equation_end = OCR_DECODE_STOP_AT_EQUATION_END
+        self.decode_stats = DecodeStats()
         
-        # Ensure corrections directory exists
-        os.makedirs(self.corrections_path, exist_ok=True)
+        # Cache of OCR results keyed by image content and generation parameters
+        self.cache = None
+        if OCR_CACHE_ENABLED:
+            self.cache = TieredCache(
+                "ocr",
+                OCR_CACHE_DIR,
+                max_entries=OCR_CACHE_MAX_ENTRIES,
+                max_disk_bytes=OCR_CACHE_MAX_DISK_MB * 1024 * 1024,
+                ttl_seconds=OCR_CACHE_TTL_SECONDS,
+            )
+        
+        # Split the cores between worker processes
+        if OCR_TORCH_THREADS > 0:
+            torch.set_num_threads(OCR_TORCH_THREADS)
         
         # Initialize OCR model
         self._load_model()
         
     def _load_model(self):
-        """Load the Huggingface OCR model"""
-        logging.info(f"Loading Huggingface OCR model: {self.model_path}")
+        """Load the Huggingface OCR model with the configured inference backend"""
+        source = self._model_source()
+        logging.info(f"Loading Huggingface OCR model: {source} ({self.inference_backend} backend)")
         try:
-            self.processor = AutoProcessor.from_pretrained(self.model_path)
-            self.model = AutoModelForVision2Seq.from_pretrained(self.model_path)
+            self.processor = AutoProcessor.from_pretrained(source)
+            try:
+                self.model, self.device = load_vision2seq_model(source, self.inference_backend, OCR_ONNX_DIR, OCR_MMAP_DIR)
+            except Exception as e:
+                if self.inference_backend == "torch":
+                    raise
+                # An optimized backend that can't load shouldn't take OCR down with it
+                logging.error(f"Failed to load {self.inference_backend} backend: {str(e)}")
+                logging.warning("Falling back to the fp32 torch backend")
+                self.inference_backend = "torch"
+                self.model, self.device = load_vision2seq_model(source, "torch", OCR_ONNX_DIR, OCR_MMAP_DIR)
             
-            # Move model to GPU if available
-            if torch.cuda.is_available():
-                self.model = self.model.to("cuda")
-                logging.info("Model loaded on GPU")
-            else:
-                logging.info("Model loaded on CPU")
-                
+            if source == self.model_path and self.inference_backend == "torch":
+                self._save_snapshot()
+            
+            logging.info(f"Model loaded on {self.device.upper()}")
             logging.info("Huggingface model loaded successfully")
         except Exception as e:
             logging.error(f"Failed to load Huggingface model: {str(e)}")
@@ -42,71 +101,240 @@ class OCRService:
             self.processor = None
             logging.warning("Using mock OCR implementation for testing")
 
-    def process_image(self, image_path: str) -> str:
+    def _snapshot_dir(self) -> Optional[Path]:
+        """Where the local snapshot of a downloaded model lives (None if snapshots are disabled)"""
+        if not OCR_MODEL_SNAPSHOT_DIR or os.path.isdir(self.model_path):
+            return None
+        return Path(OCR_MODEL_SNAPSHOT_DIR) / self.model_path.strip("/").replace("/", "--")
+
+    def _model_source(self) -> str:
+        """
+        Local snapshot of the model if one has been saved, otherwise `model_path`
+        
+        The ONNX backend keeps its own export directory, so it always starts from `model_path`.
+        """
+        snapshot = self._snapshot_dir()
+        if snapshot is not None and self.inference_backend != "onnx" and (snapshot / "config.json").exists():
+            return str(snapshot)
+        return self.model_path
+
+    def _save_snapshot(self):
+        """Save the model as safetensors (and its processor) so later starts skip the hub"""
+        snapshot = self._snapshot_dir()
+        if snapshot is None:
+            return
+        # Written next to the final directory and renamed, so a partial snapshot is never loaded
+        partial = snapshot.with_name(snapshot.name + ".partial")
+        try:
+            shutil.rmtree(partial, ignore_errors=True)
+            self.model.save_pretrained(partial, safe_serialization=True)
+            self.processor.save_pretrained(partial)
+            shutil.rmtree(snapshot, ignore_errors=True)
+            os.replace(partial, snapshot)
+            logging.info(f"Saved OCR model snapshot to {snapshot}")
+        except Exception as e:
+            logging.warning(f"Failed to save OCR model snapshot: {str(e)}")
+
+    def warm_up(self):
+        """
+        Run one inference on a synthetic equation image
+        
+        The first model call pays for memory allocation and kernel selection; doing
+        it here keeps that out of the first request. Bypasses the result cache.
+        """
+        if self.model is None or self.processor is None:
+            return
+        image = Image.new("RGB", (640, 160), "white")
+        ImageDraw.Draw(image).text((40, 60), "x^2 + 2x + 1 = 0", fill="black")
+        self._generate([image])
+
+    def process_image(self, image: Union[ImagePayload, str]) -> str:
         """
         Process an image containing handwritten math equations and output LaTeX
         
         Args:
-            image_path: Path to the image file
+            image: Decoded upload, or path to the image file
             
         Returns:
             LaTeX representation of the equation
         """
+        return self.process_images([image])[0]
+
+    def process_images(self, images: List[Union[ImagePayload, str]]) -> List[str]:
+        """
+        Process a batch of images with a single model call
+        
+        Args:
+            images: Decoded uploads (used as-is, without touching the disk) or paths to image files
+            
+        Returns:
+            LaTeX representation of each equation, in the same order as the input
+        """
         try:
             # If model failed to load, return a default response for testing
             if self.model is None or self.processor is None:
-                return "x^2 + 2x + 1 = 0"
+                return ["x^2 + 2x + 1 = 0" for _ in images]
                 
-            # Open the image using PIL
-            img = Image.open(image_path).convert("RGB")
+            # Uploads are already preprocessed; paths are loaded and preprocessed the same way
+            payloads = [item if isinstance(item, ImagePayload) else ImagePayload.from_file(item) for item in images]
+            decoded = [payload.image for payload in payloads]
             
-            # Process the image with Huggingface model
-            inputs = self.processor(images=img, return_tensors="pt")
+            # Serve previously seen images from the cache
+            with span("ocr.cache_get"):
+                keys = [self._cache_key(img) for img in decoded]
+                results = [self.cache.get(key) if self.cache else None for key in keys]
+            misses = [i for i, result in enumerate(results) if result is None]
+            OCR_IMAGES.inc(len(images) - len(misses), result="cached")
             
-            # Move inputs to same device as model
-            if torch.cuda.is_available():
-                inputs = {k: v.to("cuda") for k, v in inputs.items()}
+            if misses:
+                with span("ocr.generate"):
+                    latex_texts = self._generate([decoded[i] for i in misses])
+                OCR_IMAGES.inc(len(misses), result="generated")
+                
+                # Log the OCR processing
+                timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+                for i, latex_text in zip(misses, latex_texts):
+                    results[i] = latex_text
+                    if self.cache:
+                        self.cache.set(keys[i], latex_text)
+                    self._log_ocr_output(payloads[i], latex_text, timestamp)
             
-            # Generate predictions
+            return results
+        
+        except Exception as e:
+            logging.error(f"Error processing images: {str(e)}")
+            # Return a default response for testing
+            return ["x^2 + 2x + 1 = 0" for _ in images]
+            
+    def _generate(self, images: List[Image.Image]) -> List[str]:
+        """Run a single batched model call over the images"""
+        # Process the images with Huggingface model
+        inputs = self.processor(images=images, return_tensors="pt")
+        
+        # Move inputs to same device as model
+        if self.device != "cpu":
+            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        
+        if self.adaptive_decoding:
+            return self._generate_adaptive(images, inputs)
+        
+        # Generate predictions
+        with torch.no_grad():
+            outputs = self.model.generate(
+                **inputs,
+                max_new_tokens=self.max_new_tokens,
+                num_beams=self.num_beams
+            )
+        
+        # Decode the generated tokens
+        return self.processor.batch_decode(outputs, skip_special_tokens=True)
+
+    def _generate_adaptive(self, images: List[Image.Image], inputs: Dict[str, Any]) -> List[str]:
+        """
+        Greedy decoding with an estimated token budget, falling back to beam search
+        
+        The batch shares one greedy call, so it runs with the largest budget of its
+        images. Images whose greedy output is cut off by the budget or has low token
+        log-probabilities are decoded again with `num_beams` and `max_new_tokens`.
+        """
+        tokenizer = self.processor.tokenizer
+        budgets = [estimate_token_budget(image.size, self.max_new_tokens) for image in images]
+        stopping_criteria = StoppingCriteriaList()
+        if self.stop_at_equation_end:
+            stopping_criteria.append(EndOfEquationCriteria(tokenizer, tokenizer.eos_token_id))
+        
+        started = time.perf_counter()
+        with torch.no_grad():
+            greedy = self.model.generate(
+                **inputs,
+                max_new_tokens=max(budgets),
+                num_beams=1,
+                do_sample=False,
+                stopping_criteria=stopping_criteria,
+                output_scores=True,
+                return_dict_in_generate=True
+            )
+        greedy_seconds = time.perf_counter() - started
+        
+        texts = self.processor.batch_decode(greedy.sequences, skip_special_tokens=True)
+        if self.stop_at_equation_end:
+            texts = [truncate_at_equation_end(text) for text in texts]
+        confidences = sequence_confidences(greedy.sequences, greedy.scores, tokenizer.eos_token_id)
+        reasons = [
+            fallback_reason(confidence, text, max(budgets))
+            for confidence, text in zip(confidences, texts)
+        ]
+        
+        # Beam search only for the images greedy decoding wasn't sure about
+        retry = [i for i, reason in enumerate(reasons) if reason is not None]
+        beam_seconds = 0.0
+        if retry:
+            started = time.perf_counter()
             with torch.no_grad():
                 outputs = self.model.generate(
-                    **inputs,
-                    max_new_tokens=512,
-                    num_beams=4
+                    **{k: v[retry] for k, v in inputs.items()},
+                    max_new_tokens=self.max_new_tokens,
+                    num_beams=self.num_beams
                 )
-            
-            # Decode the generated tokens
-            latex_text = self.processor.batch_decode(outputs, skip_special_tokens=True)[0]
-            
-            # Log the OCR processing
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            self._save_correction_data(image_path, latex_text, timestamp)
-            
-            return latex_text
+            beam_seconds = time.perf_counter() - started
+            for i, text in zip(retry, self.processor.batch_decode(outputs, skip_special_tokens=True)):
+                texts[i] = truncate_at_equation_end(text) if self.stop_at_equation_end else text
         
-        except Exception as e:
-            logging.error(f"Error processing image: {str(e)}")
-            # Return a default response for testing
-            return "x^2 + 2x + 1 = 0"
+        self.decode_stats.record(budgets, reasons, greedy_seconds, beam_seconds)
+        for image, budget, confidence, reason in zip(images, budgets, confidences, reasons):
+            logging.info(
+                f"OCR decode: size={image.size} budget={budget} greedy_tokens={confidence['tokens']} "
+                f"mean_logprob={confidence['mean_logprob']:.3f} min_logprob={confidence['min_logprob']:.3f} "
+                f"fallback={reason or 'none'}"
+            )
+        logging.info(
+            f"OCR decode batch of {len(images)}: greedy {greedy_seconds:.3f}s, "
+            f"beam {beam_seconds:.3f}s for {len(retry)} images"
+        )
+        
+        return texts
+
+    def _cache_key(self, image: Image.Image) -> str:
+        """
+        Content hash of the decoded RGB pixels plus everything that affects the output
+        
+        Args:
+            image: Decoded RGB image
+            
+        Returns:
+            Hex digest usable as a cache key
+        """
+        digest = hashlib.sha256()
+        decoding = f"adaptive:{self.stop_at_equation_end}" if self.adaptive_decoding else "fixed"
+        digest.update(
+            f"{self.model_path}|{self.inference_backend}|{decoding}|{self.max_new_tokens}|{self.num_beams}|{image.size}|".encode()
+        )
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """OCR result cache metrics, or None if caching is disabled"""
+        return self.cache.stats() if self.cache else None
+
+    def decoding_stats(self) -> Dict[str, Any]:
+        """Adaptive decoding metrics (greedy acceptance, fallback reasons, time spent), or None if disabled"""
+        return self.decode_stats.stats() if self.adaptive_decoding else None
             
-    def _save_correction_data(self, image_path: str, latex_text: str, timestamp: str):
+    def _log_ocr_output(self, image: ImagePayload, latex_text: str, timestamp: str):
         """
-        Save the OCR processing data for future model improvement
+        Record the OCR output for future model improvement (queued, written in the background)
         
         Args:
-            image_path: Path to the processed image
+            image: Processed image (referenced by content hash, and by path if stored)
             latex_text: Generated LaTeX text
             timestamp: Processing timestamp
         """
-        correction_data = {
-            "image_path": image_path,
-            "latex_text": latex_text,
-            "timestamp": timestamp,
-            "corrected": False
-        }
-        
-        # Create a unique filename for the correction data
-        filename = f"{self.corrections_path}/correction_{os.path.basename(image_path)}_{timestamp}.json"
-        
-        with open(filename, "w") as f:
-            json.dump(correction_data, f, indent=2)
+        correction_log.append({
+            "type": "ocr",
+            "image_sha256": image.sha256,
+            "image_path": image.path,
+            "latex": latex_text,
+            "model": self.model_path,
+            "inference_backend": self.inference_backend,
+            "timestamp": timestamp
+        })
@@ -0,0 +1,98 @@
+from fastapi import FastAPI, Body
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import uuid
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Simulated upstream behaviour
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "500"))
+STUB_LATENCY_JITTER_MS = float(os.getenv("STUB_LATENCY_JITTER_MS", "100"))
+STUB_ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0"))
+# Delay between streamed chunks (one chunk per word)
+STUB_STREAM_CHUNK_MS = float(os.getenv("STUB_STREAM_CHUNK_MS", "20"))
+
+STUB_ANSWER = "\n".join([
+    "The user's solution is correct.",
+    "Step 1: Set up the equation",
+    "Step 2: Solve for x",
+    "Step 3: Substitute the answer back into the equation to verify it",
+])
+
+app = FastAPI(
+    title="OpenAI Stub API",
+    description="OpenAI-compatible chat completions stub for offline and load testing"
+)
+
+@app.get("/")
+async def root():
+    """Health check endpoint"""
+    return {"status": "ok", "service": "openai-stub"}
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: dict = Body(...)):
+    """
+    Minimal chat completions endpoint
+
+    Waits STUB_LATENCY_MS (+/- jitter) and returns a fixed verification answer.
+    With STUB_ERROR_RATE > 0 a fraction of requests fail with 429 or 500 so retry
+    and circuit breaker behaviour can be exercised. With "stream": true the answer
+    is sent as chat.completion.chunk server-sent events, one word at a time.
+    """
+    delay = max(0.0, STUB_LATENCY_MS + random.uniform(-STUB_LATENCY_JITTER_MS, STUB_LATENCY_JITTER_MS))
+    await asyncio.sleep(delay / 1000)
+
+    if random.random() < STUB_ERROR_RATE:
+        status_code = random.choice([429, 500])
+        return JSONResponse(
+            status_code=status_code,
+            content={"error": {"message": "Simulated upstream failure", "type": "stub_error", "code": status_code}}
+        )
+
+    if request.get("stream"):
+        return StreamingResponse(_stream_chunks(request.get("model", "stub")), media_type="text/event-stream")
+
+    return {
+        "id": f"chatcmpl-stub-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "stub"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": STUB_ANSWER},
+                "finish_reason": "stop"
+            }
+        ],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    }
+
+async def _stream_chunks(model: str):
+    """Yield the stub answer as OpenAI streaming chunks"""
+    completion_id = f"chatcmpl-stub-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    def chunk(delta: dict, finish_reason=None) -> str:
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+        return f"data: {json.dumps(payload)}\n\n"
+
+    yield chunk({"role": "assistant", "content": ""})
+    words = STUB_ANSWER.split(" ")
+    for i, word in enumerate(words):
+        await asyncio.sleep(STUB_STREAM_CHUNK_MS / 1000)
+        yield chunk({"content": word if i == len(words) - 1 else word + " "})
+    yield chunk({}, finish_reason="stop")
+    yield "data: [DONE]\n\n"
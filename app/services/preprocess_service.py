@@ -0,0 +1,253 @@
+import io
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from core.config import (
+    OCR_PREPROCESS_CACHE_MB,
+    OCR_PREPROCESS_ENABLED,
+    OCR_PREPROCESS_MAX_DESKEW_DEGREES,
+    OCR_PREPROCESS_TARGET_SIZE,
+    OCR_PREPROCESS_WORKING_SIZE,
+)
+
+# Pixels darker than this fraction of the paper brightness count as ink
+INK_RATIO = 0.75
+# Margin kept around the ink bounding box, as a fraction of its size
+CROP_MARGIN = 0.04
+
+
+def ink_mask(pixels: np.ndarray) -> np.ndarray:
+    """Pixels of a grayscale array noticeably darker than the paper (estimated from a subsample)"""
+    paper = np.percentile(pixels[::4, ::4], 90)
+    return pixels < paper * INK_RATIO
+
+
+def ink_rows(ink: np.ndarray) -> np.ndarray:
+    """
+    Rows of an ink mask that contain writing
+
+    A row needs a few ink pixels to count, so isolated specks and sensor noise
+    are ignored.
+    """
+    return ink.sum(axis=1) > max(2, 0.002 * ink.shape[1])
+
+
+def ink_columns(ink: np.ndarray) -> np.ndarray:
+    """Columns of an ink mask that contain writing (see ink_rows)"""
+    return ink.sum(axis=0) > max(2, 0.002 * ink.shape[0])
+
+
+class ImagePreprocessor:
+    """
+    Prepare uploaded photos for OCR: reduced-size decode, crop, deskew, downscale
+
+    1. JPEGs are decoded directly at a reduced scale (libjpeg DCT scaling) and as
+       grayscale; other formats are box-reduced after decoding. Either way the
+       working image is at most about `working_size` pixels on its long side.
+    2. The ink bounding box is found from row/column ink counts of a thresholded
+       NumPy array, ignoring isolated specks, and the image is cropped to it.
+    3. The skew angle of the ink is estimated from its second-order moments and
+       corrected when the ink is clearly elongated (a line of writing).
+    4. The crop is downscaled to fit `target_size`, the model's input resolution.
+
+    Results are kept in an in-memory LRU keyed by the upload's content hash, so a
+    repeated image is never decoded twice.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = OCR_PREPROCESS_ENABLED,
+        working_size: int = OCR_PREPROCESS_WORKING_SIZE,
+        target_size: int = OCR_PREPROCESS_TARGET_SIZE,
+        max_deskew_degrees: float = OCR_PREPROCESS_MAX_DESKEW_DEGREES,
+        cache_bytes: int = OCR_PREPROCESS_CACHE_MB * 1024 * 1024,
+    ):
+        self.enabled = enabled
+        self.working_size = working_size
+        self.target_size = target_size
+        self.max_deskew_degrees = max_deskew_degrees
+        self.cache_bytes = cache_bytes
+
+        self._cache: "OrderedDict[str, Image.Image]" = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._images = 0
+        self._hits = 0
+        self._seconds_total = 0.0
+        self._input_pixels = 0
+        self._output_pixels = 0
+        self._deskewed = 0
+
+    def preprocess(self, data: bytes, key: Optional[str] = None) -> Image.Image:
+        """
+        Decode and preprocess an encoded image
+
+        Args:
+            data: Encoded image bytes
+            key: Content hash of data, used to cache the result
+
+        Returns:
+            Preprocessed RGB image
+        """
+        if key is not None:
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    self._hits += 1
+                    return cached
+
+        started = time.perf_counter()
+        image = Image.open(io.BytesIO(data))
+        input_pixels = image.size[0] * image.size[1]
+
+        if not self.enabled:
+            result = image.convert("RGB")
+        else:
+            result = self._preprocess(image)
+
+        with self._lock:
+            self._images += 1
+            self._seconds_total += time.perf_counter() - started
+            self._input_pixels += input_pixels
+            self._output_pixels += result.size[0] * result.size[1]
+            if key is not None:
+                self._store(key, result)
+        return result
+
+    def working_image(self, image: Image.Image) -> Image.Image:
+        """
+        Upright grayscale version of an opened image, at most about `working_size` on its long side
+
+        Args:
+            image: Opened (not yet decoded) image
+
+        Returns:
+            Decoded grayscale image
+        """
+        # Let the JPEG decoder scale down by up to 8x while decoding
+        if image.format == "JPEG":
+            image.draft("L", (self.working_size, self.working_size))
+        image = ImageOps.exif_transpose(image)
+        gray = image.convert("L")
+
+        factor = max(gray.size) // self.working_size
+        if factor > 1:
+            gray = gray.reduce(factor)
+        return gray
+
+    def _preprocess(self, image: Image.Image) -> Image.Image:
+        gray = self.working_image(image)
+        ink = ink_mask(np.asarray(gray))
+        bbox = self._ink_bbox(ink)
+        if bbox is not None:
+            top, bottom, left, right = bbox
+            gray = gray.crop((left, top, right, bottom))
+
+            angle = self._skew_angle(ink[top:bottom, left:right])
+            if angle is not None:
+                gray = gray.rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=255)
+                with self._lock:
+                    self._deskewed += 1
+
+        scale = self.target_size / max(gray.size)
+        if scale < 1:
+            size = (max(1, round(gray.size[0] * scale)), max(1, round(gray.size[1] * scale)))
+            gray = gray.resize(size, Image.LANCZOS)
+
+        return gray.convert("RGB")
+
+    def _ink_bbox(self, ink: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Bounding box (top, bottom, left, right) of the ink, with a small margin
+
+        Rows and columns with only a few ink pixels don't count, so isolated specks
+        and sensor noise don't stretch the box to the edges of the photo.
+        """
+        rows = np.flatnonzero(ink_rows(ink))
+        cols = np.flatnonzero(ink_columns(ink))
+        if rows.size == 0 or cols.size == 0:
+            return None
+
+        margin_y = int((rows[-1] - rows[0]) * CROP_MARGIN) + 2
+        margin_x = int((cols[-1] - cols[0]) * CROP_MARGIN) + 2
+        height, width = ink.shape
+        return (
+            max(0, rows[0] - margin_y),
+            min(height, rows[-1] + 1 + margin_y),
+            max(0, cols[0] - margin_x),
+            min(width, cols[-1] + 1 + margin_x),
+        )
+
+    def _skew_angle(self, ink: np.ndarray) -> Optional[float]:
+        """
+        Counter-clockwise rotation (degrees) that levels the ink, or None to leave it
+
+        The principal axis of the ink pixel distribution gives the writing
+        direction. Only clearly elongated ink (a line rather than a block) with a
+        small, non-trivial angle is corrected.
+        """
+        ys, xs = np.nonzero(ink)
+        if xs.size < 100:
+            return None
+        step = max(1, xs.size // 50000)
+        xs = xs[::step].astype(np.float64)
+        ys = ys[::step].astype(np.float64)
+
+        mu20 = np.var(xs)
+        mu02 = np.var(ys)
+        mu11 = np.mean((xs - xs.mean()) * (ys - ys.mean()))
+
+        # Eigenvalues of the covariance matrix: spread along and across the axis
+        spread = math.sqrt(((mu20 - mu02) / 2) ** 2 + mu11 ** 2)
+        major = (mu20 + mu02) / 2 + spread
+        minor = (mu20 + mu02) / 2 - spread
+        if minor <= 0 or major / minor < 4:
+            return None
+
+        angle = math.degrees(0.5 * math.atan2(2 * mu11, mu20 - mu02))
+        if not 0.5 <= abs(angle) <= self.max_deskew_degrees:
+            return None
+        return angle
+
+    def _store(self, key: str, image: Image.Image):
+        size = image.size[0] * image.size[1] * 3
+        if size > self.cache_bytes or key in self._cache:
+            return
+        self._cache[key] = image
+        self._cached_bytes += size
+        while self._cached_bytes > self.cache_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cached_bytes -= evicted.size[0] * evicted.size[1] * 3
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Preprocessing metrics
+
+        Returns:
+            Dictionary with time per image, pixel reduction and cache usage
+        """
+        with self._lock:
+            lookups = self._images + self._hits
+            return {
+                "enabled": self.enabled,
+                "images": self._images,
+                "cache_hits": self._hits,
+                "cache_hit_rate": self._hits / lookups if lookups else 0.0,
+                "cache_bytes": self._cached_bytes,
+                "mean_seconds": self._seconds_total / self._images if self._images else 0.0,
+                "pixel_reduction": 1 - self._output_pixels / self._input_pixels if self._input_pixels else 0.0,
+                "deskewed": self._deskewed,
+            }
+
+
+# Shared by every upload in the process
+image_preprocessor = ImagePreprocessor()
@@ -0,0 +1,389 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+from core.config import (
+    OPENAI_BASE_URL,
+    REASONING_BREAKER_COOLDOWN_SECONDS,
+    REASONING_BREAKER_THRESHOLD,
+    REASONING_BURST,
+    REASONING_MAX_IN_FLIGHT,
+    REASONING_MAX_RETRIES,
+    REASONING_RATE_PER_SECOND,
+    REASONING_TIMEOUT_SECONDS,
+)
+
+# Upstream errors worth retrying after a backoff
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    asyncio.TimeoutError,
+)
+
+
+class ReasoningUnavailableError(Exception):
+    """Raised when the reasoning model can't be reached within the retry budget"""
+
+
+class TokenBucket:
+    """Async token-bucket rate limiter (`rate` requests per second, bursts up to `capacity`)"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> float:
+        """
+        Take one token, waiting for the bucket to refill if needed
+
+        Returns:
+            Seconds spent waiting
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+
+class CircuitBreaker:
+    """
+    Stop calling an upstream that keeps failing
+
+    Opens after `threshold` consecutive failures and rejects calls for `cooldown`
+    seconds, then lets a single trial call through (half-open). A successful trial
+    closes the breaker; a failed one re-opens it. A trial that ends without either
+    (e.g. cancelled) must call `release` so another call can take its place.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.opened_count = 0
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+
+        if self.state == self.HALF_OPEN:
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+        return self.state == self.CLOSED
+
+    def release(self):
+        """Give back the half-open trial slot of a call that ended without a result"""
+        if self.state == self.HALF_OPEN:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self._failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self._failures += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self._failures >= self.threshold):
+            if self.state != self.OPEN:
+                self.opened_count += 1
+                logging.warning(f"Reasoning circuit breaker opened after {self._failures} failures")
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class ReasoningClient:
+    """
+    Async client for the OpenAI-compatible reasoning model
+
+    Shares one pooled HTTP connection across requests and wraps every call with a
+    max in-flight limit, token-bucket rate limiting, a per-call deadline covering
+    all retries, exponential backoff with full jitter on retryable errors, and a
+    circuit breaker. Point OPENAI_BASE_URL at services.openai_stub to run offline.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        reasoning_effort: str,
+        base_url: Optional[str] = OPENAI_BASE_URL,
+        max_in_flight: int = REASONING_MAX_IN_FLIGHT,
+        rate_per_second: float = REASONING_RATE_PER_SECOND,
+        burst: int = REASONING_BURST,
+        max_retries: int = REASONING_MAX_RETRIES,
+        timeout: float = REASONING_TIMEOUT_SECONDS,
+        breaker_threshold: int = REASONING_BREAKER_THRESHOLD,
+        breaker_cooldown: float = REASONING_BREAKER_COOLDOWN_SECONDS,
+    ):
+        self.model = model
+        self.reasoning_effort = reasoning_effort
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max(0, max_retries)
+        self.timeout = timeout
+
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_in_flight,
+                max_keepalive_connections=self.max_in_flight,
+            ),
+        )
+        # Retries are handled here so they share the deadline and the breaker
+        self._client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=self._http, max_retries=0)
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        self._bucket = TokenBucket(rate_per_second, burst)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+
+        # Metrics
+        self._in_flight = 0
+        self._calls = 0
+        self._succeeded = 0
+        self._failed = 0
+        self._retries = 0
+        self._breaker_rejections = 0
+        self._rate_limited_seconds = 0.0
+        self._latency_total = 0.0
+
+    async def complete(self, messages: List[Dict[str, str]]) -> str:
+        """
+        Run a chat completion within the retry budget
+
+        Args:
+            messages: Chat messages to send
+
+        Returns:
+            Content of the model's reply
+
+        Raises:
+            ReasoningUnavailableError: If the breaker is open or the deadline/retries are exhausted
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        started = time.perf_counter()
+        self._calls += 1
+        last_error: Optional[BaseException] = None
+
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            if not self.breaker.allow():
+                self._breaker_rejections += 1
+                self._failed += 1
+                raise ReasoningUnavailableError("Reasoning service circuit breaker is open")
+
+            try:
+                content = await asyncio.wait_for(self._attempt(messages, remaining), remaining)
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                last_error = e
+                logging.warning(f"Reasoning call failed (attempt {attempt + 1}): {type(e).__name__}")
+
+                # Exponential backoff with full jitter, never sleeping past the deadline
+                delay = random.uniform(0, min(8.0, 0.5 * 2 ** attempt))
+                if attempt == self.max_retries or loop.time() + delay >= deadline:
+                    break
+                self._retries += 1
+                await asyncio.sleep(delay)
+                continue
+            except openai.APIStatusError:
+                # The upstream answered, so it is healthy; the request itself was rejected
+                self.breaker.record_success()
+                self._failed += 1
+                raise
+            except asyncio.CancelledError:
+                # Says nothing about the upstream, but must not keep the half-open trial slot
+                self.breaker.release()
+                raise
+            except Exception:
+                self.breaker.record_failure()
+                self._failed += 1
+                raise
+
+            self.breaker.record_success()
+            self._succeeded += 1
+            self._latency_total += time.perf_counter() - started
+            return content
+
+        self._failed += 1
+        reason = type(last_error).__name__ if last_error else "deadline exceeded"
+        raise ReasoningUnavailableError(f"Reasoning service unavailable ({reason})")
+
+    async def _attempt(self, messages: List[Dict[str, str]], timeout: float) -> str:
+        async with self._semaphore:
+            self._rate_limited_seconds += await self._bucket.acquire()
+            self._in_flight += 1
+            try:
+                response = await self._client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    reasoning_effort=self.reasoning_effort,
+                    timeout=timeout,
+                )
+            finally:
+                self._in_flight -= 1
+        return response.choices[0].message.content
+
+    async def stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """
+        Run a streaming chat completion, yielding content deltas as they arrive
+
+        Retries (within the deadline) only happen before the stream is opened; once
+        tokens have been yielded a failure is raised to the caller.
+
+        Args:
+            messages: Chat messages to send
+
+        Yields:
+            Content deltas of the model's reply
+
+        Raises:
+            ReasoningUnavailableError: If the breaker is open, the deadline passes or retries are exhausted
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        started = time.perf_counter()
+        self._calls += 1
+        last_error: Optional[BaseException] = None
+
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            if not self.breaker.allow():
+                self._breaker_rejections += 1
+                self._failed += 1
+                raise ReasoningUnavailableError("Reasoning service circuit breaker is open")
+
+            try:
+                response = await asyncio.wait_for(self._open_stream(messages, remaining), remaining)
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                last_error = e
+                logging.warning(f"Reasoning stream failed to open (attempt {attempt + 1}): {type(e).__name__}")
+
+                delay = random.uniform(0, min(8.0, 0.5 * 2 ** attempt))
+                if attempt == self.max_retries or loop.time() + delay >= deadline:
+                    break
+                self._retries += 1
+                await asyncio.sleep(delay)
+                continue
+            except openai.APIStatusError:
+                self.breaker.record_success()
+                self._failed += 1
+                raise
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception:
+                self.breaker.record_failure()
+                self._failed += 1
+                raise
+
+            # The semaphore slot acquired in _open_stream is held until the stream ends
+            try:
+                async for chunk in response:
+                    if loop.time() > deadline:
+                        raise asyncio.TimeoutError()
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        yield delta
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                self._failed += 1
+                raise ReasoningUnavailableError(f"Reasoning stream interrupted ({type(e).__name__})")
+            except (asyncio.CancelledError, GeneratorExit):
+                # The consumer went away (e.g. the SSE client disconnected)
+                self.breaker.release()
+                raise
+            except Exception:
+                self.breaker.record_failure()
+                self._failed += 1
+                raise
+            finally:
+                self._in_flight -= 1
+                self._semaphore.release()
+                await response.close()
+
+            self.breaker.record_success()
+            self._succeeded += 1
+            self._latency_total += time.perf_counter() - started
+            return
+
+        self._failed += 1
+        reason = type(last_error).__name__ if last_error else "deadline exceeded"
+        raise ReasoningUnavailableError(f"Reasoning service unavailable ({reason})")
+
+    async def _open_stream(self, messages: List[Dict[str, str]], timeout: float):
+        """Acquire an in-flight slot and open a completion stream; the caller releases the slot"""
+        await self._semaphore.acquire()
+        try:
+            self._rate_limited_seconds += await self._bucket.acquire()
+            response = await self._client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                reasoning_effort=self.reasoning_effort,
+                stream=True,
+                timeout=timeout,
+            )
+        except BaseException:
+            self._semaphore.release()
+            raise
+        self._in_flight += 1
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Client metrics
+
+        Returns:
+            Dictionary with call outcomes, retries, limiter waits and breaker state
+        """
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self._in_flight,
+            "calls": self._calls,
+            "succeeded": self._succeeded,
+            "failed": self._failed,
+            "retries": self._retries,
+            "breaker_state": self.breaker.state,
+            "breaker_opened": self.breaker.opened_count,
+            "breaker_rejections": self._breaker_rejections,
+            "rate_limited_seconds": self._rate_limited_seconds,
+            "mean_latency_seconds": self._latency_total / self._succeeded if self._succeeded else 0.0,
+        }
+
+    async def aclose(self):
+        await self._client.close()
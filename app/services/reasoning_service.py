@@ -1,9 +1,28 @@
-from openai import OpenAI
 from dotenv import load_dotenv
 from pathlib import Path
 import os
 import json
+import asyncio
+import hashlib
 import logging
+from typing import Any, AsyncIterator, Optional, Tuple
+from core.config import (
+    REASONING_EFFORT,
+    REASONING_MODEL,
+    VERIFICATION_CACHE_DIR,
+    VERIFICATION_CACHE_ENABLED,
+    VERIFICATION_CACHE_MAX_DISK_MB,
+    VERIFICATION_CACHE_MAX_ENTRIES,
+    VERIFICATION_CACHE_TTL_SECONDS,
+    VERIFY_SYMBOLIC_ENABLED,
+    VERIFY_SYMBOLIC_TIMEOUT_SECONDS,
+)
+from core.metrics import registry, span
+from services.cache_service import AsyncSingleFlight, TieredCache
+from services.executor_service import io_executor
+from services.latex_normalizer import canonical_latex, canonical_solution, normalize_whitespace
+from services.reasoning_client import ReasoningClient
+from services.symbolic_verifier import SymbolicVerifier
 # from services.knowledge_service import retrieve_knowledge_base
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -11,73 +30,69 @@ SOLUTION_DIR = Path("./data/local/solutions")
 
 SOLUTION_DIR.mkdir(parents=True, exist_ok=True)
 
+VERIFICATIONS = registry.counter("verifications", "Verification results by where they came from", ("source",))
+
+MOCK_RESULT = {
+    "is_correct": True,
+    "explanation": "The solution is correct. (Mock response for testing)",
+    "step_by_step": ["Step 1: Set up the equation", "Step 2: Solve for x", "Step 3: Verify the answer"]
+}
+
 class ReasoningService:
     def __init__(self):
         self.api_key = os.getenv("OPENAI_API_KEY")
         self.client = None
+        self.model = REASONING_MODEL
+        self.reasoning_effort = REASONING_EFFORT
+        
+        # Verified results are cached and identical in-flight requests share one upstream call
+        self.cache = None
+        if VERIFICATION_CACHE_ENABLED:
+            self.cache = TieredCache(
+                "verification",
+                VERIFICATION_CACHE_DIR,
+                max_entries=VERIFICATION_CACHE_MAX_ENTRIES,
+                max_disk_bytes=VERIFICATION_CACHE_MAX_DISK_MB * 1024 * 1024,
+                ttl_seconds=VERIFICATION_CACHE_TTL_SECONDS,
+            )
+        self.single_flight = AsyncSingleFlight()
+        
+        # Simple algebra is verified symbolically without calling the model
+        self.symbolic_verifier = SymbolicVerifier() if VERIFY_SYMBOLIC_ENABLED else None
+        
         try:
             if self.api_key:
-                self.client = OpenAI(api_key=self.api_key)
+                self.client = ReasoningClient(self.api_key, self.model, self.reasoning_effort)
             else:
                 logging.warning("No OpenAI API key found. Using mock responses.")
         except Exception as e:
             logging.error(f"Failed to initialize OpenAI client: {str(e)}")
             logging.warning("Using mock responses for testing.")
 
-    def verify_solution(self, latex: str, solution: str) -> dict:
+    async def verify_solution(self, latex: str, solution: str) -> dict:
         """
         Verify a solution for a given math equation
+        
+        Problems in the classes the symbolic verifier supports are answered locally;
+        everything else goes to the reasoning model.
+        
+        Raises:
+            ReasoningUnavailableError: If the reasoning model can't be reached
         """
+        result = await self._verify_symbolically(latex, solution)
+        if result is not None:
+            return result
+        
         # If client initialization failed or no API key, return mock response
         if not self.client:
             logging.info("Using mock verification response")
-            return {
-                "is_correct": True,
-                "explanation": "The solution is correct. (Mock response for testing)",
-                "step_by_step": ["Step 1: Set up the equation", "Step 2: Solve for x", "Step 3: Verify the answer"]
-            }
+            VERIFICATIONS.inc(source="mock")
+            return dict(MOCK_RESULT)
         
-        try:
-            prompt = f"""
-            Instructions:
-            - The math solution below is user's math solution.
-            - Verify the user's solution based on rigorous proof and mathematical theories.
-            - If the user's solution is wrong, show why the solution is wrong and give the correct solution.
-            - If the user's solution is correct, briefly explain why user's solution is correct.
-            
-            Problem: {latex}
-            User's math solution: {solution}
-            """
-            
-            response = self.client.chat.completions.create(
-                model="o3-mini",
-                messages=[
-                    {"role": "system", "content": "You are a math verification assistant that analyzes math solutions."},
-                    {"role": "user", "content": prompt}
-                ],
-                reasoning={"effort": "high"},
-                temperature=0.1
-            )
-            
-            content = response.choices[0].message.content
-            
-            # Simple parsing of AI response to determine correctness
-            is_correct = "correct" in content.lower() and not "incorrect" in content.lower()
-            
-            return {
-                "is_correct": is_correct,
-                "explanation": content,
-                "step_by_step": content.split("\n")
-            }
-        except Exception as e:
-            logging.error(f"Verification failed: {str(e)}")
-            return {
-                "is_correct": True,
-                "explanation": "The solution is correct. (Mock response due to error)",
-                "step_by_step": ["Step 1: Set up the equation", "Step 2: Solve for x", "Step 3: Verify the answer"]
-            }
-
-    def verify_solution_with_prompt(self, custom_prompt: str, solution: str) -> dict:
+        prompt = self._build_prompt("latex", latex, solution)
+        return await self._verify_cached("latex", latex, solution, prompt)
+
+    async def verify_solution_with_prompt(self, custom_prompt: str, solution: str) -> dict:
         """
         Verify a solution using custom prompt provided by user
         
@@ -87,55 +102,187 @@ class ReasoningService:
             
         Returns:
             Dictionary with verification results
+            
+        Raises:
+            ReasoningUnavailableError: If the reasoning model can't be reached
         """
         # If client initialization failed or no API key, return mock response
         if not self.client:
             logging.info("Using mock verification response")
-            return {
-                "is_correct": True,
-                "explanation": "The solution is correct. (Mock response for testing)",
-                "step_by_step": ["Step 1: Set up the equation", "Step 2: Solve for x", "Step 3: Verify the answer"]
-            }
+            VERIFICATIONS.inc(source="mock")
+            return dict(MOCK_RESULT)
         
-        try:
-            prompt = f"""
-            Instructions:
-            - The math solution below is user's math solution.
-            - Verify the user's solution based on rigorous proof and mathematical theories.
-            - If the user's solution is wrong, show why the solution is wrong and give the correct solution.
-            - If the user's solution is correct, briefly explain why user's solution is correct.
-            
-            User's Problem Description: {custom_prompt}
-            
-            User's math solution: {solution}
-            """
-            
-            response = self.client.chat.completions.create(
-                model="o3-mini",
-                messages=[
-                    {"role": "system", "content": "You are a math verification assistant that analyzes math solutions."},
-                    {"role": "user", "content": prompt}
-                ],
-                reasoning={"effort": "high"},
-                temperature=0.1
-            )
+        prompt = self._build_prompt("prompt", custom_prompt, solution)
+        return await self._verify_cached("prompt", custom_prompt, solution, prompt)
+
+    async def stream_verification(self, kind: str, problem: str, solution: str) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Verify a solution, yielding progress events as the model's answer streams in
+        
+        Args:
+            kind: "latex" for OCR-recognized problems, "prompt" for custom prompts
+            problem: LaTeX equation or problem description
+            solution: Solution provided by user
             
-            content = response.choices[0].message.content
+        Yields:
+            ("token", text) for each content delta, ("step", text) for each completed
+            line, and finally ("result", verification result dictionary)
             
-            # Simple parsing of AI response to determine correctness
-            is_correct = "correct" in content.lower() and not "incorrect" in content.lower()
+        Raises:
+            ReasoningUnavailableError: If the reasoning model can't be reached
+        """
+        result = await self._verify_symbolically(problem, solution) if kind == "latex" else None
+        if result is None and not self.client:
+            VERIFICATIONS.inc(source="mock")
+            result = dict(MOCK_RESULT)
+        elif result is None:
+            key = self._cache_key(kind, problem, solution)
+            result = await self._cache_get(key)
+        
+        # Symbolic, cached and mock results are replayed step by step without a model call
+        if result is not None:
+            for step in result["step_by_step"]:
+                yield "step", step
+            yield "result", result
+            return
+        
+        prompt = self._build_prompt(kind, problem, solution)
+        content = ""
+        pending_line = ""
+        with span("verify.model_stream"):
+            async for delta in self.client.stream(self._messages(prompt)):
+                content += delta
+                yield "token", delta
+                
+                pending_line += delta
+                *lines, pending_line = pending_line.split("\n")
+                for line in lines:
+                    yield "step", line
+        yield "step", pending_line
+        
+        result = self._parse_content(content)
+        VERIFICATIONS.inc(source="model")
+        await self._cache_set(key, result)
+        yield "result", result
+
+    async def _verify_symbolically(self, latex: str, solution: str) -> Optional[dict]:
+        """
+        Symbolic verification result, or None to use the reasoning model
+        
+        SymPy runs on the I/O pool; a check that outruns the time limit is escalated.
+        """
+        if self.symbolic_verifier is None:
+            return None
+        try:
+            with span("verify.symbolic"):
+                result = await asyncio.wait_for(
+                    io_executor.run(self.symbolic_verifier.verify, latex, solution),
+                    VERIFY_SYMBOLIC_TIMEOUT_SECONDS
+                )
+            if result is not None:
+                VERIFICATIONS.inc(source="symbolic")
+            return result
+        except asyncio.TimeoutError:
+            self.symbolic_verifier.record_timeout()
+            logging.info("Symbolic verification timed out, escalating to the reasoning model")
+            return None
+
+    def _build_prompt(self, kind: str, problem: str, solution: str) -> str:
+        """Verification prompt for an OCR-recognized equation ("latex") or a custom problem description ("prompt")"""
+        if kind == "prompt":
+            problem_line = f"User's Problem Description: {problem}\n        "
+        else:
+            problem_line = f"Problem: {problem}"
+        
+        return f"""
+        Instructions:
+        - The math solution below is user's math solution.
+        - Verify the user's solution based on rigorous proof and mathematical theories.
+        - If the user's solution is wrong, show why the solution is wrong and give the correct solution.
+        - If the user's solution is correct, briefly explain why user's solution is correct.
+        
+        {problem_line}
+        User's math solution: {solution}
+        """
+
+    def _cache_key(self, kind: str, problem: str, solution: str) -> str:
+        """
+        Cache key for a verification request
+        
+        Args:
+            kind: "latex" for OCR-recognized problems, "prompt" for custom prompts
+            problem: LaTeX equation or problem description
+            solution: Solution provided by user
             
-            return {
-                "is_correct": is_correct,
-                "explanation": content,
-                "step_by_step": content.split("\n")
-            }
-        except Exception as e:
-            logging.error(f"Verification with custom prompt failed: {str(e)}")
-            return {
-                "is_correct": True,
-                "explanation": "The solution is correct. (Mock response due to error)",
-                "step_by_step": ["Step 1: Set up the equation", "Step 2: Solve for x", "Step 3: Verify the answer"]
-            }
-
-    
\ No newline at end of file
+        Returns:
+            Hex digest of the canonical request, model and reasoning effort
+        """
+        # Equivalent spellings of an equation share one entry; custom prompts are prose
+        canonical_problem = canonical_latex(problem) if kind == "latex" else normalize_whitespace(problem)
+        parts = [kind, canonical_problem, canonical_solution(solution), self.model, self.reasoning_effort]
+        return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+    async def _verify_cached(self, kind: str, problem: str, solution: str, prompt: str) -> dict:
+        """Serve from the cache, otherwise make one upstream call shared by identical concurrent requests"""
+        key = self._cache_key(kind, problem, solution)
+        cached = await self._cache_get(key)
+        if cached is not None:
+            return cached
+        
+        async def call_and_store() -> dict:
+            result = await self._call_model(prompt)
+            await self._cache_set(key, result)
+            return result
+        
+        return await self.single_flight.do(key, call_and_store)
+
+    async def _cache_get(self, key: str) -> Optional[dict]:
+        if not self.cache:
+            return None
+        with span("verify.cache_get"):
+            cached = await io_executor.run(self.cache.get, key)
+        if cached is not None:
+            VERIFICATIONS.inc(source="cache")
+        return cached
+
+    async def _cache_set(self, key: str, result: dict):
+        if self.cache:
+            with span("verify.cache_set"):
+                await io_executor.run(self.cache.set, key, result)
+
+    async def _call_model(self, prompt: str) -> dict:
+        """Ask the reasoning model to verify a solution and parse its answer"""
+        with span("verify.model_call"):
+            content = await self.client.complete(self._messages(prompt))
+        VERIFICATIONS.inc(source="model")
+        return self._parse_content(content)
+
+    def _messages(self, prompt: str) -> list:
+        return [
+            {"role": "system", "content": "You are a math verification assistant that analyzes math solutions."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _parse_content(self, content: str) -> dict:
+        """Turn the model's answer into a verification result"""
+        # Simple parsing of AI response to determine correctness
+        is_correct = "correct" in content.lower() and not "incorrect" in content.lower()
+        
+        return {
+            "is_correct": is_correct,
+            "explanation": content,
+            "step_by_step": content.split("\n")
+        }
+
+    def stats(self) -> dict:
+        """Symbolic fast path, verification cache, request coalescing and upstream client metrics"""
+        return {
+            "symbolic": self.symbolic_verifier.stats() if self.symbolic_verifier else None,
+            "cache": self.cache.stats() if self.cache else None,
+            "single_flight": self.single_flight.stats(),
+            "client": self.client.stats() if self.client else None,
+        }
+
+    async def aclose(self):
+        if self.client:
+            await self.client.aclose()
@@ -0,0 +1,106 @@
+import io
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from core.config import OCR_SEGMENT_GAP_RATIO, OCR_SEGMENT_MAX_REGIONS, OCR_SEGMENT_MIN_LINE_PX
+from services.preprocess_service import ImagePreprocessor, image_preprocessor, ink_columns, ink_mask, ink_rows
+
+# Bounding box in page pixels: (left, top, right, bottom)
+BBox = Tuple[int, int, int, int]
+
+
+class TooManyRegionsError(Exception):
+    """Raised when a page splits into more regions than OCR_SEGMENT_MAX_REGIONS"""
+
+
+class PageSegmenter:
+    """
+    Split a page of handwritten equations into one crop per equation line
+
+    The page is decoded at the preprocessor's working size and binarized the same
+    way, then split with a horizontal projection profile: runs of rows containing
+    ink are lines, and lines separated by less than `gap_ratio` times the taller
+    of the two are merged, so fractions, superscripts and limits stay with their
+    equation. Each line is trimmed to the columns containing ink.
+
+    Lines are assumed to be roughly horizontal across the page; each crop is
+    deskewed individually when it is preprocessed for OCR.
+    """
+
+    def __init__(
+        self,
+        preprocessor: ImagePreprocessor = image_preprocessor,
+        gap_ratio: float = OCR_SEGMENT_GAP_RATIO,
+        min_line_px: int = OCR_SEGMENT_MIN_LINE_PX,
+        max_regions: int = OCR_SEGMENT_MAX_REGIONS,
+    ):
+        self.preprocessor = preprocessor
+        self.gap_ratio = gap_ratio
+        self.min_line_px = min_line_px
+        self.max_regions = max_regions
+
+    def segment(self, data: bytes) -> List[Tuple[BBox, bytes]]:
+        """
+        Find the equation lines of a page
+
+        Args:
+            data: Encoded page image
+
+        Returns:
+            (bounding box in the upright original page, PNG-encoded crop) for each
+            line, top to bottom
+
+        Raises:
+            TooManyRegionsError: If the page has more than max_regions lines
+        """
+        image = Image.open(io.BytesIO(data))
+        gray = self.preprocessor.working_image(image)
+        # Working image coordinates back to the (EXIF-rotated) original's
+        scale = max(image.size) / max(gray.size)
+
+        ink = ink_mask(np.asarray(gray))
+        lines = self._lines(ink_rows(ink))
+        if len(lines) > self.max_regions:
+            raise TooManyRegionsError(f"Page has more than {self.max_regions} equation regions")
+
+        regions = []
+        for top, bottom in lines:
+            cols = np.flatnonzero(ink_columns(ink[top:bottom]))
+            if cols.size == 0:
+                continue
+            margin = max(2, (bottom - top) // 4)
+            box = (
+                max(0, cols[0] - margin),
+                max(0, top - margin),
+                min(gray.size[0], cols[-1] + 1 + margin),
+                min(gray.size[1], bottom + margin),
+            )
+
+            buffer = io.BytesIO()
+            gray.crop(box).save(buffer, format="PNG")
+            regions.append((tuple(int(round(v * scale)) for v in box), buffer.getvalue()))
+        return regions
+
+    def _lines(self, rows: np.ndarray) -> List[Tuple[int, int]]:
+        """(top, bottom) of each line from the rows containing ink"""
+        # Starts and ends of runs of ink rows
+        edges = np.diff(np.concatenate(([0], rows.astype(np.int8), [0])))
+        runs = list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+        lines = []
+        for top, bottom in runs:
+            if lines:
+                previous_top, previous_bottom = lines[-1]
+                taller = max(previous_bottom - previous_top, bottom - top)
+                if top - previous_bottom < self.gap_ratio * taller:
+                    lines[-1] = (previous_top, bottom)
+                    continue
+            lines.append((top, bottom))
+
+        return [(int(top), int(bottom)) for top, bottom in lines if bottom - top >= self.min_line_px]
+
+
+# Shared by every page request in the process
+page_segmenter = PageSegmenter()
@@ -0,0 +1,367 @@
+import json
+import logging
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+class StorageBackend(ABC):
+    """
+    Persistence for image metadata, equations and solutions
+
+    Records are plain dictionaries using the same field names as the original JSON
+    files. Timestamps are "%Y%m%d%H%M%S" strings, so they sort chronologically.
+    """
+
+    @abstractmethod
+    def insert_images(self, records: Iterable[Dict[str, Any]]):
+        ...
+
+    @abstractmethod
+    def insert_equations(self, records: Iterable[Dict[str, Any]]):
+        ...
+
+    @abstractmethod
+    def insert_solutions(self, records: Iterable[Dict[str, Any]]):
+        ...
+
+    @abstractmethod
+    def update_equation(
+        self, equation_id: str, latex: str, rendered_latex: str, last_modified: str, latex_hash: Optional[str] = None
+    ) -> bool:
+        ...
+
+    @abstractmethod
+    def get_image(self, image_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def find_images(self, hashes: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Image metadata by SHA-256 of the original bytes (the newest image per hash)"""
+
+    @abstractmethod
+    def get_equation(self, equation_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def list_equations(
+        self, since: Optional[str] = None, until: Optional[str] = None, limit: int = 100, latex_hash: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def list_solutions(self, equation_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def fill_latex_hashes(self, hash_latex: Callable[[str], str], refresh: bool = False) -> int:
+        """
+        Set the canonical LaTeX hash of equations stored without one
+
+        Args:
+            hash_latex: Hash function (services.latex_normalizer.latex_hash)
+            refresh: Recompute every hash (after the canonical form changed)
+
+        Returns:
+            Number of updated equations
+        """
+
+    @contextmanager
+    def transaction(self):
+        """Group writes so they are committed together"""
+        yield
+
+
+class JSONStorageBackend(StorageBackend):
+    """
+    One pretty-printed JSON file per record (the original layout)
+
+    Lookups by ID are single file reads, but listing scans the whole directory.
+    """
+
+    def __init__(self, data_dir: Path):
+        self.images_dir = data_dir / "images"
+        self.equations_dir = data_dir / "equations"
+        self.solutions_dir = data_dir / "solutions"
+
+        for directory in (self.images_dir, self.equations_dir, self.solutions_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def _write(self, path: Path, record: Dict[str, Any]):
+        with open(path, "w") as f:
+            json.dump(record, f, indent=2)
+
+    def _read(self, path: Path) -> Optional[Dict[str, Any]]:
+        if not path.exists():
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def insert_images(self, records):
+        for record in records:
+            self._write(self.images_dir / f"{record['id']}_meta.json", record)
+
+    def insert_equations(self, records):
+        for record in records:
+            self._write(self.equations_dir / f"{record['id']}.json", record)
+
+    def insert_solutions(self, records):
+        for record in records:
+            self._write(self.solutions_dir / f"{record['id']}.json", record)
+
+    def update_equation(self, equation_id, latex, rendered_latex, last_modified, latex_hash=None):
+        path = self.equations_dir / f"{equation_id}.json"
+        equation_data = self._read(path)
+        if equation_data is None:
+            return False
+
+        equation_data["latex"] = latex
+        equation_data["rendered_latex"] = rendered_latex
+        equation_data["last_modified"] = last_modified
+        equation_data["latex_hash"] = latex_hash
+        self._write(path, equation_data)
+        return True
+
+    def get_image(self, image_id):
+        return self._read(self.images_dir / f"{image_id}_meta.json")
+
+    def find_images(self, hashes):
+        # Scans every metadata file; migrate to SQLite for large exports
+        hashes = set(hashes)
+        found = {}
+        for path in self.images_dir.glob("*_meta.json"):
+            record = self._read(path)
+            sha256 = record.get("sha256")
+            if sha256 in hashes and (sha256 not in found or record["timestamp"] > found[sha256]["timestamp"]):
+                found[sha256] = record
+        return found
+
+    def get_equation(self, equation_id):
+        return self._read(self.equations_dir / f"{equation_id}.json")
+
+    def list_equations(self, since=None, until=None, limit=100, latex_hash=None):
+        records = [self._read(path) for path in self.equations_dir.glob("*.json")]
+        records = [
+            r for r in records
+            if (since is None or r["timestamp"] >= since) and (until is None or r["timestamp"] < until)
+            and (latex_hash is None or r.get("latex_hash") == latex_hash)
+        ]
+        records.sort(key=lambda r: r["timestamp"], reverse=True)
+        return records[:limit]
+
+    def list_solutions(self, equation_id, limit=100):
+        records = [self._read(path) for path in self.solutions_dir.glob("*.json")]
+        records = [r for r in records if r["equation_id"] == equation_id]
+        records.sort(key=lambda r: r["timestamp"], reverse=True)
+        return records[:limit]
+
+    def fill_latex_hashes(self, hash_latex, refresh=False):
+        filled = 0
+        for path in self.equations_dir.glob("*.json"):
+            record = self._read(path)
+            value = hash_latex(record["latex"]) if refresh or record.get("latex_hash") is None else record["latex_hash"]
+            if value != record.get("latex_hash"):
+                record["latex_hash"] = value
+                self._write(path, record)
+                filled += 1
+        return filled
+
+
+class SQLiteStorageBackend(StorageBackend):
+    """
+    SQLite database in WAL mode with indexes on IDs and timestamps
+
+    Each thread gets its own connection; WAL lets readers proceed while a writer
+    commits. Writes outside `transaction()` commit individually; inside it they are
+    committed together in one transaction.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS images (
+        id TEXT PRIMARY KEY,
+        filename TEXT NOT NULL,
+        original_path TEXT,
+        timestamp TEXT NOT NULL,
+        sha256 TEXT,
+        size INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS idx_images_timestamp ON images (timestamp);
+
+    CREATE TABLE IF NOT EXISTS equations (
+        id TEXT PRIMARY KEY,
+        image_id TEXT NOT NULL,
+        latex TEXT NOT NULL,
+        rendered_latex TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        last_modified TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_equations_image_id ON equations (image_id);
+    CREATE INDEX IF NOT EXISTS idx_equations_timestamp ON equations (timestamp);
+    CREATE INDEX IF NOT EXISTS idx_equations_last_modified ON equations (last_modified);
+
+    CREATE TABLE IF NOT EXISTS solutions (
+        id TEXT PRIMARY KEY,
+        equation_id TEXT NOT NULL,
+        solution TEXT NOT NULL,
+        is_correct INTEGER,
+        explanation TEXT,
+        timestamp TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_solutions_equation_id ON solutions (equation_id, timestamp);
+    CREATE INDEX IF NOT EXISTS idx_solutions_timestamp ON solutions (timestamp);
+    """
+
+    # Columns added after the first release, created on databases that predate them
+    ADDED_COLUMNS = {
+        "images": [("sha256", "TEXT"), ("size", "INTEGER")],
+        "equations": [("latex_hash", "TEXT")],
+    }
+
+    IMAGE_COLUMNS = ("id", "filename", "original_path", "timestamp", "sha256", "size")
+    EQUATION_COLUMNS = ("id", "image_id", "latex", "rendered_latex", "timestamp", "last_modified", "latex_hash")
+    SOLUTION_COLUMNS = ("id", "equation_id", "solution", "is_correct", "explanation", "timestamp")
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+        self._add_missing_columns(conn)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_images_sha256 ON images (sha256)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_equations_latex_hash ON equations (latex_hash, timestamp)")
+        logging.info(f"SQLite storage ready: {self.db_path}")
+
+    def _add_missing_columns(self, conn: sqlite3.Connection):
+        for table, columns in self.ADDED_COLUMNS.items():
+            existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for name, column_type in columns:
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; transaction() issues BEGIN/COMMIT explicitly
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self._conn()
+        if self._local.depth:
+            # Nested: join the outer transaction
+            self._local.depth += 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+
+        self._local.depth = 1
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._local.depth = 0
+
+    def _insert(self, table: str, columns: tuple, records: Iterable[Dict[str, Any]]):
+        placeholders = ", ".join("?" for _ in columns)
+        rows = [tuple(record.get(column) for column in columns) for record in records]
+        if not rows:
+            return
+        with self.transaction():
+            self._conn().executemany(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+                rows,
+            )
+
+    def insert_images(self, records):
+        self._insert("images", self.IMAGE_COLUMNS, records)
+
+    def insert_equations(self, records):
+        self._insert("equations", self.EQUATION_COLUMNS, records)
+
+    def insert_solutions(self, records):
+        self._insert("solutions", self.SOLUTION_COLUMNS, records)
+
+    def update_equation(self, equation_id, latex, rendered_latex, last_modified, latex_hash=None):
+        cursor = self._conn().execute(
+            "UPDATE equations SET latex = ?, rendered_latex = ?, last_modified = ?, latex_hash = ? WHERE id = ?",
+            (latex, rendered_latex, last_modified, latex_hash, equation_id),
+        )
+        return cursor.rowcount > 0
+
+    def _fetch_one(self, query: str, params: tuple) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(query, params).fetchone()
+        return dict(row) if row is not None else None
+
+    def _fetch_all(self, query: str, params: tuple) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self._conn().execute(query, params).fetchall()]
+
+    def get_image(self, image_id):
+        return self._fetch_one("SELECT * FROM images WHERE id = ?", (image_id,))
+
+    def find_images(self, hashes):
+        hashes = list(dict.fromkeys(hashes))
+        found = {}
+        # Within SQLite's limit on query parameters
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            rows = self._fetch_all(
+                f"SELECT * FROM images WHERE sha256 IN ({', '.join('?' for _ in chunk)}) ORDER BY timestamp, rowid",
+                tuple(chunk),
+            )
+            for row in rows:
+                found[row["sha256"]] = row
+        return found
+
+    def get_equation(self, equation_id):
+        return self._fetch_one("SELECT * FROM equations WHERE id = ?", (equation_id,))
+
+    def list_equations(self, since=None, until=None, limit=100, latex_hash=None):
+        if latex_hash is not None:
+            return self._fetch_all(
+                "SELECT * FROM equations WHERE latex_hash = ? AND timestamp >= ? AND timestamp < ? "
+                "ORDER BY timestamp DESC, rowid DESC LIMIT ?",
+                (latex_hash, since or "", until or "~", limit),
+            )
+        return self._fetch_all(
+            "SELECT * FROM equations WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp DESC, rowid DESC LIMIT ?",
+            (since or "", until or "~", limit),
+        )
+
+    def list_solutions(self, equation_id, limit=100):
+        solutions = self._fetch_all(
+            "SELECT * FROM solutions WHERE equation_id = ? ORDER BY timestamp DESC, rowid DESC LIMIT ?",
+            (equation_id, limit),
+        )
+        for solution in solutions:
+            if solution["is_correct"] is not None:
+                solution["is_correct"] = bool(solution["is_correct"])
+        return solutions
+
+    def fill_latex_hashes(self, hash_latex, refresh=False):
+        query = "SELECT id, latex, latex_hash FROM equations" + ("" if refresh else " WHERE latex_hash IS NULL")
+        updates = []
+        for row in self._fetch_all(query, ()):
+            value = hash_latex(row["latex"])
+            if value != row["latex_hash"]:
+                updates.append((value, row["id"]))
+        if updates:
+            with self.transaction():
+                self._conn().executemany("UPDATE equations SET latex_hash = ? WHERE id = ?", updates)
+        return len(updates)
@@ -1,59 +1,97 @@
 import os
-import json
 import uuid
-import shutil
+import tempfile
 from datetime import datetime
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 import logging
+from core.config import STORAGE_BACKEND, STORAGE_DB_PATH
+from core.metrics import timed
+from services.correction_log import correction_log
+from services.latex_normalizer import latex_hash
+from services.storage_backends import JSONStorageBackend, SQLiteStorageBackend, StorageBackend
+from services.upload_service import ImagePayload
+
+def create_storage_backend(data_dir: Path) -> StorageBackend:
+    """Build the metadata backend selected by STORAGE_BACKEND ("sqlite" or "json")"""
+    if STORAGE_BACKEND == "json":
+        return JSONStorageBackend(data_dir)
+    return SQLiteStorageBackend(Path(STORAGE_DB_PATH))
 
 class StorageService:
     """Store images, equations, and solutions"""
     
-    def __init__(self):
+    def __init__(self, backend: Optional[StorageBackend] = None):
         self.data_dir = Path("./data")
         self.images_dir = self.data_dir / "images"
-        self.equations_dir = self.data_dir / "equations"
-        self.solutions_dir = self.data_dir / "solutions"
         
         # Create necessary directories
         self.images_dir.mkdir(parents=True, exist_ok=True)
-        self.equations_dir.mkdir(parents=True, exist_ok=True)
-        self.solutions_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Image files stay on disk; metadata, equations and solutions go to the backend
+        # Equations are indexed by the hash of their canonical LaTeX; records stored
+        # without one are filled in by `python -m tools.migrate_storage --latex-hashes`
+        self.backend = backend or create_storage_backend(self.data_dir)
     
-    def save_image(self, temp_image_path: str) -> str:
+    @timed("storage.save_image")
+    def save_image(self, image: ImagePayload) -> str:
         """
-        Save image and return unique ID
+        Save the original bytes of an uploaded image and return unique ID
         
         Args:
-            temp_image_path: Temporary image file path
+            image: Decoded upload; its `path` is set to the stored file
             
         Returns:
             Unique ID of saved image
         """
+        metadata = self.write_image(image)
+        self.backend.insert_images([metadata])
+            
+        logging.info(f"Image saved: {metadata['id']}")
+        
+        return metadata["id"]
+    
+    @timed("storage.write_image")
+    def write_image(self, image: ImagePayload) -> Dict[str, Any]:
+        """
+        Write an image file without recording its metadata
+        
+        The bytes are written to a temporary file in the images directory and
+        renamed into place, so a partially written image is never visible.
+        
+        Args:
+            image: Decoded upload; its `path` is set to the stored file
+            
+        Returns:
+            Image metadata, to be passed to save_image_batch
+        """
         # Generate unique ID
         image_id = str(uuid.uuid4())
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        filename = f"{image_id}_{timestamp}.png"
+        filename = f"{image_id}_{timestamp}{image.extension}"
         
         # Save image
         target_path = self.images_dir / filename
-        shutil.copy(temp_image_path, target_path)
+        fd, temp_path = tempfile.mkstemp(dir=self.images_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(image.data)
+            os.replace(temp_path, target_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        image.path = str(target_path)
         
-        # Save metadata
-        metadata = {
+        return {
             "id": image_id,
             "filename": filename,
-            "original_path": temp_image_path,
-            "timestamp": timestamp
+            "original_path": image.filename,
+            "timestamp": timestamp,
+            "sha256": image.sha256,
+            "size": image.size
         }
-        
-        with open(self.images_dir / f"{image_id}_meta.json", "w") as f:
-            json.dump(metadata, f, indent=2)
-            
-        logging.info(f"Image saved: {image_id}")
-        
-        return image_id
     
+    @timed("storage.save_equation")
     def save_equation(self, image_id: str, latex: str, rendered_latex: str) -> str:
         """
         Save equation and return ID
@@ -66,28 +104,49 @@ class StorageService:
         Returns:
             ID of saved equation (same as image ID)
         """
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        # Save equation
+        self.backend.insert_equations([self._equation_record(image_id, latex, rendered_latex)])
+            
+        logging.info(f"Equation saved: {image_id}")
+        
+        return image_id
+    
+    @timed("storage.save_image_batch")
+    def save_image_batch(self, images: List[Dict[str, Any]], equations: List[Tuple[str, str, str]]) -> int:
+        """
+        Record many images and their equations in one storage transaction
+        
+        Args:
+            images: Image metadata returned by write_image
+            equations: (image ID, LaTeX text, rendered LaTeX) for each recognized image
+            
+        Returns:
+            Number of equations saved
+        """
+        with self.transaction():
+            self.backend.insert_images(images)
+            self.backend.insert_equations([self._equation_record(*equation) for equation in equations])
+        
+        logging.info(f"Batch saved: {len(images)} images, {len(equations)} equations")
         
-        equation_data = {
+        return len(equations)
+    
+    def _equation_record(self, image_id: str, latex: str, rendered_latex: str) -> Dict[str, Any]:
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        return {
             "id": image_id,
             "image_id": image_id,
             "latex": latex,
             "rendered_latex": rendered_latex,
             "timestamp": timestamp,
-            "last_modified": timestamp
+            "last_modified": timestamp,
+            "latex_hash": latex_hash(latex)
         }
-        
-        # Save equation
-        with open(self.equations_dir / f"{image_id}.json", "w") as f:
-            json.dump(equation_data, f, indent=2)
-            
-        logging.info(f"Equation saved: {image_id}")
-        
-        return image_id
     
+    @timed("storage.update_equation")
     def update_equation(self, equation_id: str, latex: str, rendered_latex: str) -> bool:
         """
-        Update existing equation
+        Update existing equation, logging the change as a user correction
         
         Args:
             equation_id: Equation ID
@@ -97,25 +156,31 @@ class StorageService:
         Returns:
             Success or failure
         """
-        equation_path = self.equations_dir / f"{equation_id}.json"
-        
-        if not equation_path.exists():
-            logging.error(f"Equation not found: {equation_id}")
-            return False
-            
         try:
-            # Load existing data
-            with open(equation_path, "r") as f:
-                equation_data = json.load(f)
-                
-            # Update data
-            equation_data["latex"] = latex
-            equation_data["rendered_latex"] = rendered_latex
-            equation_data["last_modified"] = datetime.now().strftime("%Y%m%d%H%M%S")
-            
-            # Save
-            with open(equation_path, "w") as f:
-                json.dump(equation_data, f, indent=2)
+            previous = self.backend.get_equation(equation_id)
+            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+            success = previous is not None and self.backend.update_equation(
+                equation_id,
+                latex,
+                rendered_latex,
+                timestamp,
+                latex_hash(latex)
+            )
+            
+            if not success:
+                logging.error(f"Equation not found: {equation_id}")
+                return False
+            
+            image = self.backend.get_image(previous["image_id"]) or {}
+            correction_log.append({
+                "type": "correction",
+                "equation_id": equation_id,
+                "image_id": previous["image_id"],
+                "image_sha256": image.get("sha256"),
+                "previous_latex": previous["latex"],
+                "latex": latex,
+                "timestamp": timestamp
+            })
                 
             logging.info(f"Equation updated: {equation_id}")
             return True
@@ -124,6 +189,7 @@ class StorageService:
             logging.error(f"Equation update failed: {str(e)}")
             return False
     
+    @timed("storage.save_solution")
     def save_solution(self, equation_id: str, solution: str, is_correct: bool = None, explanation: str = None) -> str:
         """
         Save solution
@@ -150,9 +216,105 @@ class StorageService:
         }
         
         # Save solution
-        with open(self.solutions_dir / f"{solution_id}.json", "w") as f:
-            json.dump(solution_data, f, indent=2)
+        self.backend.insert_solutions([solution_data])
             
         logging.info(f"Solution saved: {solution_id} (equation ID: {equation_id})")
         
         return solution_id
+    
+    @timed("storage.get_equation")
+    def get_equation(self, equation_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get equation data by ID
+        
+        Args:
+            equation_id: Equation ID
+            
+        Returns:
+            Equation data, or None if not found
+        """
+        return self.backend.get_equation(equation_id)
+    
+    @timed("storage.get_image")
+    def get_image(self, image_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get image metadata by ID
+        
+        Args:
+            image_id: Image ID
+            
+        Returns:
+            Image metadata, or None if not found
+        """
+        return self.backend.get_image(image_id)
+    
+    def find_images(self, hashes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get image metadata by content hash
+        
+        Args:
+            hashes: SHA-256 hex digests of original image bytes
+            
+        Returns:
+            Image metadata by hash (the newest image for each hash found)
+        """
+        return self.backend.find_images(hashes)
+    
+    def image_file(self, image: Dict[str, Any]) -> Path:
+        """
+        Path of a stored image file
+        
+        Args:
+            image: Image metadata
+            
+        Returns:
+            Path under the images directory
+        """
+        return self.images_dir / image["filename"]
+    
+    @timed("storage.list_equations")
+    def list_equations(
+        self,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        limit: int = 100,
+        latex: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        List equations created in a time range, newest first
+        
+        Args:
+            since: Inclusive lower bound ("%Y%m%d%H%M%S", or a prefix such as "20250401")
+            until: Exclusive upper bound, same format
+            limit: Maximum number of equations
+            latex: Only equations with the same canonical form as this LaTeX (duplicates)
+            
+        Returns:
+            Equation data
+        """
+        return self.backend.list_equations(since, until, limit, latex_hash(latex) if latex is not None else None)
+    
+    @timed("storage.list_solutions")
+    def list_solutions(self, equation_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        List solutions submitted for an equation, newest first
+        
+        Args:
+            equation_id: Equation ID
+            limit: Maximum number of solutions
+            
+        Returns:
+            Solution data
+        """
+        return self.backend.list_solutions(equation_id, limit)
+    
+    def transaction(self):
+        """
+        Group several saves into one storage transaction
+        
+        Usage:
+            with storage_service.transaction():
+                storage_service.save_equation(...)
+                storage_service.save_equation(...)
+        """
+        return self.backend.transaction()
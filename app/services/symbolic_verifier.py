@@ -0,0 +1,582 @@
+import cmath
+import logging
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import sympy
+from sympy.parsing.sympy_parser import implicit_multiplication_application, parse_expr, standard_transformations
+
+from core.config import VERIFY_SYMBOLIC_MAX_CHARS, VERIFY_SYMBOLIC_MAX_DEGREE, VERIFY_SYMBOLIC_MAX_EXPONENT
+
+# LaTeX commands translated to SymPy names
+FUNCTIONS = {
+    "sin": "sin", "cos": "cos", "tan": "tan", "cot": "cot", "sec": "sec", "csc": "csc",
+    "arcsin": "asin", "arccos": "acos", "arctan": "atan",
+    "sinh": "sinh", "cosh": "cosh", "tanh": "tanh",
+    "ln": "log", "log": "log", "exp": "exp",
+}
+GREEK = {
+    "alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta", "iota", "kappa",
+    "lambda", "mu", "nu", "xi", "rho", "sigma", "tau", "phi", "chi", "psi", "omega",
+}
+OPERATORS = {"cdot": "*", "times": "*", "ast": "*", "div": "/"}
+# Commands that only affect spacing or sizing
+IGNORED = {"left", "right", "displaystyle", "textstyle", ",", ";", ":", "!", " ", "quad", "qquad", "big", "Big"}
+
+# Every identifier that may reach parse_expr; anything else is rejected before evaluation
+ALLOWED_NAMES = set(FUNCTIONS.values()) | GREEK | {"sqrt", "pi", "_euler"}
+VARIABLE = re.compile(r"^[A-Za-z](_[A-Za-z0-9]+)?$")
+SAFE_EXPRESSION = re.compile(r"^[A-Za-z0-9_+\-*/().! ]*$")
+
+LOCALS: Dict[str, Any] = {letter: sympy.Symbol(letter) for letter in "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"}
+LOCALS.update({name: sympy.Symbol(name) for name in GREEK})
+LOCALS.update({"pi": sympy.pi, "_euler": sympy.E})
+TRANSFORMATIONS = standard_transformations + (implicit_multiplication_application,)
+
+DERIVATIVE = re.compile(r"^\\[dt]?frac\{\s*(?:\\mathrm\{d\}|d)\s*\}\{\s*(?:\\mathrm\{d\}|d)\s*([a-zA-Z])\s*\}")
+# Separators between the values of an answer ("x = 1, x = 3", "x = 1 or x = 3")
+ANSWER_SEPARATORS = re.compile(r",|;|\\quad|\\lor|\\text\{\s*(?:or|and)\s*\}|\bor\b|\band\b")
+NO_SOLUTION = re.compile(r"\\emptyset|\\varnothing|no (?:real )?solutions?", re.IGNORECASE)
+DELIMITERS = re.compile(r"^\s*(?:\\\[|\\\(|\$\$|\$)|(?:\\\]|\\\)|\$\$|\$)\s*$")
+# Text in a problem ("Simplify (x+1)^2"), which would otherwise parse as a product of variables
+TEXT_COMMANDS = re.compile(r"\\(?:text|textrm|textit|textbf|mbox|operatorname)(?![a-zA-Z])")
+COMMAND_NAME = re.compile(r"\\[a-zA-Z]+")
+WORD = re.compile(r"[A-Za-z]{2,}")
+# An imaginary unit, which would otherwise parse as a variable named i
+IMAGINARY = re.compile(r"(?<![A-Za-z])i(?![A-Za-z])")
+# Decimals: a rounded answer to an exact problem is neither exactly right nor wrong
+DECIMAL = re.compile(r"\.\d")
+# Another variable on the left of an answer ("x = 2 and y = 3")
+OTHER_VARIABLE = re.compile(r"^\s*[A-Za-z](_\{?\w+\}?)?\s*$")
+# Roots of irreducible polynomials of higher degree have no closed form, and SymPy
+# takes seconds to minutes on them
+MAX_FACTOR_DEGREE = 4
+
+
+class UnsupportedProblemError(Exception):
+    """Raised when a problem or answer is outside what the symbolic verifier handles"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def latex_to_sympy(latex: str, evaluate: bool = True, max_degree: int = VERIFY_SYMBOLIC_MAX_DEGREE) -> sympy.Expr:
+    """
+    Convert a LaTeX math expression (no relations) to a SymPy expression
+
+    Covers the arithmetic and elementary-function subset handwritten problems use:
+    fractions, roots, powers, subscripted variables, trigonometric and logarithmic
+    functions, Greek letters, pi and e.
+
+    Args:
+        latex: LaTeX expression
+        evaluate: False to keep the expression as written (e.g. 2 + 3 \\cdot 4 unevaluated)
+        max_degree: Largest polynomial degree accepted
+
+    Raises:
+        UnsupportedProblemError: If the expression uses anything else, or its degree
+            or an exponent is too large to work with quickly
+    """
+    source = _to_python(latex.strip())
+    if not source.strip():
+        raise UnsupportedProblemError("empty_expression")
+    if not SAFE_EXPRESSION.match(source):
+        raise UnsupportedProblemError("unsupported_syntax")
+    for name in re.findall(r"[A-Za-z_][A-Za-z0-9_]*", source):
+        if name not in ALLOWED_NAMES and not VARIABLE.match(name):
+            raise UnsupportedProblemError("unsupported_syntax")
+    try:
+        # Checked as written, before evaluation can expand x^{100000} or 9^{9^{9}}
+        expression = parse_expr(source, local_dict=LOCALS, transformations=TRANSFORMATIONS, evaluate=False)
+    except Exception:
+        raise UnsupportedProblemError("parse_error")
+    if _degree_bound(expression) > max_degree:
+        raise UnsupportedProblemError("too_complex")
+    try:
+        evaluated = parse_expr(source, local_dict=LOCALS, transformations=TRANSFORMATIONS)
+    except Exception:
+        raise UnsupportedProblemError("parse_error")
+    if _has_principal_root(evaluated):
+        # SymPy takes the principal, complex root: \sqrt[3]{-8} is not -2
+        raise UnsupportedProblemError("principal_root")
+    return evaluated if evaluate else expression
+
+
+def _degree_bound(expression: sympy.Basic) -> int:
+    """
+    Upper bound on the polynomial degree of an unevaluated expression
+
+    Raises:
+        UnsupportedProblemError: If an exponent or factorial argument is over VERIFY_SYMBOLIC_MAX_EXPONENT
+    """
+    if expression.is_Symbol:
+        return 1
+    if not expression.args:
+        return 0
+    degrees = [_degree_bound(arg) for arg in expression.args]
+
+    if isinstance(expression, (sympy.Pow, sympy.factorial)):
+        value = expression.exp if isinstance(expression, sympy.Pow) else expression.args[0]
+        if value.free_symbols:
+            # 2^x, x^x: not polynomial, and there's no exponent to bound
+            return max(degrees)
+        try:
+            # Safe to evaluate: its own exponents have just been bounded
+            size = abs(complex(value))
+        except (TypeError, ValueError, OverflowError):
+            raise UnsupportedProblemError("too_complex")
+        if size > VERIFY_SYMBOLIC_MAX_EXPONENT:
+            raise UnsupportedProblemError("too_complex")
+        return degrees[0] * math.ceil(size) if isinstance(expression, sympy.Pow) else 0
+    if isinstance(expression, sympy.Mul):
+        return sum(degrees)
+    return max(degrees)
+
+
+def _has_principal_root(expression: sympy.Basic, symbolic: bool = False) -> bool:
+    """
+    Whether an expression has a fractional power of a negative number
+
+    Args:
+        expression: Evaluated expression
+        symbolic: Also count odd roots of expressions with variables, which are
+            principal (complex) roots where the variable is negative
+    """
+    for node in sympy.preorder_traversal(expression):
+        if not isinstance(node, sympy.Pow) or not node.exp.is_Rational or node.exp.is_integer:
+            continue
+        if node.base.free_symbols:
+            if symbolic and node.exp.q % 2 == 1:
+                return True
+        elif node.base.is_negative:
+            return True
+    return False
+
+
+def _has_text(latex: str) -> bool:
+    """Whether LaTeX contains words or text runs (command names aside)"""
+    return bool(TEXT_COMMANDS.search(latex) or WORD.search(COMMAND_NAME.sub(" ", latex)))
+
+
+def _to_python(latex: str) -> str:
+    """Translate LaTeX to a SymPy-parsable string"""
+    out = []
+    i = 0
+    while i < len(latex):
+        char = latex[i]
+        if char == "\\":
+            name, i = _command(latex, i)
+            if name in ("frac", "dfrac", "tfrac"):
+                numerator, i = _argument(latex, i)
+                denominator, i = _argument(latex, i)
+                out.append(f"(({_to_python(numerator)})/({_to_python(denominator)}))")
+            elif name == "sqrt":
+                index = None
+                if i < len(latex) and latex[i] == "[":
+                    end = latex.find("]", i)
+                    if end == -1:
+                        raise UnsupportedProblemError("parse_error")
+                    index, i = latex[i + 1:end], end + 1
+                radicand, i = _argument(latex, i)
+                if index is None:
+                    out.append(f" sqrt({_to_python(radicand)})")
+                else:
+                    out.append(f"(({_to_python(radicand)})**(1/({_to_python(index)})))")
+            elif name in FUNCTIONS:
+                if latex[i:i + 1] == "_":
+                    raise UnsupportedProblemError("unsupported_syntax")
+                out.append(f" {FUNCTIONS[name]}")
+            elif name in OPERATORS:
+                out.append(OPERATORS[name])
+            elif name in GREEK:
+                out.append(f" {name}")
+            elif name == "pi":
+                out.append(" pi")
+            elif name == "mathrm":
+                content, i = _argument(latex, i)
+                if content.strip() == "e":
+                    out.append(" _euler")
+                else:
+                    out.append(_to_python(content))
+            elif name in IGNORED:
+                # \left. and \right. are invisible delimiters
+                if name in ("left", "right") and latex[i:i + 1] == ".":
+                    i += 1
+            else:
+                raise UnsupportedProblemError("unsupported_syntax")
+        elif char == "^":
+            exponent, i = _argument(latex, i + 1)
+            out.append(f"**({_to_python(exponent)})")
+        elif char == "_":
+            subscript, i = _argument(latex, i + 1)
+            subscript = subscript.strip()
+            if not subscript.isalnum() or not out or not re.search(r"[A-Za-z]$", out[-1]):
+                raise UnsupportedProblemError("unsupported_syntax")
+            out.append(f"_{subscript}")
+        elif char == "{":
+            group, i = _argument(latex, i)
+            out.append(f"({_to_python(group)})")
+        elif char in "[]":
+            out.append("(" if char == "[" else ")")
+            i += 1
+        elif char.isalpha():
+            # Letters are separate variables (implicit multiplication); a lone e is Euler's number
+            is_euler = char == "e" and latex[i + 1:i + 2] != "_"
+            out.append(" _euler" if is_euler else f" {char}")
+            i += 1
+        else:
+            out.append(char)
+            i += 1
+    return "".join(out)
+
+
+def _command(latex: str, i: int) -> Tuple[str, int]:
+    """Name of the command starting at latex[i] (a backslash) and the index after it"""
+    match = re.match(r"\\([a-zA-Z]+|.)", latex[i:])
+    if match is None:
+        raise UnsupportedProblemError("parse_error")
+    return match.group(1), i + len(match.group(0))
+
+
+def _argument(latex: str, i: int) -> Tuple[str, int]:
+    """A braced group or single token starting at latex[i] (after spaces) and the index after it"""
+    while i < len(latex) and latex[i] == " ":
+        i += 1
+    if i >= len(latex):
+        raise UnsupportedProblemError("parse_error")
+    if latex[i] == "\\":
+        name, end = _command(latex, i)
+        return latex[i:end], end
+    if latex[i] != "{":
+        return latex[i], i + 1
+
+    depth = 0
+    for j in range(i, len(latex)):
+        if latex[j] == "{" and latex[j - 1] != "\\":
+            depth += 1
+        elif latex[j] == "}" and latex[j - 1] != "\\":
+            depth -= 1
+            if depth == 0:
+                return latex[i + 1:j], j + 1
+    raise UnsupportedProblemError("parse_error")
+
+
+def _strip_delimiters(latex: str) -> str:
+    return DELIMITERS.sub("", latex.strip()).strip()
+
+
+def _equivalent(a: sympy.Expr, b: sympy.Expr, samples: int = 6) -> bool:
+    """
+    Whether two expressions agree, by evaluating them at random points
+
+    Points are drawn with positive values first, then with mixed signs. Expressions
+    that only agree for positive values (\\sqrt{x^2} and x, \\log(x^2) and 2\\log(x))
+    are equal under assumptions the problem doesn't state, so they get no verdict.
+
+    Raises:
+        UnsupportedProblemError: If they can't be evaluated at enough points, or only
+            agree for positive values
+    """
+    symbols = sorted(a.free_symbols | b.free_symbols, key=str)
+    rng = random.Random(0)
+    if not _agree(a, b, symbols, samples, lambda: rng.uniform(0.3, 2.7)):
+        return False
+    if symbols and not _agree(a, b, symbols, samples, lambda: rng.choice((-1, 1)) * rng.uniform(0.3, 2.7)):
+        raise UnsupportedProblemError("branch_sensitive")
+    return True
+
+
+def _agree(a: sympy.Expr, b: sympy.Expr, symbols: List[sympy.Symbol], samples: int, draw: Callable[[], float]) -> bool:
+    """Whether two expressions have the same value at `samples` random points"""
+    checked = 0
+    for _ in range(samples * 2):
+        point = {symbol: draw() for symbol in symbols}
+        try:
+            value_a = complex(a.evalf(subs=point))
+            value_b = complex(b.evalf(subs=point))
+        except (TypeError, ValueError, ZeroDivisionError):
+            continue
+        if not (cmath.isfinite(value_a) and cmath.isfinite(value_b)):
+            continue
+        if abs(value_a - value_b) > 1e-8 * max(1.0, abs(value_a)):
+            return False
+        checked += 1
+        if checked >= samples:
+            return True
+    raise UnsupportedProblemError("not_evaluable")
+
+
+def _same_value(a: sympy.Expr, b: sympy.Expr) -> bool:
+    value_a = complex(a.evalf())
+    value_b = complex(b.evalf())
+    return abs(value_a - value_b) <= 1e-8 * max(1.0, abs(value_a))
+
+
+def _format_roots(variable: sympy.Symbol, roots: List[sympy.Expr]) -> str:
+    return ", ".join(f"{variable} = {sympy.latex(root)}" for root in roots)
+
+
+class SymbolicVerifier:
+    """
+    Check simple algebra submissions with SymPy instead of the reasoning model
+
+    Supported problems:
+    - an equation in one variable with finitely many solutions: the answer's
+      values are compared with the solution set (real solutions, or all
+      solutions if the answer includes complex ones)
+    - a derivative, written \\frac{d}{dx} f: the answer is compared with f'
+    - an expression to simplify or evaluate: the answer must be equivalent
+
+    Expressions are compared numerically at random points, so equivalent forms
+    (factored, expanded, reordered) are all accepted. Anything else (inequalities,
+    integrals, systems, proofs, answers with prose) is left to the reasoning model.
+    """
+
+    def __init__(self, max_chars: int = VERIFY_SYMBOLIC_MAX_CHARS):
+        self.max_chars = max_chars
+
+        # Metrics
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._correct = 0
+        self._incorrect = 0
+        self._escalated = Counter()
+        self._seconds_total = 0.0
+
+    def verify(self, latex: str, solution: str) -> Optional[Dict[str, Any]]:
+        """
+        Verify a solution if the problem is in a supported class
+
+        Args:
+            latex: Problem as LaTeX (OCR output)
+            solution: User's answer; the values of an equation's solution are collected
+                from every line, otherwise the last line is the answer
+
+        Returns:
+            Verification result (is_correct, explanation, step_by_step), or None if the
+            problem should go to the reasoning model
+        """
+        started = time.perf_counter()
+        try:
+            result = self._verify(latex, solution)
+        except UnsupportedProblemError as e:
+            self._record(started, escalated=e.reason)
+            return None
+        except Exception as e:
+            logging.warning(f"Symbolic verification failed: {type(e).__name__}: {str(e)}")
+            self._record(started, escalated="error")
+            return None
+
+        self._record(started, correct=result["is_correct"])
+        return result
+
+    def record_timeout(self):
+        """Count a verification abandoned by the caller's time limit"""
+        with self._lock:
+            self._requests += 1
+            self._escalated["timeout"] += 1
+
+    def _verify(self, latex: str, solution: str) -> Dict[str, Any]:
+        if len(latex) > self.max_chars or len(solution) > self.max_chars:
+            raise UnsupportedProblemError("too_long")
+
+        problem = _strip_delimiters(latex)
+        lines = [_strip_delimiters(line) for line in re.split(r"\n|\\\\", solution) if line.strip()]
+        if not lines:
+            raise UnsupportedProblemError("empty_answer")
+        answer = lines[-1]
+
+        # Words in the problem would be read as variables and give a confident wrong verdict
+        derivative = DERIVATIVE.match(problem)
+        if _has_text(problem[derivative.end():] if derivative else problem):
+            raise UnsupportedProblemError("text_in_problem")
+        if any(IMAGINARY.search(COMMAND_NAME.sub(" ", text)) for text in [problem] + lines):
+            raise UnsupportedProblemError("imaginary_unit")
+        if DECIMAL.search(solution) and not DECIMAL.search(problem):
+            raise UnsupportedProblemError("decimal_answer")
+        if derivative:
+            return self._verify_derivative(problem[derivative.end():], derivative.group(1), answer)
+        if any(relation in problem for relation in ("<", ">", "\\le", "\\ge", "\\neq")):
+            raise UnsupportedProblemError("inequality")
+        if problem.count("=") == 1:
+            # Solutions are often one per line ("x = 2" then "x = -2")
+            return self._verify_equation(problem, ", ".join(lines))
+        if "=" not in problem:
+            return self._verify_expression(problem, answer)
+        raise UnsupportedProblemError("unsupported_problem")
+
+    def _verify_equation(self, problem: str, answer: str) -> Dict[str, Any]:
+        left, right = problem.split("=")
+        expression = latex_to_sympy(left) - latex_to_sympy(right)
+        symbols = expression.free_symbols
+        if len(symbols) != 1:
+            raise UnsupportedProblemError("not_single_variable")
+        if _has_principal_root(expression, symbolic=True):
+            # SymPy solves \sqrt[3]{x} = -2 with the principal root, which has no solution
+            raise UnsupportedProblemError("principal_root")
+        variable = next(iter(symbols))
+
+        numerator = sympy.together(expression).as_numer_denom()[0]
+        if numerator.is_polynomial(variable):
+            _, factors = sympy.factor_list(sympy.Poly(numerator, variable))
+            if any(factor.degree() > MAX_FACTOR_DEGREE for factor, _ in factors):
+                raise UnsupportedProblemError("no_closed_form")
+
+        solutions = sympy.solveset(expression, variable, domain=sympy.S.Complexes)
+        if not isinstance(solutions, sympy.FiniteSet):
+            raise UnsupportedProblemError("infinite_solutions")
+        # Real roots first, then by real part (as Python numbers: SymPy comparisons of these are symbolic)
+        numeric = {root: complex(root.evalf()) for root in solutions}
+        roots = sorted(solutions, key=lambda root: (abs(numeric[root].imag) > 1e-12, numeric[root].real))
+        real_roots = [root for root in roots if abs(numeric[root].imag) <= 1e-12]
+
+        values = self._answer_values(answer, variable)
+        given_complex = any(abs(complex(value.evalf()).imag) > 1e-12 for value in values)
+        expected = roots if given_complex else real_roots
+
+        steps = [f"Rewrite the equation as {sympy.latex(sympy.expand(expression))} = 0"]
+        if expression.is_polynomial(variable):
+            factored = sympy.factor(expression)
+            if factored != sympy.expand(expression):
+                steps.append(f"Factor: {sympy.latex(factored)} = 0")
+        if expected:
+            steps.append(f"Solutions: {_format_roots(variable, expected)}")
+        else:
+            steps.append("The equation has no real solutions")
+
+        wrong = [value for value in values if not any(_same_value(value, root) for root in roots)]
+        missing = [root for root in expected if not any(_same_value(value, root) for value in values)]
+        for value in wrong:
+            residual = sympy.simplify(expression.subs(variable, value))
+            steps.append(f"Substituting {variable} = {sympy.latex(value)} gives {sympy.latex(residual)} \\neq 0")
+        if missing:
+            steps.append(f"Missing: {_format_roots(variable, missing)}")
+
+        is_correct = not wrong and not missing
+        if is_correct and expected:
+            explanation = f"The solution is correct: {_format_roots(variable, expected)} solves the equation, and there are no other solutions."
+        elif is_correct:
+            explanation = "The solution is correct: the equation has no real solutions."
+        elif expected:
+            explanation = f"The solution is incorrect. The correct solution is {_format_roots(variable, expected)}."
+        else:
+            explanation = "The solution is incorrect. The equation has no real solutions."
+        steps.append(explanation)
+        return {"is_correct": is_correct, "explanation": explanation, "step_by_step": steps}
+
+    def _answer_values(self, answer: str, variable: sympy.Symbol) -> List[sympy.Expr]:
+        """Values in an answer such as "x = -1", "x = 1 or x = 3", "x = \\pm 2" or "-1, 3" """
+        if NO_SOLUTION.search(answer):
+            return []
+
+        values = []
+        for part in ANSWER_SEPARATORS.split(answer):
+            part = part.strip()
+            if not part:
+                continue
+            if "=" in part:
+                name, part = part.rsplit("=", 1)
+                if not re.match(rf"^\s*{re.escape(str(variable))}(_\{{?\w+\}}?)?\s*$", name):
+                    if OTHER_VARIABLE.match(name):
+                        # A variable the problem doesn't have ("x = 2 and y = 3")
+                        raise UnsupportedProblemError("unrecognized_answer")
+                    # Working such as "(x+1)^2 = 0" before the final values
+                    continue
+            if "\\pm" in part:
+                values.append(latex_to_sympy(part.replace("\\pm", "+", 1)))
+                values.append(latex_to_sympy(part.replace("\\pm", "-", 1)))
+            else:
+                values.append(latex_to_sympy(part))
+
+        if not values:
+            raise UnsupportedProblemError("unrecognized_answer")
+        if any(value.free_symbols for value in values):
+            raise UnsupportedProblemError("symbolic_answer")
+        return values
+
+    def _verify_derivative(self, function: str, variable_name: str, answer: str) -> Dict[str, Any]:
+        variable = LOCALS[variable_name]
+        expression = latex_to_sympy(function)
+        derivative = sympy.diff(expression, variable)
+        given = latex_to_sympy(answer.rsplit("=", 1)[-1])
+        if not given.free_symbols <= expression.free_symbols | {variable}:
+            # Variables the problem doesn't have: prose or a different problem
+            raise UnsupportedProblemError("unrecognized_answer")
+        simplified = sympy.simplify(derivative)
+
+        steps = [
+            f"Differentiate {sympy.latex(expression)} with respect to {variable}",
+            f"\\frac{{d}}{{d{variable}}} = {sympy.latex(derivative)}",
+        ]
+        if simplified != derivative:
+            steps.append(f"Simplify: {sympy.latex(simplified)}")
+
+        is_correct = _equivalent(derivative, given)
+        if is_correct:
+            explanation = f"The solution is correct: {sympy.latex(given)} is equivalent to the derivative {sympy.latex(simplified)}."
+        else:
+            explanation = f"The solution is incorrect. The derivative is {sympy.latex(simplified)}."
+        steps.append(explanation)
+        return {"is_correct": is_correct, "explanation": explanation, "step_by_step": steps}
+
+    def _verify_expression(self, problem: str, answer: str) -> Dict[str, Any]:
+        # Answers are a bare expression or "= ..."; anything else is an equation
+        if "=" in answer.lstrip().lstrip("="):
+            raise UnsupportedProblemError("unrecognized_answer")
+        expression = latex_to_sympy(problem, evaluate=False)
+        given = latex_to_sympy(answer.lstrip().lstrip("="))
+        if not given.free_symbols <= expression.free_symbols:
+            # Variables the problem doesn't have: prose or a different problem
+            raise UnsupportedProblemError("unrecognized_answer")
+        # Expanded instead when simplify has nothing to do, e.g. for (x + 1)^2
+        simplified = sympy.simplify(expression)
+        if sympy.latex(simplified) == sympy.latex(expression):
+            simplified = sympy.expand(expression)
+
+        steps = [f"Simplify {sympy.latex(expression)}"]
+        if sympy.latex(simplified) != sympy.latex(expression):
+            steps.append(f"= {sympy.latex(simplified)}")
+        is_correct = _equivalent(expression, given)
+        if is_correct:
+            explanation = f"The solution is correct: {sympy.latex(given)} is equal to {sympy.latex(expression)}."
+        else:
+            explanation = f"The solution is incorrect. {sympy.latex(expression)} simplifies to {sympy.latex(simplified)}."
+        steps.append(explanation)
+        return {"is_correct": is_correct, "explanation": explanation, "step_by_step": steps}
+
+    def _record(self, started: float, correct: Optional[bool] = None, escalated: Optional[str] = None):
+        with self._lock:
+            self._requests += 1
+            self._seconds_total += time.perf_counter() - started
+            if escalated is not None:
+                self._escalated[escalated] += 1
+            elif correct:
+                self._correct += 1
+            else:
+                self._incorrect += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Fast path metrics
+
+        Returns:
+            Dictionary with the share of requests verified locally, verdicts, and
+            escalations to the reasoning model by reason
+        """
+        with self._lock:
+            verified = self._correct + self._incorrect
+            return {
+                "requests": self._requests,
+                "verified": verified,
+                "absorbed_rate": verified / self._requests if self._requests else 0.0,
+                "correct": self._correct,
+                "incorrect": self._incorrect,
+                "escalated": dict(self._escalated),
+                "mean_seconds": self._seconds_total / self._requests if self._requests else 0.0,
+            }
@@ -0,0 +1,124 @@
+import contextvars
+import hashlib
+import random
+import time
+from typing import Any, Dict, Optional
+
+from core.config import (
+    TRACE_CAPTURE_DIR,
+    TRACE_CAPTURE_ENABLED,
+    TRACE_CAPTURE_REDACT_TEXT,
+    TRACE_CAPTURE_SAMPLE_RATE,
+)
+from core.metrics import current_trace_id
+from services.correction_log import CorrectionLog
+
+# Free text users submit; hashed instead of stored when redaction is on
+TEXT_FIELDS = {"latex", "solution", "prompt"}
+# Routes not worth replaying
+SKIPPED_ROUTES = {"/metrics", "/health/live", "/health/ready"}
+
+# Record of the request being captured (None when it isn't sampled)
+_record_var: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("trace_capture_record", default=None)
+
+
+def redact(value: Any) -> Any:
+    """Replace text with its SHA-256 and length"""
+    if not isinstance(value, str):
+        return value
+    return {"sha256": hashlib.sha256(value.encode()).hexdigest(), "length": len(value)}
+
+
+class TraceCapture:
+    """
+    Opt-in capture of request traces for replay (benchmarks.replay)
+
+    `CaptureMiddleware` opens a record per sampled request with its route, path
+    parameters, status and timing; handlers add payload references with
+    `request(...)` and outputs with `response(...)`, which are no-ops outside a
+    captured request. Records are written by the correction log's background
+    writer, in segments named "traces-*".
+    """
+
+    def __init__(
+        self,
+        directory: str = TRACE_CAPTURE_DIR,
+        enabled: bool = TRACE_CAPTURE_ENABLED,
+        sample_rate: float = TRACE_CAPTURE_SAMPLE_RATE,
+        redact_text: bool = TRACE_CAPTURE_REDACT_TEXT,
+    ):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.redact_text = redact_text
+        self.log = CorrectionLog(directory, enabled=enabled, prefix="traces")
+
+    def request(self, **fields: Any):
+        """Add payload references of the current request (image hash, LaTeX, solution text)"""
+        self._annotate("request", fields)
+
+    def response(self, **fields: Any):
+        """Add outputs of the current request (recognized LaTeX, verification verdict)"""
+        self._annotate("response", fields)
+
+    def _annotate(self, section: str, fields: Dict[str, Any]):
+        record = _record_var.get()
+        if record is None:
+            return
+        if self.redact_text:
+            fields = {key: redact(value) if key in TEXT_FIELDS else value for key, value in fields.items()}
+        record[section].update(fields)
+
+    def close(self):
+        self.log.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Capture metrics
+
+        Returns:
+            Dictionary with the sample rate and the writer's queued, written and dropped records
+        """
+        return {"sample_rate": self.sample_rate, "redact_text": self.redact_text, **self.log.stats()}
+
+
+class CaptureMiddleware:
+    """Opens a capture record for each sampled HTTP request and writes it when the response is done"""
+
+    def __init__(self, app, capture: Optional[TraceCapture] = None):
+        self.app = app
+        self.capture = capture or trace_capture
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= self.capture.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        record: Dict[str, Any] = {"type": "request", "started": time.time(), "method": scope["method"], "request": {}, "response": {}}
+        token = _record_var.set(record)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _record_var.reset(token)
+            route = getattr(scope.get("route"), "path", None)
+            if route is not None and route not in SKIPPED_ROUTES:
+                record.update({
+                    "trace_id": current_trace_id(),
+                    "route": route,
+                    "path_params": {key: str(value) for key, value in scope.get("path_params", {}).items()},
+                    "status": status,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                })
+                self.capture.log.append(record)
+
+
+# Shared by the middleware and the request handlers
+trace_capture = TraceCapture()
@@ -0,0 +1,221 @@
+import hashlib
+import io
+import logging
+import zipfile
+from typing import List, Optional, Tuple
+
+from fastapi import UploadFile
+from PIL import Image
+
+from core.config import OCR_MODE, UPLOAD_ARCHIVE_MAX_BYTES, UPLOAD_BATCH_MAX_BYTES, UPLOAD_BATCH_MAX_IMAGES, UPLOAD_MAX_BYTES
+from core.metrics import span
+from services.executor_service import io_executor
+from services.preprocess_service import image_preprocessor
+
+ARCHIVE_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed"}
+
+# Stored file extension for each decoded image format
+FORMAT_EXTENSIONS = {
+    "PNG": ".png",
+    "JPEG": ".jpg",
+    "GIF": ".gif",
+    "BMP": ".bmp",
+    "TIFF": ".tiff",
+    "WEBP": ".webp",
+}
+
+
+class InvalidUploadError(Exception):
+    """Raised when an upload is empty or isn't a decodable image"""
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds UPLOAD_MAX_BYTES"""
+
+
+class ImagePayload:
+    """
+    An uploaded image, read and decoded exactly once
+
+    Holds the original encoded bytes (persisted as-is) and the preprocessed RGB
+    image (cropped, deskewed and downscaled; handed straight to OCR), so nothing
+    downstream re-reads or re-decodes the file. `path` is set once the bytes have
+    been stored.
+
+    With OCR_MODE=remote only the bytes are sent to the OCR service, which
+    preprocesses them itself, so the image is only preprocessed if it's used.
+    """
+
+    def __init__(self, data: bytes, filename: Optional[str] = None, preprocess: bool = OCR_MODE != "remote"):
+        if not data:
+            raise InvalidUploadError("Uploaded file is empty")
+
+        self.data = data
+        self.filename = filename or "upload"
+        self.sha256 = hashlib.sha256(data).hexdigest()
+        self.path: Optional[str] = None
+        self._image: Optional[Image.Image] = None
+
+        try:
+            # Reads the header only; pixels are decoded by the preprocessor
+            image = Image.open(io.BytesIO(data))
+            self.format = image.format
+            self.original_size = image.size
+        except Exception as e:
+            raise InvalidUploadError(f"Uploaded file is not a readable image ({type(e).__name__})")
+        if preprocess:
+            self._preprocess()
+
+    @property
+    def image(self) -> Image.Image:
+        """Preprocessed RGB image (preprocessed on first use if it wasn't on upload)"""
+        if self._image is None:
+            self._preprocess()
+        return self._image
+
+    def _preprocess(self):
+        try:
+            with span("image.preprocess"):
+                self._image = image_preprocessor.preprocess(self.data, self.sha256)
+        except Exception as e:
+            raise InvalidUploadError(f"Uploaded file is not a readable image ({type(e).__name__})")
+
+    @classmethod
+    def from_file(cls, path: str, filename: Optional[str] = None) -> "ImagePayload":
+        """Load and decode a stored image"""
+        with open(path, "rb") as f:
+            payload = cls(f.read(), filename)
+        payload.path = str(path)
+        return payload
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    @property
+    def extension(self) -> str:
+        return FORMAT_EXTENSIONS.get(self.format, ".png")
+
+    @property
+    def content_type(self) -> str:
+        return Image.MIME.get(self.format, "image/png")
+
+    @property
+    def source(self) -> str:
+        """Stored path if the image has been saved, otherwise its content hash"""
+        return self.path or self.sha256
+
+
+async def read_image_upload(file: UploadFile, max_bytes: int = UPLOAD_MAX_BYTES) -> ImagePayload:
+    """
+    Read an uploaded image into memory and decode it
+
+    The multipart parser already spools large bodies to disk; this reads that
+    body once (capped at `max_bytes`) and decodes it on the I/O pool.
+
+    Args:
+        file: Uploaded file
+        max_bytes: Largest accepted upload
+
+    Returns:
+        Decoded image payload
+
+    Raises:
+        UploadTooLargeError: If the upload is larger than max_bytes
+        InvalidUploadError: If the upload is empty or not an image
+    """
+    data = await _read_upload_bytes(file, max_bytes)
+    payload = await io_executor.run(ImagePayload, data, file.filename)
+    logging.debug(f"Upload decoded: {payload.filename} ({payload.size} bytes, {payload.format})")
+    return payload
+
+
+async def read_batch_uploads(
+    files: List[UploadFile],
+    max_images: int = UPLOAD_BATCH_MAX_IMAGES,
+    max_bytes: int = UPLOAD_MAX_BYTES,
+    max_archive_bytes: int = UPLOAD_ARCHIVE_MAX_BYTES,
+    max_total_bytes: int = UPLOAD_BATCH_MAX_BYTES,
+) -> List[Tuple[str, bytes]]:
+    """
+    Read the images of a batch upload without decoding them
+
+    Zip archives are expanded in place; directories and macOS resource entries
+    inside them are skipped. Decoding is left to the caller so only the images
+    currently being processed are held in decoded form.
+
+    Args:
+        files: Uploaded images and/or zip archives of images
+        max_images: Largest accepted number of images
+        max_bytes: Largest accepted image (uploaded directly or inside an archive)
+        max_archive_bytes: Largest accepted zip archive
+        max_total_bytes: Largest accepted total size of the images, archives expanded
+
+    Returns:
+        (filename, encoded bytes) for each image, in upload order
+
+    Raises:
+        UploadTooLargeError: If a file, archive entry, the image count or the total size is over its limit
+        InvalidUploadError: If nothing was uploaded or an archive is unreadable
+    """
+    images = []
+    total_bytes = 0
+    for file in files:
+        if _is_archive(file):
+            data = await _read_upload_bytes(file, max_archive_bytes)
+            entries = await io_executor.run(
+                _extract_archive, data, max_images - len(images), max_bytes, max_total_bytes - total_bytes
+            )
+        else:
+            entries = [(file.filename or "upload", await _read_upload_bytes(file, max_bytes))]
+        images.extend(entries)
+        total_bytes += sum(len(entry_data) for _, entry_data in entries)
+
+        if len(images) > max_images:
+            raise UploadTooLargeError(f"Batch exceeds {max_images} images")
+        if total_bytes > max_total_bytes:
+            raise UploadTooLargeError(f"Batch exceeds {max_total_bytes} bytes")
+
+    if not images:
+        raise InvalidUploadError("No images uploaded")
+    return images
+
+
+async def _read_upload_bytes(file: UploadFile, max_bytes: int) -> bytes:
+    with span("upload.read"):
+        data = await file.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise UploadTooLargeError(f"Uploaded file exceeds {max_bytes} bytes")
+    return data
+
+
+def _is_archive(file: UploadFile) -> bool:
+    return file.content_type in ARCHIVE_CONTENT_TYPES or (file.filename or "").lower().endswith(".zip")
+
+
+def _extract_archive(data: bytes, max_images: int, max_bytes: int, max_total_bytes: int) -> List[Tuple[str, bytes]]:
+    """Read the files of a zip archive, bounding the entry count, each entry's and the total uncompressed size"""
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile as e:
+        raise InvalidUploadError(f"Uploaded archive is not a valid zip file: {str(e)}")
+
+    images = []
+    total_bytes = 0
+    with archive:
+        for info in archive.infolist():
+            if info.is_dir() or info.filename.startswith("__MACOSX/"):
+                continue
+            if len(images) >= max_images:
+                raise UploadTooLargeError("Archive contains too many images")
+
+            # Read at most one byte past the limit; the size in the header isn't trusted
+            with archive.open(info) as entry:
+                entry_data = entry.read(max_bytes + 1)
+            if len(entry_data) > max_bytes:
+                raise UploadTooLargeError(f"Archive entry {info.filename} exceeds {max_bytes} bytes")
+            total_bytes += len(entry_data)
+            if total_bytes > max_total_bytes:
+                raise UploadTooLargeError(f"Archive expands to more than {max_total_bytes} bytes")
+            images.append((info.filename, entry_data))
+    return images
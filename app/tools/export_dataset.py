@@ -0,0 +1,274 @@
+"""
+Export OCR training data as WebDataset tar shards.
+
+Joins the correction log (OCR outputs and user corrections) with stored images
+by image content hash. Each sample is one image: its original bytes plus a JSON
+file with the OCR LaTeX, the corrected LaTeX (from the newest correction record,
+or the stored equation if it was edited before the log existed) and the model
+that produced it. Samples are grouped into shards of at most --shard-mb /
+--shard-samples, and shards are written in parallel.
+
+Exports are incremental: the sealed log segments already exported are recorded
+in <out>/export_state.json and skipped next time (segments still being written
+are left for the next run). An image corrected after it was exported appears
+again in a later shard; consumers keep the newest sample per key.
+
+Usage (from the app directory):
+    python -m tools.export_dataset --out data/exports/ocr --log-dir data/corrections \
+        --shard-mb 256 --workers 4
+
+Pass --log-dir once per log directory (e.g. the backend's and the OCR service's).
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import tarfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from services.correction_log import CorrectionLog, read_segment
+from services.storage_service import StorageService
+
+logging.basicConfig(level=logging.INFO)
+
+STATE_FILE = "export_state.json"
+LOOKUP_BATCH = 1000
+
+
+def load_state(out_dir: Path) -> Dict[str, Any]:
+    path = out_dir / STATE_FILE
+    if not path.exists():
+        return {"segments": {}, "next_shard": 0, "exports": []}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_state(out_dir: Path, state: Dict[str, Any]):
+    """Write the state atomically, once every shard of the export is in place"""
+    temp_path = out_dir / f"{STATE_FILE}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_path, out_dir / STATE_FILE)
+
+
+def collect_samples(logs: List[CorrectionLog], state: Dict[str, Any], full: bool) -> Tuple[Dict[str, Dict], Dict[str, List[str]]]:
+    """
+    Fold log records into one sample per image hash
+
+    Returns:
+        Samples by image hash, and the names of the segments read per log directory
+    """
+    samples: Dict[str, Dict[str, Any]] = {}
+    read: Dict[str, List[str]] = {}
+    for log in logs:
+        directory = str(log.directory)
+        exported = set() if full else set(state["segments"].get(directory, []))
+        # Listed once, so a segment sealed during the export is left for the next one
+        segments = [path for path in log.segments() if path.name not in exported]
+        read[directory] = [path.name for path in segments]
+
+        for record in (record for path in segments for record in read_segment(path)):
+            sha256 = record.get("image_sha256")
+            if not sha256:
+                continue
+            sample = samples.setdefault(sha256, {"image_sha256": sha256, "ocr_latex": None, "corrected_latex": None})
+            timestamp = record.get("timestamp") or ""
+            if record.get("type") == "ocr" and timestamp >= sample.get("ocr_timestamp", ""):
+                sample.update({
+                    "ocr_latex": record.get("latex"),
+                    "ocr_timestamp": timestamp,
+                    "model": record.get("model"),
+                    "inference_backend": record.get("inference_backend"),
+                })
+            elif record.get("type") == "correction" and timestamp >= sample.get("corrected_timestamp", ""):
+                sample.update({
+                    "corrected_latex": record.get("latex"),
+                    "corrected_timestamp": timestamp,
+                    "equation_id": record.get("equation_id"),
+                })
+                if sample["ocr_latex"] is None:
+                    sample["ocr_latex"] = record.get("previous_latex")
+    return samples, read
+
+
+def resolve_images(storage: StorageService, samples: Dict[str, Dict]) -> Iterator[Dict[str, Any]]:
+    """
+    Attach the stored image (and the stored equation, for corrections made outside the log) to each sample
+
+    Yields:
+        Samples whose image file exists
+    """
+    hashes = list(samples)
+    for i in range(0, len(hashes), LOOKUP_BATCH):
+        images = storage.find_images(hashes[i:i + LOOKUP_BATCH])
+        for sha256 in hashes[i:i + LOOKUP_BATCH]:
+            image = images.get(sha256)
+            if image is None:
+                continue
+            path = storage.image_file(image)
+            if not path.exists():
+                continue
+            sample = samples[sha256]
+            sample["image_id"] = image["id"]
+            sample["image_path"] = path
+            sample["image_bytes"] = image.get("size") or path.stat().st_size
+
+            if sample["corrected_latex"] is None:
+                equation = storage.get_equation(image["id"])
+                if equation is not None and sample["ocr_latex"] is not None and equation["latex"] != sample["ocr_latex"]:
+                    sample["corrected_latex"] = equation["latex"]
+                    sample["corrected_timestamp"] = equation["last_modified"]
+                    sample["equation_id"] = equation["id"]
+            yield sample
+
+
+def plan_shards(samples: Iterator[Dict[str, Any]], shard_bytes: int, shard_samples: int) -> List[List[Dict[str, Any]]]:
+    """Group samples into shards bounded by total image bytes and sample count"""
+    shards: List[List[Dict[str, Any]]] = [[]]
+    size = 0
+    for sample in samples:
+        if shards[-1] and (size + sample["image_bytes"] > shard_bytes or len(shards[-1]) >= shard_samples):
+            shards.append([])
+            size = 0
+        shards[-1].append(sample)
+        size += sample["image_bytes"]
+    return [shard for shard in shards if shard]
+
+
+def _add_member(tar: tarfile.TarFile, name: str, data: bytes, mtime: float):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = mtime
+    tar.addfile(info, io.BytesIO(data))
+
+
+def write_shard(path: Path, samples: List[Dict[str, Any]]) -> int:
+    """
+    Write one tar shard (WebDataset layout: <key>.<ext> members grouped by key)
+
+    Written to a temporary name and renamed, so a shard is either complete or absent.
+
+    Returns:
+        Size of the shard in bytes
+    """
+    temp_path = path.with_name(path.name + ".partial")
+    mtime = time.time()
+    with tarfile.open(temp_path, "w") as tar:
+        for sample in samples:
+            key = sample["image_sha256"]
+            image_path: Path = sample["image_path"]
+            extension = image_path.suffix.lstrip(".").lower() or "png"
+            metadata = {
+                "image_sha256": key,
+                "image_id": sample.get("image_id"),
+                "equation_id": sample.get("equation_id"),
+                "ocr_latex": sample["ocr_latex"],
+                "latex": sample["corrected_latex"] if sample["corrected_latex"] is not None else sample["ocr_latex"],
+                "corrected": sample["corrected_latex"] is not None,
+                "model": sample.get("model"),
+                "inference_backend": sample.get("inference_backend"),
+                "ocr_timestamp": sample.get("ocr_timestamp"),
+                "corrected_timestamp": sample.get("corrected_timestamp"),
+            }
+            _add_member(tar, f"{key}.{extension}", image_path.read_bytes(), mtime)
+            _add_member(tar, f"{key}.json", json.dumps(metadata, ensure_ascii=False).encode(), mtime)
+    os.replace(temp_path, path)
+    return path.stat().st_size
+
+
+def export(
+    out_dir: Path,
+    log_dirs: List[str],
+    shard_mb: float = 256,
+    shard_samples: int = 10000,
+    workers: int = 4,
+    corrected_only: bool = False,
+    full: bool = False,
+    storage: Optional[StorageService] = None,
+) -> Dict[str, Any]:
+    """
+    Export the samples of newly sealed log segments
+
+    Args:
+        out_dir: Shard directory (also holds the export state)
+        log_dirs: Correction log directories
+        shard_mb: Maximum image bytes per shard (a single larger image gets its own shard)
+        shard_samples: Maximum samples per shard
+        workers: Shards written in parallel
+        corrected_only: Only export images with a user correction
+        full: Ignore the state and re-export every sealed segment
+        storage: Storage to resolve images from (the configured backend by default)
+
+    Returns:
+        Summary of this export (samples, shards, skipped samples, time)
+    """
+    started = time.perf_counter()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    state = load_state(out_dir)
+    storage = storage or StorageService()
+
+    logs = [CorrectionLog(directory) for directory in log_dirs]
+    samples, read = collect_samples(logs, state, full)
+    resolved = [
+        sample for sample in resolve_images(storage, samples)
+        if not corrected_only or sample["corrected_latex"] is not None
+    ]
+    shards = plan_shards(iter(resolved), int(shard_mb * 1024 * 1024), max(1, shard_samples))
+
+    first = state["next_shard"]
+    paths = [out_dir / f"shard-{first + i:06d}.tar" for i in range(len(shards))]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        sizes = list(pool.map(write_shard, paths, shards))
+
+    summary = {
+        "finished": time.strftime("%Y%m%d%H%M%S"),
+        "segments": sum(len(names) for names in read.values()),
+        "samples": len(resolved),
+        "corrected": sum(sample["corrected_latex"] is not None for sample in resolved),
+        "without_image": len(samples) - sum(1 for sample in samples.values() if "image_path" in sample),
+        "shards": [path.name for path in paths],
+        "bytes": sum(sizes),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    for directory, names in read.items():
+        exported = set(state["segments"].get(directory, []))
+        state["segments"][directory] = sorted(exported | set(names))
+    state["next_shard"] = first + len(shards)
+    state["exports"].append(summary)
+    save_state(out_dir, state)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export OCR training data as tar shards")
+    parser.add_argument("--out", required=True, help="Shard directory")
+    parser.add_argument("--log-dir", action="append", help="Correction log directory (repeatable; default data/corrections)")
+    parser.add_argument("--shard-mb", type=float, default=256, help="Maximum image megabytes per shard")
+    parser.add_argument("--shard-samples", type=int, default=10000, help="Maximum samples per shard")
+    parser.add_argument("--workers", type=int, default=4, help="Shards written in parallel")
+    parser.add_argument("--corrected-only", action="store_true", help="Only export images with a user correction")
+    parser.add_argument("--full", action="store_true", help="Re-export every sealed segment, ignoring the export state")
+    args = parser.parse_args()
+
+    summary = export(
+        Path(args.out),
+        args.log_dir or ["data/corrections"],
+        args.shard_mb,
+        args.shard_samples,
+        args.workers,
+        args.corrected_only,
+        args.full,
+    )
+    logging.info(
+        f"Exported {summary['samples']} samples ({summary['corrected']} corrected) from {summary['segments']} segments "
+        f"into {len(summary['shards'])} shards ({summary['bytes'] / 1024 / 1024:.1f} MB) in {summary['seconds']:.1f}s; "
+        f"{summary['without_image']} samples had no stored image"
+    )
+
+
+if __name__ == "__main__":
+    main()
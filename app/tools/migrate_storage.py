@@ -0,0 +1,124 @@
+"""
+Import the JSON storage tree (data/images/*_meta.json, data/equations/*.json,
+data/solutions/*.json) into the SQLite storage backend.
+
+Usage (from the app directory):
+    python -m tools.migrate_storage --data-dir data --db data/write2solve.db
+
+Records are inserted in batches, one transaction per batch. Re-running the
+migration is safe: existing rows with the same ID are replaced. Imported
+equations get their canonical LaTeX hash.
+
+Equations are indexed by the hash of their canonical LaTeX. To fill it in for
+equations stored without one, in the backend selected by STORAGE_BACKEND, or to
+recompute every hash after CANONICAL_VERSION changed (--refresh):
+    python -m tools.migrate_storage --latex-hashes [--refresh]
+"""
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List
+
+from core.config import STORAGE_BACKEND, STORAGE_DB_PATH
+from services.latex_normalizer import latex_hash
+from services.storage_backends import JSONStorageBackend, SQLiteStorageBackend, StorageBackend
+
+logging.basicConfig(level=logging.INFO)
+
+
+def iter_records(paths: Iterator[Path]) -> Iterator[Dict]:
+    """Load JSON records, skipping unreadable files"""
+    for path in paths:
+        try:
+            with open(path, "r") as f:
+                yield json.load(f)
+        except Exception as e:
+            logging.warning(f"Skipping {path}: {str(e)}")
+
+
+def import_batched(records: Iterator[Dict], insert: Callable[[List[Dict]], None], batch_size: int) -> int:
+    """Insert records in batches and return how many were imported"""
+    count = 0
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            insert(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        insert(batch)
+        count += len(batch)
+    return count
+
+
+def migrate(data_dir: Path, db_path: Path, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Import every JSON record under data_dir into the SQLite database
+
+    Args:
+        data_dir: Root of the JSON storage tree
+        db_path: SQLite database file (created if missing)
+        batch_size: Records per transaction
+
+    Returns:
+        Number of imported records per type
+    """
+    backend = SQLiteStorageBackend(db_path)
+    counts = {}
+
+    sources = [
+        ("images", (data_dir / "images").glob("*_meta.json"), backend.insert_images),
+        ("equations", (data_dir / "equations").glob("*.json"), backend.insert_equations),
+        ("solutions", (data_dir / "solutions").glob("*.json"), backend.insert_solutions),
+    ]
+    for name, paths, insert in sources:
+        started = time.perf_counter()
+        counts[name] = import_batched(iter_records(paths), insert, batch_size)
+        logging.info(f"Imported {counts[name]} {name} in {time.perf_counter() - started:.1f}s")
+
+    fill_latex_hashes(backend)
+    return counts
+
+
+def fill_latex_hashes(backend: StorageBackend, refresh: bool = False) -> int:
+    """
+    Set the canonical LaTeX hash of stored equations
+
+    Args:
+        backend: Storage backend
+        refresh: Recompute every hash instead of only the missing ones
+
+    Returns:
+        Number of updated equations
+    """
+    started = time.perf_counter()
+    filled = backend.fill_latex_hashes(latex_hash, refresh=refresh)
+    logging.info(f"Canonical LaTeX hash set on {filled} equations in {time.perf_counter() - started:.1f}s")
+    return filled
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate JSON storage to SQLite")
+    parser.add_argument("--data-dir", default="data", help="Root of the JSON storage tree")
+    parser.add_argument("--db", default=STORAGE_DB_PATH, help="SQLite database path")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Records per transaction")
+    parser.add_argument("--latex-hashes", action="store_true", help="Only fill in canonical LaTeX hashes (STORAGE_BACKEND)")
+    parser.add_argument("--refresh", action="store_true", help="With --latex-hashes: recompute every hash")
+    args = parser.parse_args()
+
+    if args.latex_hashes:
+        if STORAGE_BACKEND == "json":
+            backend = JSONStorageBackend(Path(args.data_dir))
+        else:
+            backend = SQLiteStorageBackend(Path(args.db))
+        fill_latex_hashes(backend, args.refresh)
+        return
+
+    migrate(Path(args.data_dir), Path(args.db), args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
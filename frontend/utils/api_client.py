@@ -2,7 +2,7 @@ import requests
 import os
 import json
 import streamlit as st
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import uuid
 from datetime import datetime
 
@@ -45,6 +45,50 @@ def ocr_process(image_file) -> Optional[Dict[str, Any]]:
         st.error(f"Error calling OCR API: {str(e)}")
         return None
 
+def ocr_process_batch(image_files) -> Optional[List[Dict[str, Any]]]:
+    """
+    Send many images (or zip archives of images) to the batch OCR API in one request
+    
+    Args:
+        image_files: Uploaded image or zip files
+        
+    Returns:
+        Result for each image, in upload order (failed images have "error" and
+        "status_code" instead of LaTeX), or None if the request failed
+    """
+    if OFFLINE_MODE:
+        st.warning("오프라인 모드로 실행 중입니다. 백엔드 연결 없이 테스트 데이터가 표시됩니다.")
+        return [
+            {"index": i, "id": str(uuid.uuid4()), "latex": "x^2 + 2x + 1 = 0", "rendered_latex": "x^2 + 2x + 1 = 0"}
+            for i, _ in enumerate(image_files)
+        ]
+    
+    try:
+        files = [("files", image_file) for image_file in image_files]
+        results = []
+        # Results arrive as NDJSON lines in completion order, followed by a summary line
+        with requests.post(f"{API_BASE_URL}/ocr/batch", files=files, stream=True) as response:
+            if response.status_code != 200:
+                st.error(f"API Error: {response.status_code} - {response.text}")
+                return None
+            
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                result = json.loads(line)
+                if result.get("done"):
+                    if "error" in result:
+                        st.error(f"API Error: {result['status_code']} - {result['error']}")
+                        return None
+                else:
+                    results.append(result)
+        
+        return sorted(results, key=lambda result: result["index"])
+            
+    except Exception as e:
+        st.error(f"Error calling OCR API: {str(e)}")
+        return None
+
 def update_latex(equation_id: str, corrected_latex: str) -> Optional[Dict[str, Any]]:
     """
     Update LaTeX with corrected version